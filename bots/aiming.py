@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+'''
+Closed-loop turret aiming.
+
+AimController follows our own TurretHeading from OBJECTUPDATE, estimates
+how fast the turret is turning and predicts when it will line up with the
+target. The bot sends TURNTURRETTOHEADING once per target (again only if
+the target bearing moves by more than `retarget` degrees) and fires as soon
+as the predicted alignment time has passed, instead of resending turn
+commands on every message until the headings match exactly.
+
+bearing() and wrapAngle() are the one home of the server's heading
+convention for all the bots' shared modules. Both take plain numbers or
+numpy arrays.
+'''
+
+import math
+
+
+def bearing(fromX, fromY, toX, toY):
+	'''
+	Compass heading from one point to another, as getheading() in the bots:
+	0 along +X, increasing clockwise (towards -Y)
+	'''
+	dx, dy = toX - fromX, toY - fromY
+	if isinstance(dx, (int, float)) and isinstance(dy, (int, float)):
+		return (-math.degrees(math.atan2(dy, dx))) % 360.0
+	# only reached with arrays, so numpy is already loaded
+	import numpy as np
+	return (-np.degrees(np.arctan2(dy, dx))) % 360.0
+
+
+def wrapAngle(degrees):
+	'''
+	Map an angle difference to [-180, 180)
+	'''
+	return (degrees + 180.0) % 360.0 - 180.0
+
+
+class AimController(object):
+	'''
+	Per-tank turret controller. Headings are in degrees, times in seconds.
+	'''
+
+	def __init__(self, tolerance=2.0, retarget=3.0, smoothing=0.5):
+		self.tolerance = tolerance
+		self.retarget = retarget
+		self.smoothing = smoothing
+
+		self.heading = None
+		self.lastTime = None
+		self.rate = 0.0
+		self.typicalRate = None
+		self.target = None
+		self.commanded = None
+		self.fireAt = None
+
+	def observe(self, turretHeading, now):
+		'''
+		Feed our own TurretHeading from an OBJECTUPDATE
+		'''
+		if self.heading is not None and now > self.lastTime:
+			rate = wrapAngle(turretHeading - self.heading) / (now - self.lastTime)
+			self.rate = self.smoothing * rate + (1 - self.smoothing) * self.rate
+			if abs(rate) > 1e-3:
+				# remember how fast the turret turns when it is moving at all,
+				# so the first prediction for a new target has something to go on
+				if self.typicalRate is None:
+					self.typicalRate = abs(rate)
+				else:
+					self.typicalRate = self.smoothing * abs(rate) + (1 - self.smoothing) * self.typicalRate
+		self.heading = turretHeading
+		self.lastTime = now
+		if self.target is not None:
+			self.fireAt = self.predictAlignment()
+
+	def aim(self, targetHeading, now):
+		'''
+		Set the bearing to the target. Returns True when a new
+		TURNTURRETTOHEADING should be sent.
+		'''
+		send = self.commanded is None or abs(wrapAngle(targetHeading - self.commanded)) > self.retarget
+		if send:
+			self.commanded = targetHeading
+		self.target = targetHeading
+		self.fireAt = self.predictAlignment()
+		return send
+
+	def error(self):
+		if self.target is None or self.heading is None:
+			return None
+		return wrapAngle(self.target - self.heading)
+
+	def predictAlignment(self):
+		'''
+		Time at which the turret should be within tolerance of the target,
+		or None if there is no basis for a prediction yet
+		'''
+		error = self.error()
+		if error is None:
+			return None
+		if abs(error) <= self.tolerance:
+			return self.lastTime
+		if self.rate * error > 0 and abs(self.rate) > 1e-3:
+			speed = abs(self.rate)
+		else:
+			# not yet turning towards the target; assume the usual speed
+			speed = self.typicalRate
+		if not speed:
+			return None
+		return self.lastTime + (abs(error) - self.tolerance) / speed
+
+	def fireDue(self, now):
+		'''
+		True once the turret is, or is predicted to be, on target
+		'''
+		error = self.error()
+		if error is None:
+			return False
+		if abs(error) <= self.tolerance:
+			return True
+		return self.fireAt is not None and now >= self.fireAt
+
+	def reset(self):
+		'''
+		Forget the current target, e.g. after firing
+		'''
+		self.target = None
+		self.commanded = None
+		self.fireAt = None
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+'''
+Match analytics over recorded telemetry captures (see telemetry.py).
+
+Every capture is memory-mapped and processed with array operations, so
+hundreds of matches can be summarised without building a dict per update.
+Captures are deduplicated, so an object's state at time t is its latest
+record at or before t; forwardFill does that lookup for a whole array of
+times at once.
+
+	python bots/analytics.py -n lo-pressure:tank1 match1.cap match2.cap
+'''
+
+import argparse
+
+import numpy as np
+
+from aiming import bearing, wrapAngle
+from telemetry import loadCapture, readNames, TYPE_CODES
+
+
+def findIds(path, name):
+	'''
+	Ids used by the tank called `name` in one capture (a new Id per respawn)
+	'''
+	return [objectId for objectId, entry in readNames(path).items()
+		if entry['Name'] == name and entry['Type'] == 'Tank']
+
+
+def tankTracks(records, typeCode=TYPE_CODES['Tank']):
+	'''
+	{Id: records of that object sorted by time}, for one object type
+	'''
+	records = records[records['Type'] == typeCode]
+	if len(records) == 0:
+		return {}
+	records = records[np.lexsort((records['time'], records['Id']))]
+	ids, starts = np.unique(records['Id'], return_index=True)
+	return dict(zip(ids.tolist(), np.split(records, starts[1:])))
+
+
+def forwardFill(trackTimes, queryTimes):
+	'''
+	Index of the latest track record at or before each query time, and a
+	mask of which query times come after the first record
+	'''
+	index = np.searchsorted(trackTimes, queryTimes, side='right') - 1
+	return np.maximum(index, 0), index >= 0
+
+
+def trajectory(track):
+	'''
+	(time, X, Y, Heading, speed) arrays for one tank track
+	'''
+	t = track['time'].astype(np.float64)
+	x = track['X'].astype(np.float64)
+	y = track['Y'].astype(np.float64)
+	speed = np.zeros(len(t))
+	if len(t) > 1:
+		dt = np.diff(t)
+		step = np.hypot(np.diff(x), np.diff(y))
+		speed[1:] = np.where(dt > 0, step / np.where(dt > 0, dt, 1.0), 0.0)
+	return t, x, y, track['Heading'].astype(np.float64), speed
+
+
+def aimErrors(tracks, ourIds, maxAge=1.0):
+	'''
+	Turret heading error and range to the nearest enemy seen within
+	`maxAge` seconds, sampled at each of our own records
+	'''
+	ours = [tracks[i] for i in ourIds if i in tracks]
+	enemies = [track for i, track in tracks.items() if i not in ourIds]
+	if not ours or not enemies:
+		return np.zeros(0), np.zeros(0)
+	me = np.concatenate(ours)
+	t = me['time']
+
+	ranges = np.full((len(enemies), len(t)), np.inf)
+	bearings = np.zeros((len(enemies), len(t)))
+	for row, enemy in enumerate(enemies):
+		index, seen = forwardFill(enemy['time'], t)
+		fresh = seen & (t - enemy['time'][index] <= maxAge) & (enemy['Health'][index] > 0)
+		ex = enemy['X'][index].astype(np.float64)
+		ey = enemy['Y'][index].astype(np.float64)
+		ranges[row] = np.where(fresh, np.hypot(ex - me['X'], ey - me['Y']), np.inf)
+		bearings[row] = bearing(me['X'], me['Y'], ex, ey)
+
+	nearest = np.argmin(ranges, axis=0)
+	columns = np.arange(len(t))
+	distance = ranges[nearest, columns]
+	valid = np.isfinite(distance)
+	error = wrapAngle(me['TurretHeading'] - bearings[nearest, columns])
+	return error[valid], distance[valid]
+
+
+def engagementStats(tracks, ourIds):
+	'''
+	Shots, pickups, damage and kill timings from Health/Ammo changes.
+	Damage to enemies counts all damage seen, not only ours.
+	'''
+	stats = {'shots': 0, 'ammoPickedUp': 0, 'damageTaken': 0, 'enemyDamage': 0,
+		'kills': 0, 'timeToKill': []}
+	for objectId, track in tracks.items():
+		health = np.diff(track['Health'].astype(np.int32))
+		if objectId in ourIds:
+			ammo = np.diff(track['Ammo'].astype(np.int32))
+			stats['shots'] += int(-ammo[ammo < 0].sum())
+			stats['ammoPickedUp'] += int(ammo[ammo > 0].sum())
+			stats['damageTaken'] += int(-health[health < 0].sum())
+		else:
+			stats['enemyDamage'] += int(-health[health < 0].sum())
+			dead = np.flatnonzero(track['Health'] == 0)
+			if len(dead):
+				stats['kills'] += 1
+				stats['timeToKill'].append(float(track['time'][dead[0]] - track['time'][0]))
+	return stats
+
+
+def analyseCaptures(paths, name, bins=36, maxAge=1.0):
+	'''
+	Aggregate statistics for the tank called `name` over many captures
+	'''
+	edges = np.linspace(-180.0, 180.0, bins + 1)
+	histogram = np.zeros(bins, dtype=np.int64)
+	distances = []
+	totals = {'matches': 0, 'shots': 0, 'ammoPickedUp': 0, 'damageTaken': 0,
+		'enemyDamage': 0, 'kills': 0, 'timeToKill': []}
+
+	for path in paths:
+		ourIds = set(findIds(path, name))
+		if not ourIds:
+			continue
+		tracks = tankTracks(loadCapture(path))
+		error, distance = aimErrors(tracks, ourIds, maxAge)
+		histogram += np.histogram(error, edges)[0]
+		distances.append(distance)
+		for key, value in engagementStats(tracks, ourIds).items():
+			totals[key] += value
+		totals['matches'] += 1
+
+	shots = totals['shots']
+	totals['ammoEfficiency'] = totals['enemyDamage'] / float(shots) if shots else None
+	totals['meanTimeToKill'] = float(np.mean(totals['timeToKill'])) if totals['timeToKill'] else None
+	distances = np.concatenate(distances) if distances else np.zeros(0)
+	totals['meanEngagementRange'] = float(distances.mean()) if len(distances) else None
+	return totals, histogram, edges
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--name', required=True, help='Name of our tank')
+	parser.add_argument('-b', '--bins', default=36, type=int, help='Heading error histogram bins')
+	parser.add_argument('captures', nargs='+')
+	args = parser.parse_args()
+
+	totals, histogram, edges = analyseCaptures(args.captures, args.name, args.bins)
+	for key in ('matches', 'shots', 'ammoPickedUp', 'damageTaken', 'enemyDamage', 'kills',
+			'ammoEfficiency', 'meanTimeToKill', 'meanEngagementRange'):
+		print('{:<20}{}'.format(key, totals[key]))
+	print('turret heading error (degrees):')
+	peak = max(1, histogram.max())
+	for count, low, high in zip(histogram, edges[:-1], edges[1:]):
+		print('{:7.1f} {:7.1f} {:6d} {}'.format(low, high, count, '#' * int(40 * count / peak)))
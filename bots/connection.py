@@ -0,0 +1,198 @@
+#!/usr/bin/python
+
+'''
+Connection management for tank sockets.
+
+ConnectionPool keeps a few spare TCP connections to the game server open so
+a tank that needs a new one (reconnect after an error, respawn after
+DESTROYED) does not pay for a handshake mid-match. ReconnectingComms wraps
+ServerComms with EOF/error detection, exponential backoff, reconnection and
+re-sending CREATETANK.
+'''
+
+import collections
+import threading
+import logging
+import random
+import socket
+import struct
+import time
+
+from servercomms import ServerMessageTypes, ServerComms
+
+
+class ConnectionPool(object):
+	'''
+	Pre-opened connections to one game server.
+
+	A background thread tops the pool back up to `size` spares after
+	every acquire, so several tanks in one process can share it.
+	'''
+
+	def __init__(self, hostname, port, size=1, connectTimeout=5.0):
+		self.hostname = hostname
+		self.port = port
+		self.size = size
+		self.connectTimeout = connectTimeout
+		self.spares = collections.deque()
+		self.lock = threading.Lock()
+		self.wanted = threading.Event()
+		self.closed = False
+
+		self.topUp()
+		self.refiller = threading.Thread(target=self.refillLoop, name='ConnectionPool')
+		self.refiller.daemon = True
+		self.refiller.start()
+
+	def openSocket(self):
+		sock = socket.create_connection((self.hostname, self.port), self.connectTimeout)
+		sock.settimeout(None)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return sock
+
+	def topUp(self):
+		while not self.closed:
+			with self.lock:
+				if len(self.spares) >= self.size:
+					return
+			try:
+				sock = self.openSocket()
+			except socket.error as e:
+				logging.info("Could not pre-open connection to {}:{}: {}".format(self.hostname, self.port, e))
+				return
+			with self.lock:
+				self.spares.append(sock)
+
+	def refillLoop(self):
+		while not self.closed:
+			self.wanted.wait()
+			self.wanted.clear()
+			self.topUp()
+
+	def acquire(self):
+		'''
+		Return a connected socket, preferring a live spare
+		'''
+		sock = None
+		while sock is None:
+			with self.lock:
+				if not self.spares:
+					break
+				candidate = self.spares.popleft()
+			if isAlive(candidate):
+				sock = candidate
+			else:
+				candidate.close()
+		self.wanted.set()
+		if sock is None:
+			sock = self.openSocket()
+		return sock
+
+	def close(self):
+		self.closed = True
+		self.wanted.set()
+		with self.lock:
+			while self.spares:
+				self.spares.popleft().close()
+
+
+def isAlive(sock):
+	'''
+	Check an idle socket without consuming data. The server sends nothing
+	before CREATETANK, so readable-with-no-data means it has been closed.
+	'''
+	try:
+		sock.setblocking(False)
+		try:
+			return sock.recv(1, socket.MSG_PEEK) != b''
+		finally:
+			sock.setblocking(True)
+	except (BlockingIOError, InterruptedError):
+		return True
+	except socket.error:
+		return False
+
+
+class ReconnectingComms(object):
+	'''
+	ServerComms that survives dropped connections.
+
+	readMessage and sendMessage have the same signatures as ServerComms.
+	On EOF or a socket error the tank is reconnected (with exponential
+	backoff) and CREATETANK is sent again under the same name. A read
+	timeout just retries the read, keeping any partly buffered frame.
+	The watchdog and game clock, if any, carry over between connections.
+	'''
+
+	def __init__(self, pool, name, initialBackoff=0.1, maxBackoff=5.0, maxRetries=None,
+			readTimeout=None, watchdog=None, clock=None):
+		self.pool = pool
+		self.name = name
+		self.readTimeout = readTimeout
+		self.watchdog = watchdog
+		self.clock = clock
+		self.initialBackoff = initialBackoff
+		self.maxBackoff = maxBackoff
+		self.maxRetries = maxRetries
+		self.comms = None
+		self.reconnects = 0
+		self.connect()
+
+	def connect(self):
+		'''
+		Take a connection from the pool and spawn our tank on it
+		'''
+		backoff = self.initialBackoff
+		attempt = 0
+		while True:
+			comms = None
+			try:
+				comms = ServerComms(None, None, self.pool.acquire(), self.readTimeout, self.watchdog, self.clock)
+				comms.sendMessage(ServerMessageTypes.CREATETANK, {'Name': self.name})
+				break
+			except socket.error as e:
+				if comms is not None:
+					comms.close()
+				attempt += 1
+				if self.maxRetries is not None and attempt > self.maxRetries:
+					raise
+				delay = backoff * (0.5 + random.random() / 2)
+				logging.info("Connecting '{}' failed ({}), retrying in {:.2f}s".format(self.name, e, delay))
+				time.sleep(delay)
+				backoff = min(backoff * 2, self.maxBackoff)
+
+		if self.comms is not None:
+			self.comms.close()
+			self.reconnects += 1
+		self.comms = comms
+		logging.info("Creating tank with name '{}'".format(self.name))
+
+	def respawn(self):
+		'''
+		Move the tank onto a fresh pooled connection, e.g. after DESTROYED
+		'''
+		self.connect()
+
+	def readMessage(self):
+		while True:
+			try:
+				return self.comms.readMessage()
+			except socket.timeout:
+				# nothing arrived in time; the connection itself is fine
+				continue
+			except (socket.error, struct.error) as e:
+				logging.info("Connection for '{}' lost ({}), reconnecting".format(self.name, e))
+				self.connect()
+
+	def sendMessage(self, messageType=None, messagePayload=None):
+		try:
+			return self.comms.sendMessage(messageType, messagePayload)
+		except socket.error as e:
+			logging.info("Send for '{}' failed ({}), reconnecting".format(self.name, e))
+			self.connect()
+			return self.comms.sendMessage(messageType, messagePayload)
+
+	def close(self):
+		if self.watchdog is not None:
+			self.watchdog.stop()
+		self.comms.close()
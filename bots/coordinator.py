@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+'''
+Team coordination for several tanks run from one process.
+
+Every tank thread reports the OBJECTUPDATEs it receives to a shared
+TeamCoordinator, which keeps only the latest state per object, so a report
+is a dictionary write. At most once per tick, the first tank to ask for
+orders rebuilds the team's cost matrix (distance, turret angle and enemy
+health) and solves the target assignment with the Hungarian algorithm.
+The work per tick grows with the number of tanks and visible enemies, not
+with the number of messages received.
+
+Tanks that get no enemy (more tanks than visible enemies) or that are out
+of ammo are given the 'search' or 'resupply' role instead.
+'''
+
+import threading
+import time
+
+import numpy as np
+
+from aiming import bearing
+
+
+def hungarian(cost):
+	'''
+	Minimum-cost assignment for a rows x cols cost matrix.
+	Returns [(row, col)] with min(rows, cols) pairs.
+	'''
+	cost = np.asarray(cost, dtype=np.float64)
+	transposed = cost.shape[0] > cost.shape[1]
+	if transposed:
+		cost = cost.T
+	n, m = cost.shape
+	if n == 0:
+		return []
+
+	# potentials method, 1-indexed with column 0 as a sentinel
+	u = np.zeros(n + 1)
+	v = np.zeros(m + 1)
+	p = np.zeros(m + 1, dtype=np.int64)
+	way = np.zeros(m + 1, dtype=np.int64)
+	for i in range(1, n + 1):
+		p[0] = i
+		j0 = 0
+		minv = np.full(m + 1, np.inf)
+		used = np.zeros(m + 1, dtype=bool)
+		while True:
+			used[j0] = True
+			i0 = p[j0]
+			free = ~used[1:]
+			reduced = cost[i0 - 1] - u[i0] - v[1:]
+			better = free & (reduced < minv[1:])
+			minv[1:][better] = reduced[better]
+			way[1:][better] = j0
+			candidates = np.where(free, minv[1:], np.inf)
+			j1 = int(np.argmin(candidates)) + 1
+			delta = candidates[j1 - 1]
+			u[p[used]] += delta
+			v[used] -= delta
+			minv[~used] -= delta
+			j0 = j1
+			if p[j0] == 0:
+				break
+		while j0:
+			j1 = way[j0]
+			p[j0] = p[j1]
+			j0 = j1
+
+	pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+	if transposed:
+		pairs = [(col, row) for row, col in pairs]
+	return sorted(pairs)
+
+
+class TeamCoordinator(object):
+	'''
+	Shared world view and target assignment for a team of tanks
+	'''
+
+	def __init__(self, names, tickInterval=0.1, staleAfter=2.0, angleWeight=0.5, healthWeight=10.0):
+		self.names = list(names)
+		self.tickInterval = tickInterval
+		self.staleAfter = staleAfter
+		self.angleWeight = angleWeight
+		self.healthWeight = healthWeight
+
+		self.lock = threading.Lock()
+		self.ours = {}
+		self.enemies = {}
+		self.orders = dict((name, {'role': 'search'}) for name in self.names)
+		self.solvedAt = None
+
+	def report(self, message, now=None):
+		'''
+		Record an OBJECTUPDATE seen by any of our tanks
+		'''
+		if message.get('Type') != 'Tank':
+			return
+		if now is None:
+			now = time.time()
+		with self.lock:
+			if message['Name'] in self.orders:
+				self.ours[message['Name']] = (now, message)
+			else:
+				self.enemies[message['Id']] = (now, message)
+
+	def ordersFor(self, name, now=None):
+		'''
+		Current orders for one tank: {'role': 'attack', 'target': message,
+		'heading': degrees, 'seen': when target was reported} or
+		{'role': 'search'} / {'role': 'resupply'}
+		'''
+		if now is None:
+			now = time.time()
+		with self.lock:
+			if self.solvedAt is None or now - self.solvedAt >= self.tickInterval:
+				self.solve(now)
+			return self.orders[name]
+
+	def solve(self, now):
+		for objectId in [i for i, (seen, m) in self.enemies.items() if now - seen > self.staleAfter or m['Health'] <= 0]:
+			del self.enemies[objectId]
+		self.solvedAt = now
+
+		orders = dict((name, {'role': 'search'}) for name in self.names)
+		tanks = []
+		for name in self.names:
+			if name not in self.ours:
+				continue
+			mine = self.ours[name][1]
+			if mine.get('Ammo', 1) == 0:
+				orders[name] = {'role': 'resupply'}
+			else:
+				tanks.append(mine)
+		sightings = list(self.enemies.values())
+		targets = [m for _, m in sightings]
+		if tanks and targets:
+			tx = np.array([t['X'] for t in tanks], dtype=np.float64)[:, None]
+			ty = np.array([t['Y'] for t in tanks], dtype=np.float64)[:, None]
+			turret = np.array([t['TurretHeading'] for t in tanks], dtype=np.float64)[:, None]
+			ex = np.array([e['X'] for e in targets], dtype=np.float64)[None, :]
+			ey = np.array([e['Y'] for e in targets], dtype=np.float64)[None, :]
+			health = np.array([e['Health'] for e in targets], dtype=np.float64)[None, :]
+
+			heading = bearing(tx, ty, ex, ey)
+			turn = np.abs((heading - turret + 180.0) % 360.0 - 180.0)
+			cost = np.hypot(ex - tx, ey - ty) + self.angleWeight * turn + self.healthWeight * health
+			for row, col in hungarian(cost):
+				orders[tanks[row]['Name']] = {'role': 'attack', 'target': targets[col], 'heading': float(heading[row, col]),
+					'seen': sightings[col][0]}
+		self.orders = orders
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+'''
+Match clock synchronised from GAMETIMEUPDATE.
+
+The server periodically sends GAMETIMEUPDATE with its game time. GameClock
+maps local monotonic time onto match time. Network delay only ever makes
+a message late, so the sample with the least delay gives the best offset.
+The clock keeps the largest (match time - local time) seen over a sliding
+window, which follows slow drift.
+
+Frames are stamped on the clock's time base. Updates that arrive in one burst (less
+than `frameGap` apart) describe the same server tick and share one stamp,
+so receive jitter inside a burst does not leak into velocity estimates.
+Stamps never go backwards.
+
+Whether the server counts up or down is detected from the first two
+distinct samples. For a countdown, remaining() gives the seconds left.
+
+now() and stamp() are on one time base for the whole match: local
+monotonic time, corrected from the first sync on by how far the offset
+has moved since then. They do not jump when the first GAMETIMEUPDATE
+arrives, so times the models recorded before it (shots in flight, pickup
+collections, sightings) stay comparable with the times after it.
+serverTime() and remaining() give match time itself.
+'''
+
+import collections
+import time
+
+
+class GameClock(object):
+
+	def __init__(self, window=20, frameGap=0.01, direction=None):
+		self.samples = collections.deque(maxlen=window)
+		self.frameGap = frameGap
+		self.direction = direction
+		self.firstValue = None
+		self.offset = 0.0
+		# the offset at the first sync, where now() is rebased from
+		self.baseOffset = 0.0
+		self.synced = False
+		self.lastFrameLocal = None
+		self.lastStamp = None
+
+	def update(self, serverTime, local=None):
+		'''
+		Feed the Time value of a GAMETIMEUPDATE received at `local`
+		'''
+		if local is None:
+			local = time.monotonic()
+		if self.direction is None:
+			if self.firstValue is None or serverTime == self.firstValue:
+				self.firstValue = serverTime
+				return
+			self.direction = 1 if serverTime > self.firstValue else -1
+		# elapsed match time always increases, whichever way the server counts
+		self.samples.append(self.direction * serverTime - local)
+		self.offset = max(self.samples)
+		if not self.synced:
+			self.synced = True
+			self.baseOffset = self.offset
+
+	def now(self, local=None):
+		'''
+		Seconds on the clock's increasing time base (see above); only
+		differences between these values mean anything
+		'''
+		if local is None:
+			local = time.monotonic()
+		return local + self.offset - self.baseOffset
+
+	def serverTime(self, local=None):
+		'''
+		Estimated value the server would send in a GAMETIMEUPDATE right now
+		'''
+		if not self.synced:
+			return None
+		if local is None:
+			local = time.monotonic()
+		return self.direction * (local + self.offset)
+
+	def remaining(self, local=None):
+		'''
+		Seconds left in the match, if the server counts down
+		'''
+		if not self.synced or self.direction != -1:
+			return None
+		return self.serverTime(local)
+
+	def stamp(self, local=None):
+		'''
+		Time base value for a frame received at `local`
+		'''
+		if local is None:
+			local = time.monotonic()
+		if self.lastStamp is not None and local - self.lastFrameLocal <= self.frameGap:
+			stamp = self.lastStamp
+		else:
+			stamp = self.now(local)
+			if self.lastStamp is not None:
+				stamp = max(stamp, self.lastStamp)
+		self.lastFrameLocal = local
+		self.lastStamp = stamp
+		return stamp
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+
+'''
+Precomputed hit probabilities for fire decisions.
+
+The table holds the chance that a shell fired now hits, indexed by:
+
+	distance  to the target
+	bearing   of the target relative to where the shell will go (the
+	          turret heading), in degrees either side of it
+	speed     of the target
+	heading   of the target relative to the line of fire: 0 is driving
+	          straight away from us, 180 straight towards us
+
+It is built offline with physics.py. Every grid cell is simulated many
+times, with the inputs jittered within the cell and the target sometimes
+turning while the shell is in flight, and the fraction of hits is kept.
+The result is saved as a .npy file (with its axes in a .json next to
+it). At start-up a bot loads the file into a flat array of floats, and
+each fire decision is then one multilinear interpolation over the 16
+surrounding grid points, in plain Python (a few microseconds).
+
+	python bots/hitprob.py build --samples 32
+	python bots/hitprob.py query 40 3 10 90
+'''
+
+import argparse
+import array
+import logging
+import json
+import math
+import time
+import os
+
+import numpy as np
+
+from aiming import bearing, wrapAngle
+from servercomms import ServerMessageTypes
+import physics
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hitprob.npy')
+
+# bumped whenever the simulation changes, so stale tables are not used
+# (2: the turret turns with the hull; 3: turret targets are absolute)
+TABLE_VERSION = 3
+
+# (name, low, high, points); heading wraps, so its last point is its first
+AXES = (
+	('distance', 0.0, physics.SHELL_RANGE, 21),
+	('bearing', -45.0, 45.0, 46),
+	('speed', 0.0, physics.TANK_SPEED, 3),
+	('heading', 0.0, 360.0, 13),
+)
+
+
+class HitTable(object):
+	'''
+	A built table and its axes; lookups interpolate between grid points
+	'''
+
+	def __init__(self, table, axes=AXES):
+		self.table = table
+		self.axes = tuple(tuple(axis) for axis in axes)
+		self.steps = [(high - low) / (points - 1) for _, low, high, points in self.axes]
+		# a flat copy of plain floats, so a lookup never goes through numpy
+		self.flat = array.array('f', np.ascontiguousarray(table, dtype=np.float32).tobytes())
+		shape = [points for _, _, _, points in self.axes]
+		self.strides = (shape[1] * shape[2] * shape[3], shape[2] * shape[3], shape[3], 1)
+		# per axis: (low, high, step, last cell index, stride)
+		self.grid = [(low, high, step, points - 2, stride)
+			for (_, low, high, points), step, stride in zip(self.axes, self.steps, self.strides)]
+
+	def lookup(self, distance, bearing, speed, heading):
+		'''
+		Probability of a hit, 0 when the target is out of range or too far
+		off the line of fire to be in the table
+		'''
+		(_, _, maxDistance, _), (_, minBearing, maxBearing, _) = self.axes[:2]
+		bearing = wrapAngle(bearing)
+		if distance > maxDistance or not minBearing <= bearing <= maxBearing:
+			return 0.0
+		# plain float arithmetic throughout; this runs on every fire decision
+		base = 0
+		weights = []
+		for value, (low, high, step, last, stride) in zip((distance, bearing, speed, heading % 360.0), self.grid):
+			position = (min(high, max(low, value)) - low) / step
+			index = int(position)
+			if index > last:
+				index = last
+			base += index * stride
+			weights.append(position - index)
+		fd, fb, fs, fh = weights
+		sd, sb, ss, _ = self.strides
+		flat = self.flat
+		p = 0.0
+		for offsetD, wd in ((0, 1.0 - fd), (sd, fd)):
+			for offsetB, wb in ((offsetD, 1.0 - fb), (offsetD + sb, fb)):
+				for i, ws in ((base + offsetB, 1.0 - fs), (base + offsetB + ss, fs)):
+					p += wd * wb * ws * (flat[i] + (flat[i + 1] - flat[i]) * fh)
+		return p
+
+	def forTarget(self, x, y, aimHeading, target, speed):
+		'''
+		lookup() from positions: our tank at (x, y) firing along
+		aimHeading, at `target` (an OBJECTUPDATE) moving at `speed`
+		'''
+		line = bearing(x, y, target['X'], target['Y'])
+		return self.lookup(math.hypot(target['X'] - x, target['Y'] - y), line - aimHeading,
+			speed, target['Heading'] - line)
+
+
+def loadTable(path=DEFAULT_PATH):
+	'''
+	Load a built table, or None if there is none at `path` or it
+	was built by an older simulation and needs building again
+	'''
+	if not os.path.exists(path) or not os.path.exists(path + '.json'):
+		return None
+	with open(path + '.json') as f:
+		info = json.load(f)
+	if info.get('version') != TABLE_VERSION:
+		logging.warning("Hit table {} is out of date; rebuild it with hitprob.py build".format(path))
+		return None
+	return HitTable(np.load(path, mmap_mode='r'), info['axes'])
+
+
+def simulate(distance, bearing, speed, heading, dt=0.1, manoeuvre=0.2, rng=None):
+	'''
+	Fire one shell per arena and report which ones hit. All arguments are
+	arrays of one value per arena except speed, which is the target's
+	drive speed for the whole batch. With probability `manoeuvre` the
+	target turns one way or the other while the shell is in flight.
+	'''
+	rng = rng if rng is not None else np.random.default_rng()
+	arenas = len(distance)
+	# a big open arena, so no shot is spoiled by a wall
+	size = 4 * physics.SHELL_RANGE
+	world = physics.World(arenas, tanks=2, pickups=1, width=size, height=size, tankSpeed=max(speed, 1e-9))
+	world.pickups['active'] = False
+	world.pickups['respawnAt'] = np.inf
+	t = world.tanks
+	aim = rng.uniform(0.0, 360.0, arenas)
+	line = aim + bearing
+	dx, dy = physics.direction(line)
+	t['x'][:, 0], t['y'][:, 0] = 0.0, 0.0
+	t['heading'][:, 0] = t['turret'][:, 0] = aim
+	t['x'][:, 1], t['y'][:, 1] = distance * dx, distance * dy
+	t['heading'][:, 1] = t['turret'][:, 1] = (line + heading) % 360.0
+	t['drive'][:, 1] = 1 if speed > 0 else 0
+	turning = rng.random(arenas) < manoeuvre
+	t['turn'][:, 1] = np.where(turning, rng.choice((-1, 1), arenas), 0)
+	t['fire'][:, 0] = True
+
+	hit = np.zeros(arenas, dtype=bool)
+	for _ in range(int(math.ceil(physics.SHELL_RANGE / physics.SHELL_SPEED / dt)) + 2):
+		world.step(dt)
+		hit |= world.flags[ServerMessageTypes.SUCCESSFULLHIT][:, 0]
+		if not world.shells['live'].any():
+			break
+	return hit
+
+
+def build(samples=32, axes=AXES, dt=0.1, manoeuvre=0.2, seed=0, chunk=40000):
+	'''
+	The table of hit fractions, `samples` simulated shots per grid point
+	'''
+	rng = np.random.default_rng(seed)
+	shape = tuple(points for _, _, _, points in axes)
+	steps = [(high - low) / (points - 1) for _, low, high, points in axes]
+	table = np.zeros(shape, dtype=np.float32)
+	(_, dLow, _, _), (_, bLow, _, _), (_, sLow, _, _), (_, hLow, _, _) = axes
+	for s in range(shape[2]):
+		speed = sLow + s * steps[2]
+		cells = np.indices((shape[0], shape[1], shape[3])).reshape(3, -1)
+		cells = np.repeat(cells, samples, axis=1)
+		hits = np.zeros(cells.shape[1], dtype=bool)
+		for start in range(0, cells.shape[1], chunk):
+			d, b, h = cells[:, start:start + chunk]
+			# jitter each shot to anywhere within half a grid step of its point
+			jitter = lambda size: rng.uniform(-0.5, 0.5, len(d)) * size
+			distance = np.maximum(0.0, dLow + d * steps[0] + jitter(steps[0]))
+			bearing = bLow + b * steps[1] + jitter(steps[1])
+			heading = hLow + h * steps[3] + jitter(steps[3])
+			hits[start:start + chunk] = simulate(distance, bearing, speed, heading, dt, manoeuvre, rng)
+		table[:, :, s, :] = hits.reshape(shape[0], shape[1], shape[3], samples).mean(axis=-1)
+	# 0 and 360 are the same heading
+	table[..., 0] = table[..., -1] = (table[..., 0] + table[..., -1]) / 2.0
+	return table
+
+
+def save(table, path=DEFAULT_PATH, axes=AXES):
+	np.save(path, table)
+	with open(path + '.json', 'w') as f:
+		json.dump({'version': TABLE_VERSION, 'axes': [list(axis) for axis in axes]}, f, indent=2)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('command', choices=('build', 'query'), help='Build the table, or look one shot up in it')
+	parser.add_argument('values', nargs='*', type=float, help='For query: distance bearing speed heading')
+	parser.add_argument('-o', '--output', default=DEFAULT_PATH, help='Table file')
+	parser.add_argument('-s', '--samples', default=32, type=int, help='Simulated shots per grid point')
+	parser.add_argument('--manoeuvre', default=0.2, type=float, help='Chance the target turns while a shell is in flight')
+	parser.add_argument('--seed', default=0, type=int, help='Simulation seed')
+	args = parser.parse_intermixed_args()
+
+	if args.command == 'build':
+		start = time.perf_counter()
+		table = build(args.samples, manoeuvre=args.manoeuvre, seed=args.seed)
+		save(table, args.output)
+		print('{} grid points x {} shots in {:.1f} s, written to {}'.format(
+			table.size, args.samples, time.perf_counter() - start, args.output))
+	else:
+		table = loadTable(args.output)
+		if table is None:
+			parser.error('no usable table at {}; run build first'.format(args.output))
+		if len(args.values) != 4:
+			parser.error('query takes distance bearing speed heading')
+		p = table.lookup(*args.values)
+		start = time.perf_counter()
+		for _ in range(1000):
+			table.lookup(*args.values)
+		print('hit probability {:.3f} (lookup takes {:.1f} us)'.format(p, (time.perf_counter() - start) * 1e3))
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+'''
+In-process reloading of a strategy module.
+
+Reloader re-imports a module when asked to by a signal (SIGHUP by
+default) or, with watch=True, when its source file's mtime changes.
+The actual reload only happens when the owner calls check(), so a bot can
+swap code between ticks and never in the middle of a handler.
+
+A reload that raises (a syntax error, a bad import) is logged and
+rolled back: the module keeps its previous namespace and the bot carries
+on with the old code.
+'''
+
+import importlib
+import logging
+import threading
+import signal
+import time
+import os
+
+
+class Reloader(object):
+
+	def __init__(self, module, watch=False, interval=1.0, signum=signal.SIGHUP, onReload=None):
+		self.module = module
+		self.watch = watch
+		self.interval = interval
+		self.onReload = onReload
+		self.pending = False
+		self.nextPoll = 0.0
+		self.mtime = self.sourceMtime()
+		self.reloads = 0
+		# signal handlers can only be installed from the main thread
+		if signum is not None and threading.current_thread() is threading.main_thread():
+			signal.signal(signum, self.request)
+
+	def sourceMtime(self):
+		try:
+			return os.stat(self.module.__file__).st_mtime
+		except OSError:
+			return None
+
+	def request(self, signum=None, frame=None):
+		'''
+		Ask for a reload at the next check(); safe to call from a signal handler
+		'''
+		self.pending = True
+
+	def changed(self):
+		if not self.watch:
+			return False
+		now = time.monotonic()
+		if now < self.nextPoll:
+			return False
+		self.nextPoll = now + self.interval
+		mtime = self.sourceMtime()
+		if mtime is None or mtime == self.mtime:
+			return False
+		self.mtime = mtime
+		return True
+
+	def check(self):
+		'''
+		Reload the module if a reload is due. Returns True when new code
+		was loaded.
+		'''
+		if not (self.pending or self.changed()):
+			return False
+		self.pending = False
+		saved = dict(self.module.__dict__)
+		try:
+			importlib.reload(self.module)
+		except Exception:
+			logging.exception("Reloading {} failed, keeping the old code".format(self.module.__name__))
+			self.module.__dict__.clear()
+			self.module.__dict__.update(saved)
+			return False
+		self.reloads += 1
+		self.mtime = self.sourceMtime()
+		logging.info("Reloaded {} ({} reloads)".format(self.module.__name__, self.reloads))
+		if self.onReload is not None:
+			self.onReload()
+		return True
@@ -9,6 +9,9 @@ import argparse
 import random
 import time
 
+# seconds between random course changes
+JITTER = 0.5
+
 
 class ServerMessageTypes(object):
     TEST = 0
@@ -51,7 +54,7 @@ class ServerMessageTypes(object):
     TOGGLELEFT: "TOGGLELEFT",
     TOGGLERIGHT: "TOGGLERIGHT",
     TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-    TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+    TOGGLETURRETRIGHT: "TOGGLETURRETRIGHT",
     TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
     TURNTOHEADING: "TURNTOHEADING",
     MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
@@ -99,19 +102,21 @@ class ServerComms(object):
         self.ServerSocket.connect((hostname, port))
 
     def readTolength(self, length):
-        messageData = self.ServerSocket.recv(length)
+        messageData = b''
         while len(messageData) < length:
             buffData = self.ServerSocket.recv(length - len(messageData))
-            if buffData:
-                messageData += buffData
+            if not buffData:
+                # recv only returns nothing once the server has gone away
+                raise socket.error('server closed the connection')
+            messageData += buffData
         return messageData
 
     def readMessage(self):
         '''
         Read a message from the server
         '''
-        messageTypeRaw = self.ServerSocket.recv(1)
-        messageLenRaw = self.ServerSocket.recv(1)
+        messageTypeRaw = self.readTolength(1)
+        messageLenRaw = self.readTolength(1)
         messageType = struct.unpack('>B', messageTypeRaw)[0]
         messageLen = struct.unpack('>B', messageLenRaw)[0]
 
@@ -156,55 +161,65 @@ class ServerComms(object):
         return self.ServerSocket.send(message)
 
 
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
-args = parser.parse_args()
-
-# Set up console logging
-if args.debug:
-    logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-    logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
-
-
-# Connect to game server
-GameServer = ServerComms(args.hostname, args.port)
-
-# Spawn our tank
-logging.info("Creating tank with name '{}'".format(args.name))
-GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
 
-# Main loop - read game messages, ignore them and randomly perform actions
-i=0
 
-health = 3
-ammo = 10
-moving = False
+def main(argv=None, comms=None):
+    # Parse command line args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+    parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+    parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+    parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
+    args = parser.parse_args(argv)
 
-while True:
-    #Decoy bot
-
-    message = GameServer.readMessage()
-
-    if not moving:
-        print("FUCK YOU")
-        GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
-        moving = True
-    if message["messageType"] == 18 and message['Name'] == args.name:
-        x,y = (message['X'],message['Y'])
-    if x > 0:
-        if y > 0:
-            GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(90,180)})#+45})
-        else:
-            GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(180,270)})#+45})
+    # Set up console logging
+    if args.debug:
+        logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
     else:
-        if y > 0:
-            GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(0,90)})#+45})
+        logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+
+
+    # Connect to game server, unless a simulator hands us its comms
+    GameServer = comms if comms is not None else ServerComms(args.hostname, args.port)
+
+    # Spawn our tank
+    logging.info("Creating tank with name '{}'".format(args.name))
+    GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+
+    # Main loop - read game messages, ignore them and randomly perform actions
+    i=0
+
+    health = 3
+    ammo = 10
+    moving = False
+    x = y = None
+
+    while True:
+        #Decoy bot
+
+        message = GameServer.readMessage()
+
+        if not moving:
+            print("FUCK YOU")
+            GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+            moving = True
+        if message["messageType"] == 18 and message['Name'] == args.name:
+            x,y = (message['X'],message['Y'])
+        if x is None:
+            continue
+        if x > 0:
+            if y > 0:
+                GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(90,180)})#+45})
+            else:
+                GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(180,270)})#+45})
         else:
-            GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': (random.randint(270,360))})#+45)%360})
+            if y > 0:
+                GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': random.randint(0,90)})#+45})
+            else:
+                GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING,{'Amount': (random.randint(270,360))})#+45)%360})
+
+        time.sleep(JITTER)
+
 
-    time.sleep(0.5)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
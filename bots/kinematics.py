@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+'''
+Observed kinematics of our own tank.
+
+KinematicsProfiler watches consecutive OBJECTUPDATEs for our tank and keeps
+running statistics of the hull turn rate, turret turn rate, linear speed
+and the interval between updates. Rates are only sampled while the tank
+is actually turning or moving, so idle periods do not drag the averages
+to zero. turnTime and moveTime turn those into waits that can replace the
+fixed sleeps in the bots, falling back to the old guesses until there is
+data.
+'''
+
+import math
+
+from aiming import wrapAngle
+
+
+class RunningStats(object):
+	'''
+	Mean, variance, min and max of a stream (Welford's algorithm)
+	'''
+
+	def __init__(self):
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = None
+		self.max = None
+
+	def push(self, value):
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+		self.min = value if self.min is None else min(self.min, value)
+		self.max = value if self.max is None else max(self.max, value)
+
+	def variance(self):
+		return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+	def stddev(self):
+		return math.sqrt(self.variance())
+
+	def __repr__(self):
+		return 'RunningStats(count={}, mean={:.3f}, stddev={:.3f}, min={}, max={})'.format(
+			self.count, self.mean, self.stddev(), self.min, self.max)
+
+
+class KinematicsProfiler(object):
+	'''
+	Learns turn rates (degrees/s), speed (units/s) and update interval (s)
+	from our own tank's OBJECTUPDATEs
+	'''
+
+	def __init__(self, minRate=1.0, minSpeed=0.5):
+		self.minRate = minRate
+		self.minSpeed = minSpeed
+		self.hullTurnRate = RunningStats()
+		self.turretTurnRate = RunningStats()
+		self.speed = RunningStats()
+		self.updateInterval = RunningStats()
+		self.last = None
+
+	def observe(self, message, now):
+		'''
+		Feed an OBJECTUPDATE payload for our own tank received at `now`
+		'''
+		current = (now, message['X'], message['Y'], message['Heading'], message['TurretHeading'])
+		if self.last is not None:
+			then, x, y, heading, turretHeading = self.last
+			dt = now - then
+			if dt > 0:
+				self.updateInterval.push(dt)
+				hullRate = abs(wrapAngle(current[3] - heading)) / dt
+				turretRate = abs(wrapAngle(current[4] - turretHeading)) / dt
+				speed = math.hypot(current[1] - x, current[2] - y) / dt
+				if hullRate >= self.minRate:
+					self.hullTurnRate.push(hullRate)
+				if turretRate >= self.minRate:
+					self.turretTurnRate.push(turretRate)
+				if speed >= self.minSpeed:
+					self.speed.push(speed)
+		self.last = current
+
+	def turnTime(self, fromHeading, toHeading, default, maximum=None):
+		'''
+		Expected seconds for the hull to turn between two headings
+		'''
+		return self.estimate(abs(wrapAngle(toHeading - fromHeading)), self.hullTurnRate, default, maximum)
+
+	def turretTurnTime(self, fromHeading, toHeading, default, maximum=None):
+		return self.estimate(abs(wrapAngle(toHeading - fromHeading)), self.turretTurnRate, default, maximum)
+
+	def moveTime(self, distance, default, maximum=None):
+		'''
+		Expected seconds to drive `distance` units
+		'''
+		return self.estimate(abs(distance), self.speed, default, maximum)
+
+	def estimate(self, amount, rate, default, maximum):
+		if rate.count == 0 or rate.mean <= 0:
+			return default
+		seconds = amount / rate.mean
+		if maximum is not None:
+			seconds = min(seconds, maximum)
+		return seconds
+
+	def summary(self):
+		return {
+			'hullTurnRate': self.hullTurnRate,
+			'turretTurnRate': self.turretTurnRate,
+			'speed': self.speed,
+			'updateInterval': self.updateInterval,
+		}
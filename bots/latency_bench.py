@@ -0,0 +1,326 @@
+#!/usr/bin/python
+
+'''
+Decision-latency benchmark for the bots.
+
+Starts a fake MSTanks server on localhost, launches each bot script against
+it as a headless subprocess and plays a scripted scenario of OBJECTUPDATE
+frames. Every tick carries a stimulus frame (our own tank while searching,
+an enemy tank while targeting, a KILL before banking) which is timestamped
+as it is written to the socket. Each matching command that comes back
+(e.g. FIRE or TURNTOHEADING for an enemy sighting) closes the measurement
+of the earliest stimulus still waiting for one. A bot that exits during
+the run is reported with the tail of its stderr.
+
+Latencies are reported per bot and per state, so the cost of things like the
+0.1s update() gap heuristic and the time.sleep calls shows up directly.
+
+	python bots/latency_bench.py --ticks 60 --interval 0.35
+'''
+
+import json
+import socket
+import struct
+import argparse
+import subprocess
+import threading
+import tempfile
+import logging
+import time
+import sys
+import os
+
+from servercomms import ServerMessageTypes
+from protocol import encodeFrame as encodeMessage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOTS = {
+	'big_bad_boy': os.path.join(REPO_ROOT, 'calum', 'big_bad_boy.py'),
+	'shoot_if_see': os.path.join(REPO_ROOT, 'calum', 'shoot_if_see.py'),
+	'StarterBot': os.path.join(REPO_ROOT, 'bots', 'StarterBot.py'),
+}
+
+# Commands that count as a reaction to the stimulus of each state
+RESPONSES = {
+	'searching': None, # anything the bot sends
+	'targeting': (ServerMessageTypes.FIRE,
+		ServerMessageTypes.TURNTOHEADING,
+		ServerMessageTypes.TURNTURRETTOHEADING),
+	'banking': (ServerMessageTypes.TURNTOHEADING,
+		ServerMessageTypes.TOGGLEFORWARD),
+}
+
+# One scenario cycle, as (state, number of ticks)
+SCENARIO = [
+	('searching', 4),
+	('targeting', 4),
+	('banking', 3),
+]
+
+
+def tankUpdate(name, objectId, x, y, heading=0.0, turretHeading=0.0, health=3, ammo=10):
+	'''
+	OBJECTUPDATE payload for a tank, with the fields seen in logs.txt
+	'''
+	return {'Id': objectId, 'Name': name, 'Type': 'Tank', 'X': x, 'Y': y,
+		'Heading': heading, 'TurretHeading': turretHeading,
+		'Health': health, 'Ammo': ammo}
+
+
+def recvExactly(sock, length):
+	data = b''
+	while len(data) < length:
+		chunk = sock.recv(length - len(data))
+		if not chunk:
+			raise EOFError('bot closed the connection')
+		data += chunk
+	return data
+
+
+class TankConnection(object):
+	'''
+	Server side of one tank connection.
+
+	A reader thread records every command the bot sends as
+	(time, messageType, payload); the scenario thread records stimuli as
+	(time, state). Matching is done afterwards so neither thread blocks
+	on the other.
+	'''
+
+	def __init__(self, sock):
+		self.sock = sock
+		self.name = None
+		self.commands = []
+		self.stimuli = []
+		self.closed = threading.Event()
+		self.sendLock = threading.Lock()
+
+	def readCreateTank(self):
+		messageType, payload = self.readCommand()
+		if messageType != ServerMessageTypes.CREATETANK:
+			raise ValueError('expected CREATETANK, got {}'.format(messageType))
+		self.name = payload['Name']
+
+	def readCommand(self):
+		messageType, messageLen = struct.unpack('>BB', recvExactly(self.sock, 2))
+		payload = None
+		if messageLen:
+			payload = json.loads(recvExactly(self.sock, messageLen).decode('utf-8'))
+		return messageType, payload
+
+	def readLoop(self):
+		try:
+			while True:
+				messageType, payload = self.readCommand()
+				self.commands.append((time.perf_counter(), messageType, payload))
+		except (EOFError, socket.error, ValueError):
+			pass
+		finally:
+			self.closed.set()
+
+	def send(self, frames, state=None):
+		'''
+		Write a burst of frames, timestamping the first as a stimulus
+		'''
+		data = b''.join(frames)
+		with self.sendLock:
+			if state is not None:
+				self.stimuli.append((time.perf_counter(), state))
+			self.sock.sendall(data)
+
+
+class FakeServer(object):
+	'''
+	Minimal MSTanks stand-in that accepts tank connections and replays
+	a scenario to each of them
+	'''
+
+	def __init__(self, interval, ticks):
+		self.interval = interval
+		self.ticks = ticks
+		self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.listener.bind(('127.0.0.1', 0))
+		self.listener.listen(8)
+		self.port = self.listener.getsockname()[1]
+		self.connections = []
+		self.players = []
+
+	def acceptLoop(self, expected, timeout):
+		self.listener.settimeout(timeout)
+		try:
+			while len(self.connections) < expected:
+				sock, _ = self.listener.accept()
+				sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+				conn = TankConnection(sock)
+				self.connections.append(conn)
+				player = threading.Thread(target=self.serve, args=(conn,))
+				player.daemon = True
+				player.start()
+				self.players.append(player)
+		except socket.timeout:
+			pass
+
+	def serve(self, conn):
+		try:
+			conn.readCreateTank()
+			reader = threading.Thread(target=conn.readLoop)
+			reader.daemon = True
+			reader.start()
+			self.playScenario(conn)
+		except (EOFError, socket.error, ValueError) as e:
+			logging.info("Connection for {} ended: {}".format(conn.name, e))
+			conn.closed.set()
+
+	def playScenario(self, conn):
+		enemy = 'Enemy:Target'
+		x, y, heading = 0.0, 0.0, 0.0
+		tick = 0
+		while tick < self.ticks and not conn.closed.is_set():
+			for state, count in SCENARIO:
+				for i in range(count):
+					if tick >= self.ticks or conn.closed.is_set():
+						return
+					me = encodeMessage(ServerMessageTypes.OBJECTUPDATE,
+						tankUpdate(conn.name, 1, x, y, heading, heading))
+					if state == 'searching':
+						conn.send([me], state)
+					elif state == 'targeting':
+						# inside big_bad_boy's 50 unit firing range, off our heading
+						target = tankUpdate(enemy, 2, x + 20.0, y + 20.0 + i)
+						conn.send([encodeMessage(ServerMessageTypes.OBJECTUPDATE, target), me], state)
+					elif i == 0:
+						conn.send([encodeMessage(ServerMessageTypes.KILL), me], state)
+					elif i == count - 1:
+						conn.send([me, encodeMessage(ServerMessageTypes.ENTEREDGOAL)], state)
+					else:
+						conn.send([me], state)
+					tick += 1
+					time.sleep(self.interval)
+
+	def close(self):
+		self.listener.close()
+		for conn in self.connections:
+			try:
+				conn.sock.close()
+			except socket.error:
+				pass
+
+
+def matchLatencies(conn):
+	'''
+	Pair each command with the earliest stimulus it answers that has not
+	been answered yet, so a bot that falls behind (e.g. in a long sleep)
+	shows the full delay rather than a quick reply to a later stimulus.
+	Returns {state: [latency or None]}
+	'''
+	commands = list(conn.commands)
+	stimuli = list(conn.stimuli)
+	latencies = [None] * len(stimuli)
+	pending = []
+	s = 0
+	for when, messageType, _ in commands:
+		while s < len(stimuli) and stimuli[s][0] <= when:
+			pending.append(s)
+			s += 1
+		for p in pending:
+			wanted = RESPONSES[stimuli[p][1]]
+			if wanted is None or messageType in wanted:
+				latencies[p] = when - stimuli[p][0]
+				pending.remove(p)
+				break
+	results = {}
+	for (_, state), latency in zip(stimuli, latencies):
+		results.setdefault(state, []).append(latency)
+	return results
+
+
+def percentile(values, q):
+	ordered = sorted(values)
+	index = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+	return ordered[index]
+
+
+def summarise(latencies):
+	reacted = [l for l in latencies if l is not None]
+	summary = {'stimuli': len(latencies), 'reacted': len(reacted)}
+	if reacted:
+		for q in (50, 90, 99):
+			summary['p{}_ms'.format(q)] = percentile(reacted, q) * 1000.0
+		summary['max_ms'] = max(reacted) * 1000.0
+	return summary
+
+
+def runBot(bot, script, interval, ticks, connections):
+	server = FakeServer(interval, ticks)
+	# stderr goes to a file rather than a pipe, so a chatty bot never blocks on it
+	errors = tempfile.TemporaryFile()
+	process = subprocess.Popen(
+		[sys.executable, script, '-H', '127.0.0.1', '-p', str(server.port), '-n', 'Bench:' + bot],
+		cwd=os.path.dirname(script), stdout=subprocess.DEVNULL, stderr=errors)
+	try:
+		server.acceptLoop(connections, timeout=10.0)
+		deadline = time.time() + ticks * interval + 5.0
+		for thread in server.players:
+			thread.join(max(0.0, deadline - time.time()))
+		# the server never hangs up first, so a bot that has exited crashed
+		exitCode = process.poll()
+	finally:
+		process.kill()
+		process.wait()
+		server.close()
+	stderr = None
+	if exitCode is not None:
+		errors.seek(0)
+		stderr = errors.read().decode('utf-8', 'replace')
+	errors.close()
+
+	perState = {}
+	for conn in server.connections:
+		for state, latencies in matchLatencies(conn).items():
+			perState.setdefault(state, []).extend(latencies)
+	return {
+		'connections': len(server.connections),
+		'states': dict((state, summarise(l)) for state, l in perState.items()),
+		'exitCode': exitCode,
+		'stderr': stderr,
+	}
+
+
+def printReport(report):
+	print('{:<14}{:<11}{:>8}{:>8}{:>9}{:>9}{:>9}{:>9}'.format(
+		'bot', 'state', 'stimuli', 'reacted', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+	for bot, result in report.items():
+		if not result['states']:
+			print('{:<14}(no connection)'.format(bot))
+		for state, s in sorted(result['states'].items()):
+			cells = ['{:9.1f}'.format(s[k]) if k in s else '{:>9}'.format('-')
+				for k in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms')]
+			print('{:<14}{:<11}{:>8}{:>8}{}'.format(bot, state, s['stimuli'], s['reacted'], ''.join(cells)))
+	for bot, result in report.items():
+		if result.get('exitCode') is not None:
+			print('\n{} exited with code {} during the run:'.format(bot, result['exitCode']))
+			print('\n'.join(result['stderr'].rstrip().splitlines()[-15:]))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-b', '--bot', action='append', choices=sorted(BOTS), help='Bot to benchmark (default: all)')
+	parser.add_argument('-t', '--ticks', default=44, type=int, help='Scenario ticks per connection')
+	parser.add_argument('-i', '--interval', default=0.35, type=float, help='Seconds between server ticks')
+	parser.add_argument('--json', help='Also write the raw report to this file')
+	args = parser.parse_args()
+
+	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.WARNING)
+
+	report = {}
+	for bot in args.bot or sorted(BOTS):
+		# StarterBot spawns its four tanks on separate connections
+		connections = 4 if bot == 'StarterBot' else 1
+		report[bot] = runBot(bot, BOTS[bot], args.interval, args.ticks, connections)
+
+	printReport(report)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(report, f, indent=2)
@@ -0,0 +1,374 @@
+#!/usr/bin/python
+
+'''
+Lockstep match runner: whole matches against the physics core in
+physics.py, in one process, with no sockets and no wall-clock waits.
+
+Each bot runs its normal code on its own thread with a SimComms in place
+of ServerComms. SimComms hands out OBJECTUPDATEs and events from an
+in-memory inbox and turns sent commands into World.command() calls.
+Time is virtual. The `time` module of every bot module is swapped for a
+VirtualTime while the match runs, so time.time() reads the simulated
+clock and time.sleep() blocks until the simulation reaches the wake-up
+time. The world only steps once every bot is blocked, either on an empty
+inbox or in a sleep. A three minute match takes as long as the bots'
+own code does, usually well under a second.
+
+When the match ends every blocked bot gets MatchOver, and runMatch()
+returns the scoreboard.
+
+	python bots/lockstep.py -b big_bad_boy -b StarterBot -b StarterBot --seed 1
+'''
+
+import importlib.util
+import collections
+import threading
+import argparse
+import logging
+import gc
+import time
+import sys
+import os
+
+from servercomms import ServerComms, ServerMessageTypes
+from records import restoreGC
+import physics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# an arbitrary start of match for time.time(), so bots see a plausible epoch
+EPOCH = 1.5e9
+
+
+class MatchOver(Exception):
+	'''
+	Raised in a bot thread that blocks after the match has ended
+	'''
+
+
+class VirtualTime(object):
+	'''
+	Stand-in for the time module, reading the scheduler's clock. Anything
+	not simulated (strftime, thread_time ...) is the real time module's.
+	'''
+
+	def __init__(self, scheduler):
+		self.scheduler = scheduler
+
+	def time(self):
+		return EPOCH + self.scheduler.now
+
+	def monotonic(self):
+		return self.scheduler.now
+
+	def perf_counter(self):
+		return self.scheduler.now
+
+	def sleep(self, seconds):
+		self.scheduler.sleep(seconds)
+
+	def __getattr__(self, name):
+		return getattr(time, name)
+
+
+class SimComms(ServerComms):
+	'''
+	ServerComms for one simulated tank. Nothing is encoded or decoded;
+	payloads go straight from the world to the bot and back.
+	'''
+
+	def __init__(self, scheduler, tank, clock=None):
+		self.scheduler = scheduler
+		self.tank = tank
+		self.inbox = collections.deque()
+		self.readBuffer = bytearray()
+		self.watchdog = None
+		self.clock = clock
+		self.spawned = False
+		self.sent = 0
+
+	def readFrame(self):
+		if not self.inbox:
+			self.scheduler.block(lambda: self.inbox)
+		messageType, messagePayload = self.inbox.popleft()
+		if messageType == ServerMessageTypes.GAMETIMEUPDATE and self.clock is not None:
+			self.clock.update(messagePayload['Time'], self.scheduler.now)
+		return messageType, messagePayload
+
+	def sendMessage(self, messageType=None, messagePayload=None):
+		self.sent += 1
+		if messageType == ServerMessageTypes.CREATETANK:
+			self.scheduler.spawn(self, messagePayload['Name'])
+			return
+		amount = messagePayload.get('Amount') if messagePayload else None
+		self.scheduler.world.command(self.scheduler.arena, self.tank, messageType, amount)
+
+	def send(self, message):
+		self.sendMessage(message.messageType, message.toPayload())
+
+	def close(self):
+		pass
+
+
+class Lockstep(object):
+	'''
+	Runs bot threads against one arena of a World in virtual time.
+
+	Every `updateInterval` simulated seconds each tank is sent its
+	OBJECTUPDATEs, and every second a GAMETIMEUPDATE counting down to the
+	end of the match. Events (hits, kills, pickups ...) are sent on the
+	physics step they happen in.
+	'''
+
+	def __init__(self, world, arena=0, duration=180.0, dt=0.1, updateInterval=0.2):
+		self.world = world
+		self.arena = arena
+		self.duration = duration
+		self.dt = dt
+		self.updateInterval = updateInterval
+		self.now = 0.0
+		self.steps = 0
+		self.nextUpdate = 0.0
+		self.nextTimeUpdate = 0.0
+		self.over = False
+		self.comms = []
+		self.deaths = [0] * world.tankCount
+		self.errors = []
+
+		self.cond = threading.Condition()
+		self.active = 0
+		self.waiting = 0
+		self.generation = 0
+		self.virtualTime = VirtualTime(self)
+
+	def attach(self):
+		'''
+		A SimComms for the next free tank slot
+		'''
+		if len(self.comms) >= self.world.tankCount:
+			raise ValueError('the world only has {} tanks'.format(self.world.tankCount))
+		comms = SimComms(self, len(self.comms))
+		self.comms.append(comms)
+		return comms
+
+	def spawn(self, comms, name):
+		self.world.names[self.arena][comms.tank] = name
+		comms.spawned = True
+
+	def sleep(self, seconds):
+		wake = self.now + max(0.0, seconds)
+		self.block(lambda: self.now >= wake)
+
+	def block(self, ready):
+		'''
+		Wait until ready() is true. The last running thread to block steps
+		the world for everyone.
+		'''
+		with self.cond:
+			while not ready():
+				if self.over:
+					raise MatchOver()
+				self.waiting += 1
+				if self.waiting >= self.active:
+					self.advance()
+				else:
+					generation = self.generation
+					while generation == self.generation and not self.over:
+						self.cond.wait()
+
+	def advance(self):
+		'''
+		Step the world once and deliver what it produced. Called with the
+		condition held.
+		'''
+		world, a = self.world, self.arena
+		world.step(self.dt)
+		self.steps += 1
+		self.now = self.steps * self.dt
+		for comms in self.comms:
+			for messageType in world.events(a, comms.tank):
+				if messageType == ServerMessageTypes.DESTROYED:
+					self.deaths[comms.tank] += 1
+				if comms.spawned:
+					comms.inbox.append((messageType, None))
+		if self.now >= self.duration - 1e-9:
+			self.over = True
+		else:
+			if self.now >= self.nextTimeUpdate - 1e-9:
+				self.nextTimeUpdate += 1.0
+				for comms in self.comms:
+					if comms.spawned:
+						comms.inbox.append((ServerMessageTypes.GAMETIMEUPDATE, {'Time': int(round(self.duration - self.now))}))
+			if self.now >= self.nextUpdate - 1e-9:
+				self.nextUpdate += self.updateInterval
+				tanksSeen = world.visibleTanks()
+				pickupsSeen = world.visiblePickups()
+				for comms in self.comms:
+					if comms.spawned:
+						for update in world.objectUpdates(a, comms.tank, tanksSeen, pickupsSeen):
+							comms.inbox.append((ServerMessageTypes.OBJECTUPDATE, update))
+		self.waiting = 0
+		self.generation += 1
+		self.cond.notify_all()
+
+	def runThread(self, comms, target):
+		try:
+			target(comms)
+		except MatchOver:
+			pass
+		except Exception as e:
+			logging.exception("Bot on tank {} failed".format(comms.tank + 1))
+			self.errors.append((comms.tank, e))
+		finally:
+			with self.cond:
+				self.active -= 1
+				if self.active and self.waiting >= self.active and not self.over:
+					self.advance()
+
+	def run(self, targets, modules=()):
+		'''
+		Run one thread per target(comms) until the match ends. `modules`
+		get their `time` swapped for this scheduler's VirtualTime. Bots may
+		reconfigure the cyclic GC; it is put back as it was afterwards.
+		'''
+		previousGC = (gc.isenabled(), gc.get_threshold())
+		saved = [(module, module.time) for module in modules if hasattr(module, 'time')]
+		for module, _ in saved:
+			module.time = self.virtualTime
+		threads = []
+		try:
+			with self.cond:
+				for target in targets:
+					comms = self.attach()
+					thread = threading.Thread(target=self.runThread, args=(comms, target))
+					thread.daemon = True
+					threads.append(thread)
+				self.active = len(threads)
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+		finally:
+			for module, original in saved:
+				module.time = original
+			restoreGC(previousGC)
+		return self.scores()
+
+	def scores(self):
+		t = self.world.tanks[self.arena]
+		board = []
+		for comms in self.comms:
+			k = comms.tank
+			board.append({'name': self.world.names[self.arena][k], 'kills': int(t['kills'][k]),
+				'deaths': self.deaths[k], 'banked': int(t['banked'][k]), 'points': int(t['points'][k]),
+				'shots': int(t['shots'][k]), 'health': int(t['health'][k])})
+		return board
+
+
+def loadInstance(script, name='bot'):
+	'''
+	A private copy of a bot script's module, so several tanks can run the
+	same bot in one process without sharing globals
+	'''
+	directory = os.path.dirname(os.path.abspath(script))
+	if directory not in sys.path:
+		sys.path.insert(0, directory)
+	spec = importlib.util.spec_from_file_location(name, script)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+
+def bigBadBoy(params=None, argv=()):
+	'''
+	Bot factory for calum/big_bad_boy.py. `params` overrides constants
+	in the tank's own copy of big_bad_boy_strategy.
+	'''
+	def make(name):
+		module = loadInstance(os.path.join(REPO_ROOT, 'calum', 'big_bad_boy.py'))
+		module.strategy = loadInstance(os.path.join(REPO_ROOT, 'calum', 'big_bad_boy_strategy.py'), 'big_bad_boy_strategy')
+		for key, value in (params or {}).items():
+			setattr(module.strategy, key, value)
+
+		def target(comms):
+			# one process plays many matches, so leave its GC alone
+			module.main(['-n', name, '-g', 'default'] + list(argv), comms=comms)
+		return target, [module, module.strategy]
+	return make
+
+
+def starterBot():
+	'''
+	Bot factory for bots/StarterBot.py's per-tank logic()
+	'''
+	def make(name):
+		module = loadInstance(os.path.join(REPO_ROOT, 'bots', 'StarterBot.py'))
+
+		def target(comms):
+			module.logic(name, comms)
+		return target, [module]
+	return make
+
+
+def james1(params=None):
+	'''
+	Bot factory for bots/james1.py. `params` overrides its module
+	constants, e.g. {'JITTER': 0.3}.
+	'''
+	def make(name):
+		module = loadInstance(os.path.join(REPO_ROOT, 'bots', 'james1.py'))
+		for key, value in (params or {}).items():
+			setattr(module, key, value)
+
+		def target(comms):
+			module.main(['-n', name], comms=comms)
+		return target, [module]
+	return make
+
+
+BOTS = {
+	'big_bad_boy': bigBadBoy,
+	'StarterBot': starterBot,
+	'james1': james1,
+}
+
+
+def runMatch(bots, duration=180.0, dt=0.1, updateInterval=0.2, seed=None, pickups=4):
+	'''
+	Play one match. `bots` is a list of (name, factory) where factory(name)
+	returns (target(comms), modules to run in virtual time). Returns the
+	scoreboard, one dict per tank.
+	'''
+	import gameclock
+	import servercomms
+
+	world = physics.World(arenas=1, tanks=len(bots), pickups=pickups, seed=seed)
+	scheduler = Lockstep(world, duration=duration, dt=dt, updateInterval=updateInterval)
+	targets, modules = [], [gameclock, servercomms]
+	for name, make in bots:
+		target, botModules = make(name)
+		targets.append(target)
+		modules.extend(botModules)
+	return scheduler.run(targets, modules)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-b', '--bot', action='append', choices=sorted(BOTS), help='Bot for the next tank (repeat for several)')
+	parser.add_argument('--duration', default=180.0, type=float, help='Match length in simulated seconds')
+	parser.add_argument('--dt', default=0.1, type=float, help='Physics step in simulated seconds')
+	parser.add_argument('--seed', type=int, help='World seed')
+	parser.add_argument('-d', '--debug', action='store_true', help='Show the bots\' own logging')
+	args = parser.parse_args()
+
+	logging.basicConfig(format='%(message)s', level=logging.DEBUG if args.debug else logging.WARNING)
+
+	bots = [('Sim:{}{}'.format(bot, i + 1), BOTS[bot]()) for i, bot in enumerate(args.bot or ['big_bad_boy', 'StarterBot'])]
+	start = time.perf_counter()
+	board = runMatch(bots, args.duration, args.dt, seed=args.seed)
+	elapsed = time.perf_counter() - start
+
+	print('{:<28}{:>7}{:>7}{:>7}{:>7}{:>7}'.format('tank', 'kills', 'deaths', 'banked', 'points', 'shots'))
+	for row in board:
+		print('{:<28}{:>7}{:>7}{:>7}{:>7}{:>7}'.format(row['name'], row['kills'], row['deaths'], row['banked'], row['points'], row['shots']))
+	print('{:.0f} simulated seconds in {:.3f} s'.format(args.duration, elapsed))
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+'''
+Arena occupancy and threat map.
+
+OccupancyMap keeps one grid per kind of observation (enemy tanks, health,
+ammo and snitch pickups, deaths) over the arena. Every OBJECTUPDATE adds
+to a single cell, and old observations fade with a configurable half-life.
+
+Decay is applied lazily: weights are stored pre-multiplied by
+exp(t / tau), so adding an observation is one array write no matter how
+many cells there are. Reading a layer divides by the current scale.
+When the scale grows too large the stored values are rebased, which
+happens once every few hours of match time.
+
+Several tanks can feed the same map; updates are O(1) per frame.
+'''
+
+import math
+
+import numpy as np
+
+LAYERS = ('enemy', 'health', 'ammo', 'snitch', 'deaths')
+
+PICKUP_LAYERS = {
+	'HealthPickup': 'health',
+	'AmmoPickup': 'ammo',
+	'Snitch': 'snitch',
+}
+
+
+class OccupancyMap(object):
+	'''
+	Decaying per-cell observation density, one grid per layer
+	'''
+
+	def __init__(self, ourNames=(), width=140.0, height=200.0, cellSize=5.0, halfLife=30.0):
+		self.ourNames = set(ourNames)
+		self.width = width
+		self.height = height
+		self.cellSize = cellSize
+		self.tau = halfLife / math.log(2)
+
+		self.cols = int(math.ceil(width / cellSize))
+		self.rows = int(math.ceil(height / cellSize))
+		self.grids = dict((name, np.zeros(self.rows * self.cols)) for name in LAYERS)
+		self.origin = None
+
+	def cellIndex(self, x, y):
+		col = min(self.cols - 1, max(0, int((x + self.width / 2.0) // self.cellSize)))
+		row = min(self.rows - 1, max(0, int((y + self.height / 2.0) // self.cellSize)))
+		return row * self.cols + col
+
+	def cellCentre(self, index):
+		row, col = divmod(index, self.cols)
+		return ((col + 0.5) * self.cellSize - self.width / 2.0,
+			(row + 0.5) * self.cellSize - self.height / 2.0)
+
+	def scale(self, now):
+		if self.origin is None:
+			self.origin = now
+		exponent = (now - self.origin) / self.tau
+		if exponent > 500:
+			# rebase before exp() overflows
+			factor = math.exp(-exponent)
+			for grid in self.grids.values():
+				grid *= factor
+			self.origin = now
+			exponent = 0.0
+		return math.exp(exponent)
+
+	def add(self, layer, x, y, now, weight=1.0):
+		# scale first: it may rebase the grid we are about to add to
+		weight *= self.scale(now)
+		self.grids[layer][self.cellIndex(x, y)] += weight
+
+	def observe(self, message, now):
+		'''
+		Record an OBJECTUPDATE payload
+		'''
+		if message['Type'] == 'Tank':
+			if message['Name'] not in self.ourNames:
+				self.add('enemy', message['X'], message['Y'], now)
+		elif message['Type'] in PICKUP_LAYERS:
+			self.add(PICKUP_LAYERS[message['Type']], message['X'], message['Y'], now)
+
+	def recordDeath(self, x, y, now):
+		'''
+		Record a KILL or DESTROYED at the last known position of the tank
+		'''
+		self.add('deaths', x, y, now)
+
+	def layer(self, name, now):
+		'''
+		Decayed weights for one layer as a (rows, cols) array
+		'''
+		return (self.grids[name] / self.scale(now)).reshape(self.rows, self.cols)
+
+	def threat(self, now, deathWeight=5.0):
+		'''
+		Enemy presence plus weighted deaths, as a (rows, cols) array
+		'''
+		return self.layer('enemy', now) + deathWeight * self.layer('deaths', now)
+
+	def hotspot(self, name, now, minWeight=0.01):
+		'''
+		(x, y) centre of the strongest cell in a layer, decayed to `now`,
+		or None if no cell has more than minWeight left
+		'''
+		grid = self.layer(name, now).ravel()
+		index = int(np.argmax(grid))
+		if grid[index] <= minWeight:
+			return None
+		return self.cellCentre(index)
@@ -0,0 +1,499 @@
+#!/usr/bin/python
+
+'''
+Vectorised physics core for a local stand-in of the MSTanks server.
+
+World steps any number of independent arenas at once. Every entity lives
+in a numpy structured array with a leading arena axis:
+
+	tanks   (arenas, tanks)              position, hull/turret heading,
+	                                     pending commands, health, ammo ...
+	shells  (arenas, tanks, shellSlots)  shells in flight, a ring of slots
+	                                     per firing tank
+	pickups (arenas, pickups)            health/ammo spawn points
+
+step(dt) advances hull and turret rotation, movement, firing, shell
+travel, hit tests, pickup collection, goal banking and respawns with
+whole-array operations, so its cost is a few dozen numpy calls whatever
+the number of entities. Everything that happened to a tank during the
+step is left in `flags`, one (arenas, tanks) bool array per message
+type, e.g. flags[SUCCESSFULLHIT].
+
+Headings use the same compass convention as the bots (getheading):
+heading h points along (cos h, -sin h).
+
+objectUpdates() produces the OBJECTUPDATE payloads a tank would receive,
+with the fields the bots read (Id, Name, Type, X, Y, Heading,
+TurretHeading, Health, Ammo).
+
+The default rates and sizes are estimates, not measured server values;
+KinematicsProfiler can measure the real ones from a live match.
+
+	python bots/physics.py --arenas 1 --tanks 24 --ticks 5000
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from aiming import wrapAngle
+from protocol import MessageType
+
+ARENA_WIDTH = 140.0
+ARENA_HEIGHT = 200.0
+# banking zones at both ends of the arena
+GOAL_DEPTH = 90.0
+GOAL_HALF_WIDTH = 20.0
+
+TANK_SPEED = 10.0
+HULL_TURN_RATE = 90.0
+TURRET_TURN_RATE = 120.0
+TANK_RADIUS = 3.0
+MAX_HEALTH = 3
+MAX_AMMO = 10
+FIRE_COOLDOWN = 0.5
+RESPAWN_TIME = 5.0
+
+SHELL_SPEED = 60.0
+SHELL_RANGE = 100.0
+
+PICKUP_RADIUS = 3.0
+PICKUP_RESPAWN = 10.0
+
+VIEW_RANGE = 120.0
+FOV_DEGREES = 60.0
+
+HEALTH, AMMO = 1, 2
+
+TANK_DTYPE = np.dtype([
+	('x', 'f8'), ('y', 'f8'),
+	('heading', 'f8'), ('turret', 'f8'),
+	# pending TURNTOHEADING / TURNTURRETTOHEADING targets, NaN when none
+	('targetHeading', 'f8'), ('targetTurret', 'f8'),
+	# signed distance left on a MOVEFORWARD/BACKWARDSDISTANCE
+	('moveLeft', 'f8'),
+	# toggles: -1, 0 or 1
+	('drive', 'i1'), ('turn', 'i1'), ('turretTurn', 'i1'),
+	('fire', '?'),
+	('health', 'i2'), ('ammo', 'i2'),
+	# kills not yet banked, banked kills, all kills
+	('points', 'i2'), ('banked', 'i2'), ('kills', 'i2'),
+	('alive', '?'),
+	('cooldown', 'f8'), ('respawnAt', 'f8'),
+	('shots', 'i4'),
+])
+
+SHELL_DTYPE = np.dtype([
+	('x', 'f8'), ('y', 'f8'), ('heading', 'f8'),
+	('travelled', 'f8'), ('live', '?'),
+])
+
+PICKUP_DTYPE = np.dtype([
+	('x', 'f8'), ('y', 'f8'), ('kind', 'i1'),
+	('active', '?'), ('respawnAt', 'f8'),
+])
+
+# messages step() can raise for a tank
+EVENT_TYPES = (
+	MessageType.HEALTHPICKUP,
+	MessageType.AMMOPICKUP,
+	MessageType.DESTROYED,
+	MessageType.ENTEREDGOAL,
+	MessageType.KILL,
+	MessageType.HITDETECTED,
+	MessageType.SUCCESSFULLHIT,
+)
+
+
+def direction(heading):
+	'''
+	Unit vector(s) for compass heading(s) in degrees
+	'''
+	rad = np.radians(heading)
+	return np.cos(rad), -np.sin(rad)
+
+
+class World(object):
+	'''
+	`arenas` independent arenas of `tanks` tanks and `pickups` pickup
+	spawn points each, stepped together
+	'''
+
+	def __init__(self, arenas=1, tanks=4, pickups=4, seed=None, width=ARENA_WIDTH, height=ARENA_HEIGHT,
+			tankSpeed=TANK_SPEED, hullTurnRate=HULL_TURN_RATE, turretTurnRate=TURRET_TURN_RATE,
+			shellSpeed=SHELL_SPEED, shellRange=SHELL_RANGE, fireCooldown=FIRE_COOLDOWN,
+			tankRadius=TANK_RADIUS, pickupRadius=PICKUP_RADIUS, pickupRespawn=PICKUP_RESPAWN,
+			respawnTime=RESPAWN_TIME, viewRange=VIEW_RANGE, fovDegrees=FOV_DEGREES):
+		self.arenas = arenas
+		self.tankCount = tanks
+		self.pickupCount = pickups
+		self.width = width
+		self.height = height
+		self.tankSpeed = tankSpeed
+		self.hullTurnRate = hullTurnRate
+		self.turretTurnRate = turretTurnRate
+		self.shellSpeed = shellSpeed
+		self.shellRange = shellRange
+		self.fireCooldown = fireCooldown
+		self.tankRadius = tankRadius
+		self.pickupRadius = pickupRadius
+		self.pickupRespawn = pickupRespawn
+		self.respawnTime = respawnTime
+		self.viewRange = viewRange
+		self.fovDegrees = fovDegrees
+		# enough slots that a tank firing as fast as it can never
+		# overwrites a shell that is still flying
+		self.shellSlots = int(np.ceil(shellRange / shellSpeed / fireCooldown)) + 1
+
+		self.names = [['Sim:tank{}'.format(t + 1) for t in range(tanks)] for a in range(arenas)]
+		self.reset(seed)
+
+	def reset(self, seed=None):
+		self.rng = np.random.default_rng(seed)
+		self.time = 0.0
+		self.tanks = np.zeros((self.arenas, self.tankCount), dtype=TANK_DTYPE)
+		self.shells = np.zeros((self.arenas, self.tankCount, self.shellSlots), dtype=SHELL_DTYPE)
+		self.pickups = np.zeros((self.arenas, self.pickupCount), dtype=PICKUP_DTYPE)
+		self.flags = dict((messageType, np.zeros((self.arenas, self.tankCount), dtype=bool))
+			for messageType in EVENT_TYPES)
+
+		self.spawnTanks(np.ones((self.arenas, self.tankCount), dtype=bool))
+		p = self.pickups
+		p['x'], p['y'] = self.randomPositions(p.shape)
+		p['kind'] = np.where(np.arange(self.pickupCount) % 2 == 0, HEALTH, AMMO)
+		p['active'] = True
+
+	def randomPositions(self, shape, margin=10.0):
+		'''
+		Uniform positions clear of the walls and the goal zones
+		'''
+		x = self.rng.uniform(-self.width / 2.0 + margin, self.width / 2.0 - margin, shape)
+		y = self.rng.uniform(-GOAL_DEPTH + margin, GOAL_DEPTH - margin, shape)
+		return x, y
+
+	def spawnTanks(self, mask):
+		t = self.tanks
+		count = int(mask.sum())
+		if not count:
+			return
+		x, y = self.randomPositions(count)
+		t['x'][mask] = x
+		t['y'][mask] = y
+		t['heading'][mask] = self.rng.uniform(0.0, 360.0, count)
+		t['turret'][mask] = t['heading'][mask]
+		t['targetHeading'][mask] = np.nan
+		t['targetTurret'][mask] = np.nan
+		for field in ('moveLeft', 'drive', 'turn', 'turretTurn', 'fire', 'points', 'cooldown'):
+			t[field][mask] = 0
+		t['health'][mask] = MAX_HEALTH
+		t['ammo'][mask] = MAX_AMMO
+		t['alive'][mask] = True
+
+	def command(self, arena, tank, messageType, amount=None):
+		'''
+		Apply one bot command, as it would arrive over the socket
+		'''
+		mask = np.zeros((self.arenas, self.tankCount), dtype=bool)
+		mask[arena, tank] = True
+		self.apply(mask, messageType, amount)
+
+	def commandBatch(self, messageTypes, amounts=None):
+		'''
+		One command per tank for every tank at once. messageTypes is an
+		(arenas, tanks) array where 0 (TEST) means no command; amounts is
+		an array of the same shape for the commands that take one.
+		'''
+		messageTypes = np.asarray(messageTypes)
+		for messageType in np.unique(messageTypes):
+			if messageType == MessageType.TEST:
+				continue
+			mask = messageTypes == messageType
+			self.apply(mask, messageType, None if amounts is None else np.asarray(amounts)[mask])
+
+	def apply(self, mask, messageType, amount=None):
+		'''
+		Apply one command to the tanks in an (arenas, tanks) mask
+		'''
+		t = self.tanks
+		if messageType == MessageType.FIRE:
+			t['fire'][mask] = True
+		elif messageType == MessageType.TOGGLEFORWARD:
+			t['drive'][mask] = np.where(t['drive'][mask] == 1, 0, 1)
+			t['moveLeft'][mask] = 0.0
+		elif messageType == MessageType.TOGGLEREVERSE:
+			t['drive'][mask] = np.where(t['drive'][mask] == -1, 0, -1)
+			t['moveLeft'][mask] = 0.0
+		elif messageType == MessageType.TOGGLELEFT:
+			t['turn'][mask] = np.where(t['turn'][mask] == -1, 0, -1)
+			t['targetHeading'][mask] = np.nan
+		elif messageType == MessageType.TOGGLERIGHT:
+			t['turn'][mask] = np.where(t['turn'][mask] == 1, 0, 1)
+			t['targetHeading'][mask] = np.nan
+		elif messageType == MessageType.TOGGLETURRETLEFT:
+			t['turretTurn'][mask] = np.where(t['turretTurn'][mask] == -1, 0, -1)
+			t['targetTurret'][mask] = np.nan
+		elif messageType == MessageType.TOGGLETURRETRIGHT:
+			t['turretTurn'][mask] = np.where(t['turretTurn'][mask] == 1, 0, 1)
+			t['targetTurret'][mask] = np.nan
+		elif messageType == MessageType.TURNTOHEADING:
+			t['targetHeading'][mask] = np.asarray(amount, dtype=float) % 360.0
+			t['turn'][mask] = 0
+		elif messageType == MessageType.TURNTURRETTOHEADING:
+			t['targetTurret'][mask] = np.asarray(amount, dtype=float) % 360.0
+			t['turretTurn'][mask] = 0
+		elif messageType == MessageType.MOVEFORWARDDISTANCE:
+			t['moveLeft'][mask] = np.asarray(amount, dtype=float)
+			t['drive'][mask] = 0
+		elif messageType == MessageType.MOVEBACKWARDSDISTANCE:
+			t['moveLeft'][mask] = -np.asarray(amount, dtype=float)
+			t['drive'][mask] = 0
+		elif messageType in (MessageType.STOPALL, MessageType.STOPTURN):
+			t['turn'][mask] = 0
+			t['targetHeading'][mask] = np.nan
+		if messageType in (MessageType.STOPALL, MessageType.STOPMOVE):
+			t['drive'][mask] = 0
+			t['moveLeft'][mask] = 0.0
+		if messageType in (MessageType.STOPALL, MessageType.STOPTURRET):
+			t['turretTurn'][mask] = 0
+			t['targetTurret'][mask] = np.nan
+
+	def rotate(self, field, targetField, toggleField, rate, dt, hold=False):
+		'''
+		Turn `field` towards its target or by its toggle; returns the turn.
+		A reached target is cleared, except where `hold` is true.
+		'''
+		t = self.tanks
+		target = t[targetField]
+		delta = wrapAngle(target - t[field])
+		maxStep = rate * dt
+		hasTarget = ~np.isnan(target)
+		turn = np.where(hasTarget, np.clip(np.nan_to_num(delta), -maxStep, maxStep), t[toggleField] * maxStep)
+		t[field] = (t[field] + turn * t['alive']) % 360.0
+		t[targetField] = np.where(hasTarget & (np.abs(delta) <= maxStep) & ~hold, np.nan, target)
+		return turn * t['alive']
+
+	def step(self, dt=0.1):
+		'''
+		Advance every arena by dt seconds
+		'''
+		for mask in self.flags.values():
+			mask[:] = False
+		self.time += dt
+		t = self.tanks
+		alive = t['alive']
+
+		# the turret is mounted on the hull, so it turns with it (TurretHeading
+		# tracks Heading in server logs). A turret target is an absolute
+		# heading: it stays put, and is held while the hull is still turning
+		# so the turret is not dragged off it once there.
+		hullTurn = self.rotate('heading', 'targetHeading', 'turn', self.hullTurnRate, dt)
+		t['turret'] = (t['turret'] + hullTurn) % 360.0
+		self.rotate('turret', 'targetTurret', 'turretTurn', self.turretTurnRate, dt, hold=hullTurn != 0.0)
+
+		# movement: a pending distance wins over the drive toggle
+		maxStep = self.tankSpeed * dt
+		moving = t['moveLeft'] != 0.0
+		distance = np.where(moving, np.clip(t['moveLeft'], -maxStep, maxStep), t['drive'] * maxStep) * alive
+		t['moveLeft'] -= np.where(moving, distance, 0.0)
+		dx, dy = direction(t['heading'])
+		t['x'] = np.clip(t['x'] + distance * dx, -self.width / 2.0, self.width / 2.0)
+		t['y'] = np.clip(t['y'] + distance * dy, -self.height / 2.0, self.height / 2.0)
+
+		self.fire(dt)
+		self.moveShells(dt)
+		self.collectPickups()
+		self.bank()
+
+		dead = ~t['alive'] & (t['respawnAt'] <= self.time)
+		self.spawnTanks(dead)
+
+	def fire(self, dt):
+		t = self.tanks
+		t['cooldown'] = np.maximum(0.0, t['cooldown'] - dt)
+		firing = t['fire'] & t['alive'] & (t['ammo'] > 0) & (t['cooldown'] <= 0.0)
+		t['fire'] = False
+		a, k = np.nonzero(firing)
+		if not len(a):
+			return
+		slot = t['shots'][a, k] % self.shellSlots
+		s = self.shells
+		s['x'][a, k, slot] = t['x'][a, k]
+		s['y'][a, k, slot] = t['y'][a, k]
+		s['heading'][a, k, slot] = t['turret'][a, k]
+		s['travelled'][a, k, slot] = 0.0
+		s['live'][a, k, slot] = True
+		t['ammo'][a, k] -= 1
+		t['shots'][a, k] += 1
+		t['cooldown'][a, k] = self.fireCooldown
+
+	def moveShells(self, dt):
+		t = self.tanks
+		# flatten each arena's shells to (arenas, tanks * slots)
+		s = self.shells.reshape(self.arenas, -1)
+		live = s['live']
+		if not live.any():
+			return
+		step = self.shellSpeed * dt
+		dx, dy = direction(s['heading'])
+		x0, y0 = s['x'], s['y']
+
+		# closest approach of each shell's path this tick to each tank
+		px = t['x'][:, None, :] - x0[:, :, None]
+		py = t['y'][:, None, :] - y0[:, :, None]
+		along = np.clip(px * dx[:, :, None] + py * dy[:, :, None], 0.0, step)
+		missX = px - along * dx[:, :, None]
+		missY = py - along * dy[:, :, None]
+		owner = np.arange(s.shape[1]) // self.shellSlots
+		hits = (live[:, :, None] & t['alive'][:, None, :]
+			& (missX * missX + missY * missY <= self.tankRadius ** 2)
+			& (owner[:, None] != np.arange(self.tankCount)[None, :]))
+		# a shell stops at the first tank along its path
+		along = np.where(hits, along, np.inf)
+		victim = np.argmin(along, axis=2)
+		hit = hits.any(axis=2)
+
+		s['x'] = x0 + step * dx
+		s['y'] = y0 + step * dy
+		s['travelled'] += step
+		s['live'] = live & ~hit & (s['travelled'] < self.shellRange) & (
+			np.abs(s['x']) <= self.width / 2.0) & (np.abs(s['y']) <= self.height / 2.0)
+
+		a, shell = np.nonzero(hit)
+		if not len(a):
+			return
+		shooter = owner[shell]
+		target = victim[a, shell]
+		np.subtract.at(t['health'], (a, target), 1)
+		self.flags[MessageType.SUCCESSFULLHIT][a, shooter] = True
+		self.flags[MessageType.HITDETECTED][a, target] = True
+
+		killed = t['alive'][a, target] & (t['health'][a, target] <= 0)
+		if killed.any():
+			ka, killer, victims = a[killed], shooter[killed], target[killed]
+			# several shells can finish the same tank; credit one of them
+			victimKey = np.unique(ka * self.tankCount + victims, return_index=True)[1]
+			ka, killer, victims = ka[victimKey], killer[victimKey], victims[victimKey]
+			t['alive'][ka, victims] = False
+			t['health'][ka, victims] = 0
+			t['respawnAt'][ka, victims] = self.time + self.respawnTime
+			np.add.at(t['points'], (ka, killer), 1)
+			np.add.at(t['kills'], (ka, killer), 1)
+			self.flags[MessageType.KILL][ka, killer] = True
+			self.flags[MessageType.DESTROYED][ka, victims] = True
+
+	def collectPickups(self):
+		t = self.tanks
+		p = self.pickups
+		p['active'] |= ~p['active'] & (p['respawnAt'] <= self.time)
+		dx = t['x'][:, None, :] - p['x'][:, :, None]
+		dy = t['y'][:, None, :] - p['y'][:, :, None]
+		near = (p['active'][:, :, None] & t['alive'][:, None, :]
+			& (dx * dx + dy * dy <= self.pickupRadius ** 2))
+		taken = near.any(axis=2)
+		if not taken.any():
+			return
+		a, pickup = np.nonzero(taken)
+		tank = np.argmax(near[a, pickup], axis=1)
+		kind = p['kind'][a, pickup]
+		health = kind == HEALTH
+		t['health'][a[health], tank[health]] = MAX_HEALTH
+		t['ammo'][a[~health], tank[~health]] = MAX_AMMO
+		self.flags[MessageType.HEALTHPICKUP][a[health], tank[health]] = True
+		self.flags[MessageType.AMMOPICKUP][a[~health], tank[~health]] = True
+		p['active'][a, pickup] = False
+		p['respawnAt'][a, pickup] = self.time + self.pickupRespawn
+
+	def bank(self):
+		t = self.tanks
+		scoring = (t['alive'] & (t['points'] > 0) & (np.abs(t['y']) >= GOAL_DEPTH)
+			& (np.abs(t['x']) <= GOAL_HALF_WIDTH))
+		if scoring.any():
+			t['banked'] += np.where(scoring, t['points'], 0).astype(t['banked'].dtype)
+			t['points'][scoring] = 0
+			self.flags[MessageType.ENTEREDGOAL] |= scoring
+
+	def inView(self, toX, toY):
+		'''
+		(arenas, tanks, targets) mask of targets inside each tank's turret
+		field of view; toX/toY are (arenas, targets)
+		'''
+		t = self.tanks
+		dx = toX[:, None, :] - t['x'][:, :, None]
+		dy = toY[:, None, :] - t['y'][:, :, None]
+		heading = (-np.degrees(np.arctan2(dy, dx))) % 360.0
+		offset = wrapAngle(heading - t['turret'][:, :, None])
+		return (t['alive'][:, :, None] & (dx * dx + dy * dy <= self.viewRange ** 2)
+			& (np.abs(offset) <= self.fovDegrees / 2.0))
+
+	def visibleTanks(self):
+		t = self.tanks
+		seen = self.inView(t['x'], t['y']) & t['alive'][:, None, :]
+		seen[:, np.arange(self.tankCount), np.arange(self.tankCount)] = False
+		return seen
+
+	def visiblePickups(self):
+		p = self.pickups
+		return self.inView(p['x'], p['y']) & p['active'][:, None, :]
+
+	def tankUpdate(self, arena, tank):
+		t = self.tanks[arena, tank]
+		return {'Id': int(tank) + 1, 'Name': self.names[arena][tank], 'Type': 'Tank',
+			'X': float(t['x']), 'Y': float(t['y']),
+			'Heading': float(t['heading']), 'TurretHeading': float(t['turret']),
+			'Health': int(t['health']), 'Ammo': int(t['ammo'])}
+
+	def objectUpdates(self, arena, tank, tanksSeen=None, pickupsSeen=None):
+		'''
+		OBJECTUPDATE payloads tank `tank` receives this tick: itself, then
+		every tank and pickup in its field of view. Pass the visibleTanks /
+		visiblePickups masks when building updates for many tanks.
+		'''
+		if tanksSeen is None:
+			tanksSeen = self.visibleTanks()
+		if pickupsSeen is None:
+			pickupsSeen = self.visiblePickups()
+		if not self.tanks['alive'][arena, tank]:
+			return []
+		updates = [self.tankUpdate(arena, tank)]
+		for other in np.flatnonzero(tanksSeen[arena, tank]):
+			updates.append(self.tankUpdate(arena, other))
+		for index in np.flatnonzero(pickupsSeen[arena, tank]):
+			p = self.pickups[arena, index]
+			updates.append({'Id': self.tankCount + int(index) + 1, 'Name': '',
+				'Type': 'HealthPickup' if p['kind'] == HEALTH else 'AmmoPickup',
+				'X': float(p['x']), 'Y': float(p['y']),
+				'Heading': 0.0, 'TurretHeading': 0.0, 'Health': 0, 'Ammo': 0})
+		return updates
+
+	def events(self, arena, tank):
+		'''
+		Message types raised for one tank by the last step
+		'''
+		return [messageType for messageType in EVENT_TYPES if self.flags[messageType][arena, tank]]
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-a', '--arenas', default=1, type=int, help='Arenas stepped together')
+	parser.add_argument('-t', '--tanks', default=24, type=int, help='Tanks per arena')
+	parser.add_argument('-n', '--ticks', default=5000, type=int, help='Ticks to run')
+	parser.add_argument('--dt', default=0.1, type=float, help='Seconds per tick')
+	args = parser.parse_args()
+
+	world = World(args.arenas, args.tanks, seed=0)
+	t = world.tanks
+	# everyone drives in circles firing constantly
+	t['drive'] = 1
+	t['turn'] = 1
+	t['turretTurn'] = -1
+	hits = kills = 0
+	start = time.perf_counter()
+	for tick in range(args.ticks):
+		t['fire'] = True
+		world.step(args.dt)
+		hits += int(world.flags[MessageType.SUCCESSFULLHIT].sum())
+		kills += int(world.flags[MessageType.KILL].sum())
+	elapsed = time.perf_counter() - start
+	print('{} arenas x {} tanks: {:.0f} ticks/s ({:.0f} tank-ticks/s), {} hits, {} kills'.format(
+		args.arenas, args.tanks, args.ticks / elapsed, args.ticks * args.arenas * args.tanks / elapsed, hits, kills))
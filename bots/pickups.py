@@ -0,0 +1,139 @@
+#!/usr/bin/python
+
+'''
+Pickup spawn points and respawn timing.
+
+PickupModel learns where health and ammo pickups appear from OBJECTUPDATEs
+(sightings within `mergeRadius` of each other count as one spawn point)
+and how long a spawn point stays empty after a pickup is collected. A
+collection is recorded from the HEALTHPICKUP / AMMOPICKUP events the
+server sends to the collecting tank. The next sighting at that spawn point
+then gives one respawn delay sample.
+
+The tank's last known position can be well off the spawn point by the
+time the event arrives, so a collection is put down to the nearest known
+point within the wider `collectRadius`. Only if there is none is a new
+point made there, and its first sighting (also matched within
+`collectRadius`) moves it to where the pickup really is.
+
+nextSpawn picks the spawn point we can be standing on soonest once it is
+available again, so a bot can drive towards a pickup just before it
+reappears instead of waiting to see one.
+'''
+
+import math
+
+from kinematics import RunningStats
+
+PICKUP_TYPES = ('HealthPickup', 'AmmoPickup')
+
+
+class SpawnPoint(object):
+
+	def __init__(self, kind, x, y):
+		self.kind = kind
+		self.x = x
+		self.y = y
+		self.sightings = 0
+		self.lastSeen = None
+		self.collectedAt = None
+		self.delays = RunningStats()
+
+	def __repr__(self):
+		return 'SpawnPoint({}, {:.1f}, {:.1f}, sightings={}, delays={})'.format(
+			self.kind, self.x, self.y, self.sightings, self.delays)
+
+
+class PickupModel(object):
+	'''
+	Learned spawn points and respawn delays per pickup type
+	'''
+
+	def __init__(self, mergeRadius=8.0, collectRadius=25.0, defaultRespawn=10.0, staleAfter=5.0):
+		self.mergeRadius = mergeRadius
+		self.collectRadius = collectRadius
+		self.defaultRespawn = defaultRespawn
+		self.staleAfter = staleAfter
+		self.points = dict((kind, []) for kind in PICKUP_TYPES)
+		self.delays = dict((kind, RunningStats()) for kind in PICKUP_TYPES)
+
+	def nearest(self, kind, x, y, radius=None):
+		'''
+		The closest spawn point of `kind` within `radius` of (x, y), or
+		None. By default a point is in reach within mergeRadius if it has
+		been sighted, and within collectRadius if it has only been guessed
+		from a collection.
+		'''
+		best, bestDistance = None, None
+		for point in self.points[kind]:
+			reach = radius if radius is not None else self.mergeRadius if point.sightings else self.collectRadius
+			d = math.hypot(point.x - x, point.y - y)
+			if d <= reach and (best is None or d < bestDistance):
+				best, bestDistance = point, d
+		return best
+
+	def pointAt(self, kind, x, y, radius=None):
+		point = self.nearest(kind, x, y, radius)
+		if point is None:
+			point = SpawnPoint(kind, x, y)
+			self.points[kind].append(point)
+		return point
+
+	def observe(self, message, now):
+		'''
+		Record a pickup OBJECTUPDATE
+		'''
+		kind = message['Type']
+		if kind not in self.points:
+			return
+		point = self.pointAt(kind, message['X'], message['Y'])
+		# refine the spawn position with a running mean of sightings
+		point.sightings += 1
+		point.x += (message['X'] - point.x) / point.sightings
+		point.y += (message['Y'] - point.y) / point.sightings
+		if point.collectedAt is not None:
+			delay = now - point.collectedAt
+			point.delays.push(delay)
+			self.delays[kind].push(delay)
+			point.collectedAt = None
+		point.lastSeen = now
+
+	def collected(self, kind, x, y, now):
+		'''
+		Record that a pickup of `kind` was collected by a tank at (x, y)
+		'''
+		point = self.pointAt(kind, x, y, self.collectRadius)
+		point.collectedAt = now
+		point.lastSeen = None
+
+	def respawnDelay(self, point):
+		if point.delays.count:
+			return point.delays.mean
+		if self.delays[point.kind].count:
+			return self.delays[point.kind].mean
+		return self.defaultRespawn
+
+	def availableAt(self, point, now):
+		'''
+		When the spawn point is expected to hold a pickup
+		'''
+		if point.lastSeen is not None and now - point.lastSeen <= self.staleAfter:
+			return now
+		if point.collectedAt is not None:
+			return max(now, point.collectedAt + self.respawnDelay(point))
+		# not seen for a while and nobody we know of took it: assume it is there
+		return now
+
+	def nextSpawn(self, kind, x, y, now, speed):
+		'''
+		(x, y, seconds until we can collect) for the best spawn point of
+		`kind`, driving from (x, y) at `speed` units/s, or None if no
+		spawn point is known yet
+		'''
+		best = None
+		for point in self.points[kind]:
+			travel = math.hypot(point.x - x, point.y - y) / speed
+			ready = max(travel, self.availableAt(point, now) - now)
+			if best is None or ready < best[2]:
+				best = (point.x, point.y, ready)
+		return best
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+'''
+Monte Carlo rollout planner.
+
+Given what a bot knows this tick (its own tank, enemies it has seen,
+pickup spawn points), RolloutPlanner loads a physics.World with one arena
+per rollout. All arenas start from that same snapshot. Each arena is
+given one candidate action (drive on a compass heading, aim at an enemy
+and fire, fire straight ahead, go and bank, stop). The world is then
+stepped for a short horizon, with the enemies taking random commands.
+Every rollout advances in the same numpy calls, so a few hundred of them
+cost about as much as one.
+
+Each rollout is scored like a tankenv reward: banked and unbanked points,
+hits, deaths, pickups the tank needed, and for unbanked points how far
+the tank still is from a goal. The candidate with the best mean score
+wins. Stepping stops at the horizon or when the per-tick time budget runs
+out, whichever comes first. Every arena is always at the same step, so
+stopping early still compares like with like.
+
+	python bots/planner.py --rollouts 256 --budget 0.15
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from aiming import bearing
+from servercomms import ServerMessageTypes
+import physics
+import tankenv
+
+# reward per unit change, as for training, plus the value of a pickup
+# the tank is short of and a pull towards the goal while holding points
+SCORE_WEIGHTS = dict(tankenv.REWARD_WEIGHTS, pickup=0.3, goal=0.5)
+
+
+def goalHeading(x, y):
+	'''
+	(heading, distance) to the mouth of the nearer goal
+	'''
+	goalY = physics.GOAL_DEPTH + physics.TANK_RADIUS
+	goalY = goalY if y >= 0 else -goalY
+	return float(bearing(x, y, 0.0, goalY)), float(np.hypot(x, y - goalY))
+
+
+class RolloutPlanner(object):
+
+	def __init__(self, rollouts=256, horizon=3.0, dt=0.2, budget=0.15, commandEvery=0.6, seed=None, weights=None):
+		self.rollouts = rollouts
+		self.horizon = horizon
+		self.dt = dt
+		self.budget = budget
+		self.commandEvery = commandEvery
+		self.weights = dict(SCORE_WEIGHTS, **(weights or {}))
+		self.rng = np.random.default_rng(seed)
+		self.worlds = {}
+		self.lastSteps = 0
+
+	def world(self, tanks, pickups):
+		'''
+		A World of the right shape, reused from tick to tick
+		'''
+		key = (tanks, pickups)
+		if key not in self.worlds:
+			self.worlds[key] = physics.World(self.rollouts, tanks, max(pickups, 1))
+		return self.worlds[key]
+
+	def candidates(self, me, enemies):
+		'''
+		[(label, [(messageType, amount) ...], keep firing)]
+		'''
+		moves = [('drive {}'.format(heading), [(ServerMessageTypes.TURNTOHEADING, heading),
+			(ServerMessageTypes.MOVEFORWARDDISTANCE, 10)], False) for heading in range(0, 360, 45)]
+		aims = []
+		for i, enemy in enumerate(enemies):
+			heading = float(bearing(me['X'], me['Y'], enemy['X'], enemy['Y']))
+			aims.append(('aim {}'.format(enemy.get('Name') or i), [(ServerMessageTypes.TURNTURRETTOHEADING, heading),
+				(ServerMessageTypes.FIRE, None)], True))
+		heading, distance = goalHeading(me['X'], me['Y'])
+		return moves + aims + [
+			('fire', [(ServerMessageTypes.FIRE, None)], True),
+			('bank', [(ServerMessageTypes.TURNTOHEADING, heading), (ServerMessageTypes.MOVEFORWARDDISTANCE, distance)], False),
+			('stop', [(ServerMessageTypes.STOPALL, None)], False),
+		]
+
+	def load(self, world, me, enemies, pickups, points):
+		'''
+		Put the snapshot into every arena
+		'''
+		world.reset()
+		world.time = 0.0
+		t = world.tanks
+		for k, tank in enumerate([me] + list(enemies)):
+			t['x'][:, k] = tank['X']
+			t['y'][:, k] = tank['Y']
+			t['heading'][:, k] = tank['Heading']
+			t['turret'][:, k] = tank['TurretHeading']
+			t['health'][:, k] = tank.get('Health', physics.MAX_HEALTH)
+			t['ammo'][:, k] = tank.get('Ammo', physics.MAX_AMMO)
+		t['points'][:, 0] = points
+		p = world.pickups
+		p['active'] = False
+		p['respawnAt'] = np.inf
+		for i, (x, y, kind, availableIn) in enumerate(pickups):
+			p['x'][:, i] = x
+			p['y'][:, i] = y
+			p['kind'][:, i] = tankenv.PICKUP_KINDS[kind]
+			p['active'][:, i] = availableIn <= 0
+			p['respawnAt'][:, i] = max(availableIn, 0.0)
+
+	def plan(self, me, enemies=(), pickups=(), points=0):
+		'''
+		Choose an action for `me` (an OBJECTUPDATE of our tank). enemies are
+		OBJECTUPDATEs of tanks seen recently; pickups are (x, y, Type,
+		seconds until available) with Type 'HealthPickup' or 'AmmoPickup'.
+
+		Returns (label, commands, {label: mean score}).
+		'''
+		deadline = time.perf_counter() + self.budget
+		enemies = list(enemies)
+		pickups = list(pickups)
+		choices = self.candidates(me, enemies)
+		world = self.world(1 + len(enemies), len(pickups))
+		self.load(world, me, enemies, pickups, points)
+		t = world.tanks
+
+		# rollouts are dealt out to candidates in turn
+		chosen = np.arange(self.rollouts) % len(choices)
+		slots = max(len(commands) for _, commands, _ in choices)
+		types = np.zeros((len(choices), slots), dtype=np.int16)
+		amounts = np.zeros((len(choices), slots))
+		for c, (_, commands, _) in enumerate(choices):
+			for j, (messageType, amount) in enumerate(commands):
+				types[c, j] = messageType
+				amounts[c, j] = amount or 0.0
+		firing = np.array([keep for _, _, keep in choices])[chosen]
+		for j in range(slots):
+			batch = np.zeros((self.rollouts, world.tankCount), dtype=np.int16)
+			batch[:, 0] = types[chosen, j]
+			batchAmounts = np.zeros(batch.shape)
+			batchAmounts[:, 0] = amounts[chosen, j]
+			world.commandBatch(batch, batchAmounts)
+
+		health, ammo = float(t['health'][0, 0]), float(t['ammo'][0, 0])
+		score = np.zeros(self.rollouts)
+		steps = 0
+		every = max(1, int(round(self.commandEvery / self.dt)))
+		while steps * self.dt < self.horizon - 1e-9 and time.perf_counter() < deadline:
+			if steps % every == 0 and world.tankCount > 1:
+				# enemies: a random command each, now and then
+				batch = self.rng.integers(0, len(tankenv.ACTIONS), (self.rollouts, world.tankCount))
+				batch[:, 0] = 0
+				world.commandBatch(tankenv.ACTION_TYPES[batch], tankenv.ACTION_AMOUNTS[batch])
+			t['fire'][:, 0] |= firing
+			banked, held = t['banked'][:, 0].astype(float), t['points'][:, 0].astype(float)
+			world.step(self.dt)
+			steps += 1
+			f = world.flags
+			score += tankenv.reward(self.weights, t['banked'][:, 0] - banked, t['points'][:, 0] - held,
+				f[ServerMessageTypes.SUCCESSFULLHIT][:, 0], f[ServerMessageTypes.DESTROYED][:, 0])
+			score += self.weights['pickup'] * (f[ServerMessageTypes.HEALTHPICKUP][:, 0] * (1.0 - health / physics.MAX_HEALTH)
+				+ f[ServerMessageTypes.AMMOPICKUP][:, 0] * (1.0 - ammo / physics.MAX_AMMO))
+		self.lastSteps = steps
+
+		# points still held at the end are worth more the nearer a goal
+		goalY = np.where(t['y'][:, 0] >= 0, physics.GOAL_DEPTH, -physics.GOAL_DEPTH)
+		distance = np.hypot(t['x'][:, 0], t['y'][:, 0] - goalY)
+		score -= self.weights['goal'] * t['points'][:, 0] * distance / physics.ARENA_HEIGHT
+
+		means = np.bincount(chosen, weights=score, minlength=len(choices)) / np.bincount(chosen, minlength=len(choices))
+		best = int(np.argmax(means))
+		return choices[best][0], choices[best][1], dict((label, float(m)) for (label, _, _), m in zip(choices, means))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-r', '--rollouts', default=256, type=int, help='Rollouts per decision')
+	parser.add_argument('--horizon', default=3.0, type=float, help='Seconds simulated ahead')
+	parser.add_argument('--budget', default=0.15, type=float, help='Seconds allowed per decision')
+	parser.add_argument('-n', '--decisions', default=20, type=int, help='Decisions to time')
+	args = parser.parse_args()
+
+	planner = RolloutPlanner(args.rollouts, args.horizon, budget=args.budget, seed=0)
+	me = {'X': 0.0, 'Y': 60.0, 'Heading': 90.0, 'TurretHeading': 0.0, 'Health': 2, 'Ammo': 4}
+	enemies = [{'Name': 'Enemy:one', 'X': 25.0, 'Y': 60.0, 'Heading': 180.0, 'TurretHeading': 180.0, 'Health': 3, 'Ammo': 10}]
+	pickups = [(-20.0, 40.0, 'HealthPickup', 0.0), (30.0, -50.0, 'AmmoPickup', 4.0)]
+	times = []
+	for _ in range(args.decisions):
+		start = time.perf_counter()
+		label, commands, means = planner.plan(me, enemies, pickups, points=1)
+		times.append(time.perf_counter() - start)
+	print('chose {!r}: {}'.format(label, commands))
+	for choice, mean in sorted(means.items(), key=lambda item: -item[1])[:5]:
+		print('  {:<22}{:8.3f}'.format(choice, mean))
+	print('{} rollouts, {} steps: median {:.1f} ms, max {:.1f} ms per decision'.format(
+		args.rollouts, planner.lastSteps, np.median(times) * 1e3, max(times) * 1e3))
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+
+'''
+Opt-in profiling for a bot's main loop.
+
+Profiler.timed wraps a function in a section timer. Sections nest, so a
+read inside update() is recorded as "update;decode". Each section
+records call count, CPU time (time.thread_time, so a blocking read or
+sleep costs nothing) and wall time. Every `sampleEvery` ticks a whole
+tick runs under cProfile as well.
+
+When the process exits the profiler writes:
+
+* <output>.folded - section self CPU time in microseconds, one
+  "a;b;c value" line per stack, for flamegraph.pl / speedscope / inferno
+* <output>.prof   - the accumulated cProfile samples, for pstats/snakeviz
+
+makeProfiler(None) returns a NullProfiler, whose timed() hands the
+function back unwrapped, so the loop runs exactly as it would without
+profiling. cProfile and pstats are only imported when profiling is on.
+
+Section timers keep one stack, so only time calls from one thread.
+'''
+
+import atexit
+import functools
+import logging
+import signal
+import sys
+import time
+
+
+class NullProfiler(object):
+	enabled = False
+
+	def timed(self, name, func):
+		return func
+
+	def instrument(self, obj, attr, name):
+		pass
+
+	def tick(self):
+		pass
+
+	def dump(self):
+		pass
+
+
+class Profiler(object):
+	enabled = True
+
+	def __init__(self, output, sampleEvery=100):
+		self.output = output
+		self.sampleEvery = sampleEvery
+		self.ticks = 0
+		# per path: [calls, cpu, wall, child cpu]
+		self.totals = {}
+		self.stack = []
+		self.childCpu = []
+		self.sampler = None
+		self.samples = None
+		self.sampledTicks = 0
+		self.dumped = False
+
+	def timed(self, name, func):
+		'''
+		func wrapped in a section timer called `name`
+		'''
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			self.stack.append(name)
+			self.childCpu.append(0.0)
+			cpu, wall = time.thread_time(), time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				cpu = time.thread_time() - cpu
+				wall = time.perf_counter() - wall
+				path = ';'.join(self.stack)
+				children = self.childCpu.pop()
+				self.stack.pop()
+				if self.childCpu:
+					self.childCpu[-1] += cpu
+				entry = self.totals.get(path)
+				if entry is None:
+					entry = self.totals[path] = [0, 0.0, 0.0, 0.0]
+				entry[0] += 1
+				entry[1] += cpu
+				entry[2] += wall
+				entry[3] += children
+		return wrapper
+
+	def instrument(self, obj, attr, name):
+		'''
+		Replace obj.attr with a timed version of itself
+		'''
+		setattr(obj, attr, self.timed(name, getattr(obj, attr)))
+
+	def tick(self):
+		'''
+		Call once at the top of every pass through the main loop
+		'''
+		import cProfile
+		import pstats
+		if self.sampler is not None:
+			self.sampler.disable()
+			if self.samples is None:
+				self.samples = pstats.Stats(self.sampler)
+			else:
+				self.samples.add(self.sampler)
+			self.sampler = None
+			self.sampledTicks += 1
+		self.ticks += 1
+		if self.sampleEvery and self.ticks % self.sampleEvery == 0:
+			self.sampler = cProfile.Profile()
+			self.sampler.enable()
+
+	def folded(self):
+		'''
+		(stack, self CPU microseconds) pairs
+		'''
+		for path, (calls, cpu, wall, children) in sorted(self.totals.items()):
+			yield path, max(0, int(round((cpu - children) * 1e6)))
+
+	def summary(self):
+		lines = ['{:<40} {:>8} {:>10} {:>12} {:>10}'.format('section', 'calls', 'cpu ms', 'cpu us/call', 'wall ms')]
+		for path, (calls, cpu, wall, children) in sorted(self.totals.items()):
+			lines.append('{:<40} {:>8} {:>10.1f} {:>12.1f} {:>10.1f}'.format(
+				path, calls, cpu * 1e3, cpu * 1e6 / calls, wall * 1e3))
+		return '\n'.join(lines)
+
+	def dump(self):
+		if self.dumped:
+			return
+		self.dumped = True
+		if self.sampler is not None:
+			self.sampler.disable()
+		with open(self.output + '.folded', 'w') as f:
+			for path, value in self.folded():
+				if value:
+					f.write('{} {}\n'.format(path, value))
+		if self.samples is not None:
+			self.samples.dump_stats(self.output + '.prof')
+		logging.info("Profiled {} ticks ({} under cProfile), written to {}.folded\n{}".format(
+			self.ticks, self.sampledTicks, self.output, self.summary()))
+
+
+def makeProfiler(output=None, sampleEvery=100):
+	'''
+	A Profiler that dumps to `output` at exit, or a NullProfiler when
+	output is None
+	'''
+	if output is None:
+		return NullProfiler()
+	profiler = Profiler(output, sampleEvery)
+	atexit.register(profiler.dump)
+	# a plain SIGTERM would skip atexit; exit normally instead
+	if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+		signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	return profiler
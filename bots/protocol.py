@@ -0,0 +1,205 @@
+#!/usr/bin/python
+
+'''
+Typed MSTanks protocol schema.
+
+MessageType is an IntEnum of every message id the server knows. SCHEMA
+lists the JSON payload fields of each type; a slotted Message subclass is
+generated per entry. Decoding, encoding and name lookups go through flat
+tables indexed by the message id, so each is a single list index with no
+per-call dict building.
+
+	message = decode(18, {'Id': 1, 'X': 2.0, ...})   # -> ObjectUpdate
+	frame = encode(TurnToHeading(Amount=90))
+'''
+
+import json
+import struct
+from enum import IntEnum
+
+
+class MessageType(IntEnum):
+	TEST = 0
+	CREATETANK = 1
+	DESPAWNTANK = 2
+	FIRE = 3
+	TOGGLEFORWARD = 4
+	TOGGLEREVERSE = 5
+	TOGGLELEFT = 6
+	TOGGLERIGHT = 7
+	TOGGLETURRETLEFT = 8
+	TOGGLETURRETRIGHT = 9
+	TURNTURRETTOHEADING = 10
+	TURNTOHEADING = 11
+	MOVEFORWARDDISTANCE = 12
+	MOVEBACKWARDSDISTANCE = 13
+	STOPALL = 14
+	STOPTURN = 15
+	STOPMOVE = 16
+	STOPTURRET = 17
+	OBJECTUPDATE = 18
+	HEALTHPICKUP = 19
+	AMMOPICKUP = 20
+	SNITCHPICKUP = 21
+	DESTROYED = 22
+	ENTEREDGOAL = 23
+	KILL = 24
+	SNITCHAPPEARED = 25
+	GAMETIMEUPDATE = 26
+	HITDETECTED = 27
+	SUCCESSFULLHIT = 28
+
+	# spelling used by the original bot scripts
+	MOVEBACKWARSDISTANCE = 13
+
+	@classmethod
+	def toString(cls, id):
+		return typeName(id)
+
+
+# (type, class name, payload fields)
+SCHEMA = [
+	(MessageType.TEST, 'Test', ()),
+	(MessageType.CREATETANK, 'CreateTank', ('Name',)),
+	(MessageType.DESPAWNTANK, 'DespawnTank', ()),
+	(MessageType.FIRE, 'Fire', ()),
+	(MessageType.TOGGLEFORWARD, 'ToggleForward', ()),
+	(MessageType.TOGGLEREVERSE, 'ToggleReverse', ()),
+	(MessageType.TOGGLELEFT, 'ToggleLeft', ()),
+	(MessageType.TOGGLERIGHT, 'ToggleRight', ()),
+	(MessageType.TOGGLETURRETLEFT, 'ToggleTurretLeft', ()),
+	(MessageType.TOGGLETURRETRIGHT, 'ToggleTurretRight', ()),
+	(MessageType.TURNTURRETTOHEADING, 'TurnTurretToHeading', ('Amount',)),
+	(MessageType.TURNTOHEADING, 'TurnToHeading', ('Amount',)),
+	(MessageType.MOVEFORWARDDISTANCE, 'MoveForwardDistance', ('Amount',)),
+	(MessageType.MOVEBACKWARDSDISTANCE, 'MoveBackwardsDistance', ('Amount',)),
+	(MessageType.STOPALL, 'StopAll', ()),
+	(MessageType.STOPTURN, 'StopTurn', ()),
+	(MessageType.STOPMOVE, 'StopMove', ()),
+	(MessageType.STOPTURRET, 'StopTurret', ()),
+	(MessageType.OBJECTUPDATE, 'ObjectUpdate', ('Id', 'Name', 'Type', 'X', 'Y', 'Heading', 'TurretHeading', 'Health', 'Ammo')),
+	(MessageType.HEALTHPICKUP, 'HealthPickup', ()),
+	(MessageType.AMMOPICKUP, 'AmmoPickup', ()),
+	(MessageType.SNITCHPICKUP, 'SnitchPickup', ()),
+	(MessageType.DESTROYED, 'Destroyed', ()),
+	(MessageType.ENTEREDGOAL, 'EnteredGoal', ()),
+	(MessageType.KILL, 'Kill', ()),
+	(MessageType.SNITCHAPPEARED, 'SnitchAppeared', ()),
+	(MessageType.GAMETIMEUPDATE, 'GameTimeUpdate', ('Time',)),
+	(MessageType.HITDETECTED, 'HitDetected', ()),
+	(MessageType.SUCCESSFULLHIT, 'SuccessfullHit', ()),
+]
+
+
+class Message(object):
+	'''
+	Base class for the generated message types. Payload fields are slots;
+	fields the server leaves out are None.
+	'''
+	__slots__ = ()
+	messageType = None
+	fields = ()
+
+	def __init__(self, **payload):
+		for field in self.fields:
+			setattr(self, field, payload.get(field))
+
+	@classmethod
+	def fromPayload(cls, payload):
+		message = cls.__new__(cls)
+		if payload is None:
+			payload = {}
+		for field in cls.fields:
+			setattr(message, field, payload.get(field))
+		return message
+
+	def toPayload(self):
+		'''
+		JSON payload dict, or None for messages without one
+		'''
+		if not self.fields:
+			return None
+		return dict((field, getattr(self, field)) for field in self.fields
+			if getattr(self, field) is not None)
+
+	def __eq__(self, other):
+		return type(self) is type(other) and all(
+			getattr(self, f) == getattr(other, f) for f in self.fields)
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __repr__(self):
+		return '{}({})'.format(type(self).__name__, ', '.join(
+			'{}={!r}'.format(f, getattr(self, f)) for f in self.fields))
+
+
+class UnknownMessage(Message):
+	'''
+	A message id missing from the schema; keeps the raw payload
+	'''
+	__slots__ = ('messageType', 'payload')
+
+	def __init__(self, messageType, payload=None):
+		self.messageType = messageType
+		self.payload = payload
+
+	def toPayload(self):
+		return self.payload
+
+	def __eq__(self, other):
+		return isinstance(other, UnknownMessage) and (self.messageType, self.payload) == (other.messageType, other.payload)
+
+	def __repr__(self):
+		return 'UnknownMessage({}, {!r})'.format(self.messageType, self.payload)
+
+
+# flat tables indexed by message id
+MESSAGE_CLASSES = [None] * 256
+TYPE_NAMES = ['??UNKNOWN??'] * 256
+
+for messageType, className, fields in SCHEMA:
+	cls = type(className, (Message,), {
+		'__slots__': fields,
+		'__doc__': '{} message, payload fields: {}'.format(messageType.name, ', '.join(fields) or 'none'),
+		'messageType': messageType,
+		'fields': fields,
+	})
+	globals()[className] = cls
+	MESSAGE_CLASSES[messageType] = cls
+	TYPE_NAMES[messageType] = messageType.name
+del messageType, className, fields, cls
+
+
+def typeName(id):
+	# sendMessage() defaults to None for the type; anything odd is unknown
+	if isinstance(id, int) and 0 <= id < 256:
+		return TYPE_NAMES[id]
+	return '??UNKNOWN??'
+
+
+def decode(messageType, payload):
+	'''
+	Typed message for a message id and its decoded JSON payload (or None)
+	'''
+	cls = MESSAGE_CLASSES[messageType]
+	if cls is None:
+		return UnknownMessage(messageType, payload)
+	return cls.fromPayload(payload)
+
+
+def encodeFrame(messageType, payload=None):
+	'''
+	Wire bytes for a message id and payload dict: type byte, payload
+	length byte, JSON payload
+	'''
+	if payload is None:
+		return struct.pack('>BB', messageType, 0)
+	data = json.dumps(payload).encode('utf-8')
+	if len(data) > 255:
+		raise ValueError('payload of {} bytes does not fit in one message'.format(len(data)))
+	return struct.pack('>BB', messageType, len(data)) + data
+
+
+def encode(message):
+	return encodeFrame(message.messageType, message.toPayload())
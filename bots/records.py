@@ -0,0 +1,146 @@
+#!/usr/bin/python
+
+'''
+Pooled OBJECTUPDATE records and match-time GC settings.
+
+ObjectRecord is a slotted stand-in for the payload dict json.loads returns.
+It supports the same message['X'] style access, so bot code does not need
+rewriting, but it is reused: RecordPool hands records out and takes them
+back, so a bot that keeps only the latest update per object allocates no
+long-lived objects per frame. The JSON dict the record is filled from dies
+straight away by reference counting and never reaches the cyclic GC.
+
+configureGC turns the cyclic collector off or raises its thresholds for
+the length of a match, after freezing everything allocated at startup.
+'''
+
+import gc
+import sys
+
+
+class ObjectRecord(object):
+	'''
+	One OBJECTUPDATE, with the fields seen in logs.txt plus the time it
+	was received
+	'''
+	__slots__ = ('messageType', 'Id', 'Name', 'Type', 'X', 'Y', 'Heading',
+		'TurretHeading', 'Health', 'Ammo', 'time')
+
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		for field in self.__slots__:
+			setattr(self, field, None)
+
+	def fill(self, messageType, payload, now=None):
+		'''
+		Overwrite this record from a decoded payload dict
+		'''
+		get = payload.get
+		self.messageType = messageType
+		self.Id = get('Id')
+		# interned so every record shares one copy of each name
+		self.Name = sys.intern(get('Name', ''))
+		self.Type = sys.intern(get('Type', ''))
+		self.X = get('X')
+		self.Y = get('Y')
+		self.Heading = get('Heading')
+		self.TurretHeading = get('TurretHeading')
+		self.Health = get('Health')
+		self.Ammo = get('Ammo')
+		self.time = now
+		return self
+
+	def copyFrom(self, other):
+		for field in self.__slots__:
+			setattr(self, field, getattr(other, field))
+		return self
+
+	@property
+	def pos(self):
+		return (self.X, self.Y)
+
+	@pos.setter
+	def pos(self, value):
+		self.X, self.Y = value
+
+	# dict-style access so existing message['X'] code keeps working
+	def __getitem__(self, key):
+		try:
+			return getattr(self, key)
+		except AttributeError:
+			raise KeyError(key)
+
+	def __setitem__(self, key, value):
+		try:
+			setattr(self, key, value)
+		except AttributeError:
+			raise KeyError(key)
+
+	def __contains__(self, key):
+		return key in self.__slots__ or key == 'pos'
+
+	def get(self, key, default=None):
+		value = getattr(self, key, None)
+		return default if value is None else value
+
+	def __repr__(self):
+		return 'ObjectRecord({})'.format(', '.join(
+			'{}={!r}'.format(field, getattr(self, field)) for field in self.__slots__))
+
+
+class RecordPool(object):
+	'''
+	Free list of ObjectRecords. acquire() only allocates when every
+	record is in use; `allocated` counts how often that happened.
+	'''
+
+	def __init__(self, size=64):
+		self.free = [ObjectRecord() for _ in range(size)]
+		self.allocated = size
+
+	def acquire(self):
+		if self.free:
+			return self.free.pop()
+		self.allocated += 1
+		return ObjectRecord()
+
+	def release(self, record):
+		self.free.append(record)
+
+
+GC_MODES = ('default', 'tuned', 'off')
+
+
+def configureGC(mode):
+	'''
+	Set up the cyclic GC for a match:
+
+	* default - leave it alone
+	* tuned   - freeze startup objects and collect generation 0 far less often
+	* off     - freeze startup objects and disable the cyclic GC
+
+	Reference counting still frees everything that is not in a cycle.
+	Returns the previous thresholds for restoreGC.
+	'''
+	previous = (gc.isenabled(), gc.get_threshold())
+	if mode == 'default':
+		return previous
+	if mode not in GC_MODES:
+		raise ValueError('unknown GC mode {!r}'.format(mode))
+	gc.collect()
+	gc.freeze()
+	if mode == 'off':
+		gc.disable()
+	else:
+		gc.set_threshold(50000, 50, 100)
+	return previous
+
+
+def restoreGC(previous):
+	enabled, threshold = previous
+	gc.set_threshold(*threshold)
+	gc.unfreeze()
+	if enabled:
+		gc.enable()
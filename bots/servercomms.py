@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+'''
+Shared TCP comms for the MSTanks server.
+
+The bot scripts each carry their own copy of these classes; tools that need
+to speak the protocol without launching a bot (benchmarks, fake servers)
+import them from here instead. Message ids and payload schemas live in
+protocol.py.
+'''
+
+import json
+import socket
+import logging
+import binascii
+import struct
+import threading
+import time
+
+from protocol import MessageType, decode, encode, encodeFrame
+
+
+# The bots refer to message ids as ServerMessageTypes.FIRE etc.
+ServerMessageTypes = MessageType
+
+
+class ConnectionClosed(socket.error):
+	'''
+	Raised when the server closes the connection mid-read
+	'''
+	pass
+
+
+class StallWatchdog(object):
+	'''
+	Reports when no message has arrived for `threshold` seconds.
+
+	ServerComms calls feed() on every message. The watchdog thread sleeps
+	on an Event between checks, so it costs nothing while the link is
+	healthy. onStall(name, silence) is called once per stall.
+	'''
+
+	def __init__(self, name, threshold=5.0, onStall=None):
+		self.name = name
+		self.threshold = threshold
+		self.onStall = onStall
+		self.lastFed = time.monotonic()
+		self.stalled = False
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.watch, name='StallWatchdog')
+		self.thread.daemon = True
+		self.thread.start()
+
+	def feed(self):
+		self.lastFed = time.monotonic()
+		if self.stalled:
+			self.stalled = False
+			logging.info("'{}' is receiving messages again".format(self.name))
+
+	def watch(self):
+		while not self.stopped.wait(self.threshold / 2.0):
+			silence = time.monotonic() - self.lastFed
+			if silence >= self.threshold and not self.stalled:
+				self.stalled = True
+				logging.warning("'{}' has had no message from the server for {:.1f}s".format(self.name, silence))
+				if self.onStall is not None:
+					self.onStall(self.name, silence)
+
+	def stop(self):
+		self.stopped.set()
+
+
+class ServerComms(object):
+	'''
+	TCP comms handler
+
+	Server protocol is simple:
+
+	* 1st byte is the message type - see ServerMessageTypes
+	* 2nd byte is the length in bytes of the payload (so max 255 byte payload)
+	* 3rd byte onwards is the payload encoded in JSON
+
+	Reads block in recv (no polling) and are buffered, so a message split
+	across reads survives a socket.timeout when readTimeout is set. EOF is
+	raised as ConnectionClosed.
+	'''
+	ServerSocket = None
+	MessageTypes = ServerMessageTypes
+	RecvSize = 4096
+
+
+	def __init__(self, hostname, port, serverSocket=None, readTimeout=None, watchdog=None, clock=None):
+		if serverSocket is None:
+			serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			serverSocket.connect((hostname, port))
+		self.ServerSocket = serverSocket
+		self.ServerSocket.settimeout(readTimeout)
+		self.readBuffer = bytearray()
+		self.watchdog = watchdog
+		self.clock = clock
+
+	def fillBuffer(self, length):
+		'''
+		Block until at least `length` bytes are buffered
+		'''
+		while len(self.readBuffer) < length:
+			buffData = self.ServerSocket.recv(self.RecvSize)
+			if not buffData:
+				# recv only returns nothing once the server has gone away
+				raise ConnectionClosed('server closed the connection')
+			self.readBuffer += buffData
+
+	def readTolength(self, length):
+		self.fillBuffer(length)
+		messageData = bytes(self.readBuffer[:length])
+		del self.readBuffer[:length]
+		return messageData
+
+	def readFrame(self):
+		'''
+		Read one message as (messageType, payload dict or None)
+		'''
+		# Only consume the header once the whole message is buffered, so a
+		# timeout part way through leaves the stream intact for a retry
+		self.fillBuffer(2)
+		messageType, messageLen = struct.unpack_from('>BB', self.readBuffer)
+		self.fillBuffer(2 + messageLen)
+		del self.readBuffer[:2]
+		if self.watchdog is not None:
+			self.watchdog.feed()
+
+		if messageLen == 0:
+			messageData = b''
+			messagePayload = None
+		else:
+			messageData = self.readTolength(messageLen)
+			messagePayload = json.loads(messageData.decode('utf-8'))
+			if messageType == ServerMessageTypes.GAMETIMEUPDATE and self.clock is not None and 'Time' in messagePayload:
+				self.clock.update(messagePayload.get('Time'))
+
+		# build the debug strings only when someone will see them
+		if logging.getLogger().isEnabledFor(logging.DEBUG):
+			logging.debug('Turned message {} into type {} payload {}'.format(
+				binascii.hexlify(messageData),
+				self.MessageTypes.toString(messageType),
+				messagePayload))
+		return messageType, messagePayload
+
+	def readMessage(self):
+		'''
+		Read a message from the server
+		'''
+		messageType, messagePayload = self.readFrame()
+		if messagePayload is None:
+			messagePayload = {}
+		messagePayload['messageType'] = messageType
+		return messagePayload
+
+	def readRecord(self, pool):
+		'''
+		Like readMessage, but an OBJECTUPDATE is decoded into an
+		ObjectRecord from `pool` (see records.py), stamped with its
+		receive time, or its GameClock stamp if the comms has a clock.
+		Other messages are returned as dicts.
+		'''
+		messageType, messagePayload = self.readFrame()
+		if messageType == ServerMessageTypes.OBJECTUPDATE and messagePayload is not None:
+			now = self.clock.stamp() if self.clock is not None else time.time()
+			return pool.acquire().fill(messageType, messagePayload, now)
+		if messagePayload is None:
+			messagePayload = {}
+		messagePayload['messageType'] = messageType
+		return messagePayload
+
+	def readTyped(self):
+		'''
+		Read a message as one of the typed classes from protocol.py
+		'''
+		return decode(*self.readFrame())
+
+	def sendMessage(self, messageType=None, messagePayload=None):
+		'''
+		Send a message to the server
+		'''
+		message = encodeFrame(messageType or 0, messagePayload)
+
+		if logging.getLogger().isEnabledFor(logging.DEBUG):
+			logging.debug('Turned message type {} payload {} into {}'.format(
+				self.MessageTypes.toString(messageType),
+				messagePayload,
+				binascii.hexlify(message)))
+		return self.ServerSocket.sendall(message)
+
+	def send(self, message):
+		'''
+		Send a typed message from protocol.py
+		'''
+		return self.ServerSocket.sendall(encode(message))
+
+	def close(self):
+		try:
+			self.ServerSocket.close()
+		except socket.error:
+			pass
@@ -8,7 +8,7 @@ import struct
 import argparse
 import random
 import threading
-import numpy as np
+import math
 import time
 
 class ServerMessageTypes(object):
@@ -52,7 +52,7 @@ class ServerMessageTypes(object):
 		TOGGLELEFT: "TOGGLELEFT",
 		TOGGLERIGHT: "TOGGLERIGHT",
 		TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-		TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+		TOGGLETURRETRIGHT: "TOGGLETURRETRIGHT",
 		TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
 		TURNTOHEADING: "TURNTOHEADING",
 		MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
@@ -100,19 +100,21 @@ class ServerComms(object):
 		self.ServerSocket.connect((hostname, port))
 
 	def readTolength(self, length):
-		messageData = self.ServerSocket.recv(length)
+		messageData = b''
 		while len(messageData) < length:
 			buffData = self.ServerSocket.recv(length - len(messageData))
-			if buffData:
-				messageData += buffData
+			if not buffData:
+				# recv only returns nothing once the server has gone away
+				raise socket.error('server closed the connection')
+			messageData += buffData
 		return messageData
 
 	def readMessage(self):
 		'''
 		Read a message from the server
 		'''
-		messageTypeRaw = self.ServerSocket.recv(1)
-		messageLenRaw = self.ServerSocket.recv(1)
+		messageTypeRaw = self.readTolength(1)
+		messageLenRaw = self.readTolength(1)
 		messageType = struct.unpack('>B', messageTypeRaw)[0]
 		messageLen = struct.unpack('>B', messageLenRaw)[0]
 		
@@ -157,29 +159,12 @@ class ServerComms(object):
 		return self.ServerSocket.send(message)
 
 
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
-args = parser.parse_args()
-
-# Set up console logging
-if args.debug:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
-
-
-
-
 # Helper function
 def getheading(pos1, pos2):
-    heading = np.arctan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
-    heading = np.degrees(heading)
+    heading = math.atan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
+    heading = math.degrees(heading)
     heading = (-heading)%360
-    return np.abs(heading)
+    return abs(heading)
 
 
 
@@ -262,14 +247,38 @@ class Tank(threading.Thread):
 		#print ("Inside run method for thread ", self.threadID)
 		logic(self.name)
 
-# Create 4 Tanks, each on a separate thread, and give them the AI corresponding to the logic function
-threads = []
 
-for i in range(1,2):
-	threads.append(Tank(i, "lo-pressure:tank"+str(i)))
-	print(threads[i-1].name)
-	threads[i-1].start()
-	print(threads[i-1].name + " started\n")
+def main():
+	global args
+	# Parse command line args
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
+	args = parser.parse_args()
+
+	# Set up console logging
+	if args.debug:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
+	else:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+
+
+
+
+	# Create 4 Tanks, each on a separate thread, and give them the AI corresponding to the logic function
+	threads = []
+
+	for i in range(1,2):
+		threads.append(Tank(i, "lo-pressure:tank"+str(i)))
+		print(threads[i-1].name)
+		threads[i-1].start()
+		print(threads[i-1].name + " started\n")
+
+	for t in threads:
+		t.join() # threads should never terminate - get killed when game ends and manually closed
+
 
-for t in threads:
-	t.join() # threads should never terminate - get killed when game ends and manually closed
\ No newline at end of file
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+'''
+Per-shot accounting from FIRE commands and hit/kill events.
+
+ShotTracker records every FIRE we send (range to the target and turret
+angle error at the time) in a fixed-size ring buffer. It resolves each
+shot from the events the server sends back:
+
+* SUCCESSFULLHIT - the oldest shot still in flight hit
+* KILL           - the last hit (or the oldest shot in flight) killed
+* shots with no SUCCESSFULLHIT within `resolveAfter` seconds missed,
+  checked on every event, FIRE and hitProbability(now=...)
+
+HITDETECTED and DESTROYED (us being hit or killed) are counted too.
+hitProbability estimates the hit rate for shots at a similar range and
+angle error, and shouldFire uses it to skip shots unlikely to land.
+'''
+
+import collections
+import random
+
+import numpy as np
+
+from servercomms import ServerMessageTypes
+
+PENDING, MISS, HIT, KILLED = 0, 1, 2, 3
+
+
+class ShotTracker(object):
+
+	def __init__(self, capacity=256, resolveAfter=3.0, rangeWindow=15.0, angleWindow=10.0):
+		self.capacity = capacity
+		self.resolveAfter = resolveAfter
+		self.rangeWindow = rangeWindow
+		self.angleWindow = angleWindow
+
+		self.firedAt = np.zeros(capacity)
+		self.distance = np.zeros(capacity)
+		self.angleError = np.zeros(capacity)
+		self.outcome = np.full(capacity, -1, dtype=np.int8)
+		self.count = 0
+		self.pending = collections.deque()
+		self.lastHit = None
+		self.hitsTaken = 0
+		self.deaths = 0
+
+	def fired(self, now, distance, angleError):
+		'''
+		Record a FIRE sent at `now`; returns its slot in the ring buffer
+		'''
+		self.expire(now)
+		slot = self.count % self.capacity
+		if self.outcome[slot] == PENDING and self.pending and self.pending[0] == slot:
+			# buffer wrapped before this shot resolved
+			self.pending.popleft()
+		self.firedAt[slot] = now
+		self.distance[slot] = distance
+		self.angleError[slot] = abs(angleError)
+		self.outcome[slot] = PENDING
+		self.pending.append(slot)
+		self.count += 1
+		return slot
+
+	def expire(self, now):
+		'''
+		Count shots that have gone unanswered for resolveAfter as misses
+		'''
+		while self.pending and now - self.firedAt[self.pending[0]] > self.resolveAfter:
+			self.outcome[self.pending.popleft()] = MISS
+
+	def event(self, messageType, now):
+		'''
+		Feed a server event; anything that is not a hit/kill event is ignored
+		'''
+		self.expire(now)
+		if messageType == ServerMessageTypes.SUCCESSFULLHIT:
+			if self.pending:
+				self.lastHit = self.pending.popleft()
+				self.outcome[self.lastHit] = HIT
+		elif messageType == ServerMessageTypes.KILL:
+			if self.lastHit is not None and self.outcome[self.lastHit] == HIT:
+				self.outcome[self.lastHit] = KILLED
+			elif self.pending:
+				self.outcome[self.pending.popleft()] = KILLED
+		elif messageType == ServerMessageTypes.HITDETECTED:
+			self.hitsTaken += 1
+		elif messageType == ServerMessageTypes.DESTROYED:
+			self.deaths += 1
+
+	def resolved(self):
+		'''
+		Mask of buffer slots holding resolved shots
+		'''
+		return self.outcome > PENDING
+
+	def hitRate(self):
+		done = self.resolved()
+		if not done.any():
+			return None
+		return float((self.outcome[done] >= HIT).mean())
+
+	def hitProbability(self, distance, angleError, now=None, prior=0.5, priorWeight=2.0):
+		'''
+		(probability, samples) for shots within rangeWindow / angleWindow of
+		the given range and angle error, smoothed towards `prior`. Pass
+		`now` to count overdue shots as misses first.
+		'''
+		if now is not None:
+			self.expire(now)
+		similar = (self.resolved()
+			& (np.abs(self.distance - distance) <= self.rangeWindow)
+			& (np.abs(self.angleError - abs(angleError)) <= self.angleWindow))
+		samples = int(similar.sum())
+		hits = int((self.outcome[similar] >= HIT).sum())
+		return (hits + prior * priorWeight) / (samples + priorWeight), samples
+
+	def shouldFire(self, distance, angleError, now=None, minProbability=0.25, minSamples=8, explore=0.1):
+		'''
+		False when past shots like this one mostly missed. A small share
+		of such shots is still taken so the estimate can recover.
+		'''
+		probability, samples = self.hitProbability(distance, angleError, now)
+		if samples < minSamples or probability >= minProbability:
+			return True
+		return random.random() < explore
+
+	def summary(self):
+		done = self.resolved()
+		return {
+			'shots': self.count,
+			'resolved': int(done.sum()),
+			'hits': int((self.outcome >= HIT).sum()),
+			'kills': int((self.outcome == KILLED).sum()),
+			'hitRate': self.hitRate(),
+			'hitsTaken': self.hitsTaken,
+			'deaths': self.deaths,
+		}
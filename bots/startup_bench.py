@@ -0,0 +1,181 @@
+#!/usr/bin/python
+
+'''
+Cold-start benchmark for the bots.
+
+For each bot script this measures:
+
+* import  - time for a fresh interpreter to import the script without
+            running main(). No server is listening, so a script that
+            touched the network at import would fail here.
+* first   - launch to the first CREATETANK arriving at a local listener
+* all     - launch to the last CREATETANK, for scripts that spawn several
+            tanks
+
+It also reports whether importing the script pulled in numpy. Timings are
+the median over --repeat runs.
+
+	python bots/startup_bench.py --repeat 10
+'''
+
+import json
+import socket
+import struct
+import argparse
+import subprocess
+import statistics
+import time
+import sys
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (script, tanks it spawns)
+BOTS = {
+	'big_bad_boy': (os.path.join(REPO_ROOT, 'calum', 'big_bad_boy.py'), 1),
+	'shoot_if_see': (os.path.join(REPO_ROOT, 'calum', 'shoot_if_see.py'), 1),
+	'RandomBot': (os.path.join(REPO_ROOT, 'bots', 'RandomBot.py'), 1),
+	'james1': (os.path.join(REPO_ROOT, 'bots', 'james1.py'), 1),
+	'StarterBot': (os.path.join(REPO_ROOT, 'bots', 'StarterBot.py'), 4),
+	'thread_try': (os.path.join(REPO_ROOT, 'bots', 'thread_try.py'), 4),
+	'shoot_if_see_multi': (os.path.join(REPO_ROOT, 'bots', 'shoot_if_see_multi.py'), 1),
+}
+
+IMPORT_PROBE = '''
+import importlib.util, sys, time
+sys.path.insert(0, {bots!r})
+sys.argv = [{script!r}]
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('bot', {script!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(time.perf_counter() - start, 'numpy' in sys.modules)
+'''
+
+
+def interpreterStart():
+	start = time.perf_counter()
+	subprocess.check_call([sys.executable, '-c', 'pass'])
+	return time.perf_counter() - start
+
+
+def importTime(script):
+	'''
+	(seconds spent importing the script, whether numpy got loaded)
+	'''
+	code = IMPORT_PROBE.format(bots=os.path.join(REPO_ROOT, 'bots'), script=script)
+	out = subprocess.check_output([sys.executable, '-c', code],
+		cwd=os.path.dirname(script), stderr=subprocess.DEVNULL, timeout=30)
+	seconds, numpy = out.decode('utf-8').split()
+	return float(seconds), numpy == 'True'
+
+
+def readCreateTank(sock):
+	header = b''
+	while len(header) < 2:
+		chunk = sock.recv(2 - len(header))
+		if not chunk:
+			raise EOFError('bot closed the connection')
+		header += chunk
+	messageType, messageLen = struct.unpack('>BB', header)
+	remaining = messageLen
+	while remaining:
+		chunk = sock.recv(remaining)
+		if not chunk:
+			raise EOFError('bot closed the connection')
+		remaining -= len(chunk)
+	return messageType
+
+
+def spawnTimes(script, tanks, timeout=30.0):
+	'''
+	(seconds to the first CREATETANK, seconds to the last), or None for
+	any that never arrived
+	'''
+	listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	listener.bind(('127.0.0.1', 0))
+	listener.listen(8)
+	port = listener.getsockname()[1]
+
+	arrivals = []
+	connections = []
+	start = time.perf_counter()
+	process = subprocess.Popen(
+		[sys.executable, script, '-H', '127.0.0.1', '-p', str(port), '-n', 'Bench:startup'],
+		cwd=os.path.dirname(script), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	try:
+		listener.settimeout(timeout)
+		while len(arrivals) < tanks:
+			sock, _ = listener.accept()
+			sock.settimeout(timeout)
+			connections.append(sock)
+			# tanks may connect before any of them sends CREATETANK, so read
+			# each one as it comes
+			if readCreateTank(sock) == 1:
+				arrivals.append(time.perf_counter() - start)
+	except (socket.timeout, EOFError):
+		pass
+	finally:
+		process.kill()
+		process.wait()
+		for sock in connections:
+			sock.close()
+		listener.close()
+
+	if not arrivals:
+		return None, None
+	return arrivals[0], arrivals[-1] if len(arrivals) == tanks else None
+
+
+def benchBot(script, tanks, repeat, baseline):
+	imports, firsts, lasts = [], [], []
+	numpy = False
+	for _ in range(repeat):
+		seconds, loaded = importTime(script)
+		imports.append(seconds)
+		numpy = numpy or loaded
+		first, last = spawnTimes(script, tanks)
+		if first is not None:
+			firsts.append(first)
+		if last is not None:
+			lasts.append(last)
+
+	def median(values):
+		return statistics.median(values) * 1e3 if values else None
+	return {
+		'import_ms': median(imports),
+		'first_ms': median(firsts),
+		'all_ms': median(lasts),
+		'numpy_at_import': numpy,
+		'interpreter_ms': baseline * 1e3,
+	}
+
+
+def printReport(report):
+	print('{:<20}{:>10}{:>10}{:>10}  {}'.format('bot', 'import ms', 'first ms', 'all ms', 'numpy at import'))
+	for bot, result in report.items():
+		cells = ['{:10.1f}'.format(result[k]) if result[k] is not None else '{:>10}'.format('-')
+			for k in ('import_ms', 'first_ms', 'all_ms')]
+		print('{:<20}{}  {}'.format(bot, ''.join(cells), 'yes' if result['numpy_at_import'] else 'no'))
+	if report:
+		print('(bare interpreter start: {:.1f} ms, included in first/all)'.format(
+			next(iter(report.values()))['interpreter_ms']))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-b', '--bot', action='append', choices=sorted(BOTS), help='Bot to benchmark (default: all)')
+	parser.add_argument('-r', '--repeat', default=5, type=int, help='Runs per bot')
+	parser.add_argument('--json', help='Also write the raw report to this file')
+	args = parser.parse_args()
+
+	baseline = statistics.median(interpreterStart() for _ in range(args.repeat))
+	report = {}
+	for bot in args.bot or sorted(BOTS):
+		script, tanks = BOTS[bot]
+		report[bot] = benchBot(script, tanks, args.repeat, baseline)
+
+	printReport(report)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(report, f, indent=2)
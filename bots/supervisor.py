@@ -0,0 +1,255 @@
+#!/usr/bin/python
+
+'''
+Warm tank pool: a supervisor that keeps pre-forked, pre-connected bot
+workers ready to take over a tank.
+
+The supervisor imports the bot script once (plus anything its preload()
+pulls in, e.g. numpy) and then forks workers, so no worker pays for
+imports. Each spare worker opens its game connection straight away and
+waits. When a tank needs a process (at start-up, or because its worker
+died) the supervisor hands a spare the tank name. The spare sends
+CREATETANK on its open socket, and the supervisor forks a new spare.
+
+Running workers publish snapshots of their learned world state
+(pickup spawn points, kinematics, occupancy ...) every few seconds. The
+latest snapshot for a tank goes to whichever worker takes it over next,
+so a restart keeps what the tank has learned so far.
+
+The bot script must define main(argv, serverSocket, state, publish);
+calum/big_bad_boy.py does.
+
+	python bots/supervisor.py calum/big_bad_boy.py -n Team:one -n Team:two -s 2
+'''
+
+import importlib.util
+import multiprocessing.connection
+import argparse
+import logging
+import signal
+import socket
+import time
+import sys
+import os
+
+from connection import isAlive
+
+
+def loadBot(script):
+	'''
+	Import a bot script as a module without running its main()
+	'''
+	directory = os.path.dirname(os.path.abspath(script))
+	if directory not in sys.path:
+		sys.path.insert(0, directory)
+	spec = importlib.util.spec_from_file_location('bot', script)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	if hasattr(module, 'preload'):
+		module.preload()
+	return module
+
+
+def openSocket(hostname, port, connectTimeout=5.0, maxBackoff=5.0):
+	'''
+	Connect to the game server, retrying with backoff until it answers
+	'''
+	backoff = 0.1
+	while True:
+		try:
+			sock = socket.create_connection((hostname, port), connectTimeout)
+			sock.settimeout(None)
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			return sock
+		except socket.error as e:
+			logging.info("Spare could not connect to {}:{}: {}".format(hostname, port, e))
+			time.sleep(backoff)
+			backoff = min(maxBackoff, backoff * 2)
+
+
+def workerMain(conn, bot, hostname, port, argv):
+	'''
+	Body of a forked worker: connect, wait for a tank name, run the bot
+	'''
+	sock = openSocket(hostname, port)
+	try:
+		order = conn.recv()
+	except EOFError:
+		return
+	if order[0] != 'run':
+		return
+	name, state = order[1], order[2]
+	if not isAlive(sock):
+		sock.close()
+		sock = openSocket(hostname, port)
+	conn.send(('started', name))
+
+	def publish(snapshot):
+		conn.send(('state', name, snapshot))
+
+	bot.main(list(argv) + ['-H', hostname, '-p', str(port), '-n', name],
+		serverSocket=sock, state=state, publish=publish)
+
+
+class Worker(object):
+
+	def __init__(self, pid, conn):
+		self.pid = pid
+		self.conn = conn
+		self.name = None
+		self.assignedAt = None
+		self.startedAt = None
+
+
+class Supervisor(object):
+	'''
+	Keeps one worker per tank name and `spares` idle workers ready
+	'''
+
+	def __init__(self, bot, names, hostname, port, spares=2, argv=(), minLifetime=2.0, maxBackoff=5.0):
+		self.bot = bot
+		self.names = list(names)
+		self.hostname = hostname
+		self.port = port
+		self.spares = spares
+		self.argv = list(argv)
+		self.minLifetime = minLifetime
+		self.maxBackoff = maxBackoff
+
+		self.idle = []
+		self.running = {}
+		self.states = {}
+		self.backoff = dict((name, 0.0) for name in self.names)
+		self.waitingUntil = {}
+		self.stopping = False
+
+	def fork(self):
+		parentEnd, childEnd = multiprocessing.connection.Pipe()
+		pid = os.fork()
+		if pid == 0:
+			code = 0
+			try:
+				signal.signal(signal.SIGTERM, signal.SIG_DFL)
+				signal.signal(signal.SIGINT, signal.SIG_DFL)
+				parentEnd.close()
+				for worker in self.idle + list(self.running.values()):
+					worker.conn.close()
+				workerMain(childEnd, self.bot, self.hostname, self.port, self.argv)
+			except BaseException:
+				logging.exception("Worker {} failed".format(os.getpid()))
+				code = 1
+			finally:
+				# never fall back into the supervisor's loop or atexit handlers
+				os._exit(code)
+		childEnd.close()
+		self.idle.append(Worker(pid, parentEnd))
+
+	def topUp(self):
+		while len(self.idle) < self.spares and not self.stopping:
+			self.fork()
+
+	def assign(self, name):
+		while True:
+			if not self.idle:
+				self.fork()
+			worker = self.idle.pop(0)
+			worker.name = name
+			worker.assignedAt = time.perf_counter()
+			try:
+				worker.conn.send(('run', name, self.states.get(name)))
+				break
+			except OSError:
+				# the spare died while idle; reap it and try the next one
+				worker.conn.close()
+				os.waitpid(worker.pid, 0)
+		self.running[name] = worker
+		self.topUp()
+
+	def handle(self, worker):
+		try:
+			message = worker.conn.recv()
+		except (EOFError, OSError):
+			self.reap(worker)
+			return
+		if message[0] == 'started':
+			worker.startedAt = time.perf_counter()
+			logging.info("{} taken over by worker {} in {:.1f} ms".format(
+				worker.name, worker.pid, (worker.startedAt - worker.assignedAt) * 1e3))
+		elif message[0] == 'state':
+			self.states[message[1]] = message[2]
+
+	def reap(self, worker):
+		worker.conn.close()
+		try:
+			os.waitpid(worker.pid, 0)
+		except ChildProcessError:
+			pass
+		if worker in self.idle:
+			self.idle.remove(worker)
+			self.topUp()
+			return
+		name = worker.name
+		del self.running[name]
+		lifetime = time.perf_counter() - worker.assignedAt
+		# a worker that dies straight away is probably failing on every
+		# attempt; back off rather than burning through spares
+		if lifetime < self.minLifetime:
+			self.backoff[name] = min(self.maxBackoff, max(0.1, self.backoff[name] * 2))
+		else:
+			self.backoff[name] = 0.0
+		logging.info("Worker {} for {} exited after {:.1f}s".format(worker.pid, name, lifetime))
+		self.waitingUntil[name] = time.perf_counter() + self.backoff[name]
+
+	def run(self):
+		self.topUp()
+		for name in self.names:
+			self.assign(name)
+		while not self.stopping:
+			now = time.perf_counter()
+			for name, due in list(self.waitingUntil.items()):
+				if due <= now:
+					del self.waitingUntil[name]
+					self.assign(name)
+			timeout = None
+			if self.waitingUntil:
+				timeout = max(0.0, min(self.waitingUntil.values()) - now)
+			workers = dict((w.conn, w) for w in self.idle + list(self.running.values()))
+			for conn in multiprocessing.connection.wait(list(workers), timeout):
+				self.handle(workers[conn])
+
+	def stop(self, signum=None, frame=None):
+		self.stopping = True
+		for worker in self.idle + list(self.running.values()):
+			try:
+				os.kill(worker.pid, signal.SIGTERM)
+			except OSError:
+				pass
+		for worker in self.idle + list(self.running.values()):
+			try:
+				os.waitpid(worker.pid, 0)
+			except ChildProcessError:
+				pass
+		sys.exit(0)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(epilog='Arguments after -- are passed on to the bot, e.g. -- --gc off')
+	parser.add_argument('script', help='Bot script to run, e.g. calum/big_bad_boy.py')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', action='append', required=True, help='Tank name to keep alive (repeat for several)')
+	parser.add_argument('-s', '--spares', default=2, type=int, help='Idle pre-connected workers to keep ready')
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	argv = sys.argv[1:]
+	botArgs = []
+	if '--' in argv:
+		argv, botArgs = argv[:argv.index('--')], argv[argv.index('--') + 1:]
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG if args.debug else logging.INFO)
+
+	bot = loadBot(args.script)
+	supervisor = Supervisor(bot, args.name, args.hostname, args.port, args.spares, botArgs)
+	signal.signal(signal.SIGTERM, supervisor.stop)
+	signal.signal(signal.SIGINT, supervisor.stop)
+	supervisor.run()
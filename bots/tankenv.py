@@ -0,0 +1,390 @@
+#!/usr/bin/python
+
+'''
+Gym-style environments for training tank policies.
+
+Every tank is an agent. Observations are float32 arrays built from the
+fields of the OBJECTUPDATEs a tank receives (X, Y, Heading,
+TurretHeading, Health, Ammo, Type), laid out by observe():
+
+	own tank        x, y, sin/cos heading, sin/cos turret, health, ammo
+	nearest tanks   `neighbours` slots of: present, dx, dy, sin/cos
+	                heading, sin/cos turret, health
+	nearest pickup  one slot each for health and ammo: present, dx, dy
+
+Positions are scaled to roughly [-1, 1]. An action is an index into
+ACTIONS, each one a ServerMessageTypes command with its amount.
+
+VecTankEnv steps N simulated arenas (physics.World) in one batch call;
+observations come back stacked as (arenas, tanks, features).
+ParallelTankEnv shards arenas over worker processes so throughput scales
+with cores. CommsTankEnv wraps a live ServerComms for evaluation and has
+the same interface, with one arena of one tank.
+
+	reset()        -> observations
+	step(actions)  -> observations, rewards, dones, infos
+
+Matches have a fixed length, so every arena in a VecTankEnv finishes on
+the same step. It then resets itself and returns the first observations
+of the next match. The last observations of the finished match are in
+infos['terminal_observation']. Given a seed, episode k of an env is
+seeded from (seed, k), so every match can be replayed, not just the
+first; reset(seed) starts again from episode 0.
+
+	python bots/tankenv.py --arenas 64 --workers 4
+'''
+
+import multiprocessing
+import collections
+import argparse
+import time
+
+import numpy as np
+
+from servercomms import ServerMessageTypes, ConnectionClosed
+import physics
+
+# action index: (command, amount); TEST stands for doing nothing
+ACTIONS = ([(ServerMessageTypes.TEST, None), (ServerMessageTypes.FIRE, None)]
+	+ [(messageType, None) for messageType in (
+		ServerMessageTypes.TOGGLEFORWARD, ServerMessageTypes.TOGGLEREVERSE,
+		ServerMessageTypes.TOGGLELEFT, ServerMessageTypes.TOGGLERIGHT,
+		ServerMessageTypes.TOGGLETURRETLEFT, ServerMessageTypes.TOGGLETURRETRIGHT,
+		ServerMessageTypes.STOPALL)]
+	+ [(ServerMessageTypes.TURNTOHEADING, heading) for heading in range(0, 360, 45)]
+	+ [(ServerMessageTypes.TURNTURRETTOHEADING, heading) for heading in range(0, 360, 45)]
+	+ [(ServerMessageTypes.MOVEFORWARDDISTANCE, 10), (ServerMessageTypes.MOVEBACKWARDSDISTANCE, 10)])
+ACTION_TYPES = np.array([messageType for messageType, _ in ACTIONS], dtype=np.int16)
+ACTION_AMOUNTS = np.array([amount or 0 for _, amount in ACTIONS], dtype=float)
+
+# reward per unit change in banked and unbanked points, per hit landed
+# and per death
+REWARD_WEIGHTS = {'banked': 1.0, 'points': 0.5, 'hits': 0.1, 'deaths': -0.25}
+
+PICKUP_KINDS = {'HealthPickup': physics.HEALTH, 'AmmoPickup': physics.AMMO}
+
+
+def observationSize(neighbours=3):
+	return 8 + 8 * neighbours + 3 * len(PICKUP_KINDS)
+
+
+def observe(own, tanks, tankSeen, pickups, pickupSeen, neighbours=3):
+	'''
+	Observations for a batch of tanks. `own` maps OBJECTUPDATE fields to
+	arrays of the batch shape. `tanks` maps the same fields to arrays with
+	one more axis, one entry per other tank, and `tankSeen` masks it.
+	`pickups` has X, Y and kind (physics.HEALTH / AMMO), masked by
+	`pickupSeen`.
+	'''
+	width, height = physics.ARENA_WIDTH / 2.0, physics.ARENA_HEIGHT / 2.0
+	x, y = own['X'][..., None], own['Y'][..., None]
+	heading, turret = np.radians(own['Heading']), np.radians(own['TurretHeading'])
+	blocks = [np.stack([own['X'] / width, own['Y'] / height, np.sin(heading), np.cos(heading),
+		np.sin(turret), np.cos(turret), own['Health'] / float(physics.MAX_HEALTH),
+		own['Ammo'] / float(physics.MAX_AMMO)], axis=-1)]
+
+	dx, dy = tanks['X'] - x, tanks['Y'] - y
+	dist = np.where(tankSeen, np.hypot(dx, dy), np.inf)
+	order = np.argsort(dist, axis=-1)[..., :neighbours]
+	pick = lambda a: np.take_along_axis(np.broadcast_to(a, dist.shape), order, axis=-1)
+	present = np.isfinite(pick(dist))
+	heading, turret = np.radians(pick(tanks['Heading'])), np.radians(pick(tanks['TurretHeading']))
+	slots = np.stack([present, pick(dx) / physics.VIEW_RANGE, pick(dy) / physics.VIEW_RANGE,
+		np.sin(heading), np.cos(heading), np.sin(turret), np.cos(turret),
+		pick(tanks['Health']) / float(physics.MAX_HEALTH)], axis=-1) * present[..., None]
+	# fewer tanks than slots: pad with absent ones
+	padding = neighbours - slots.shape[-2]
+	if padding:
+		slots = np.concatenate([slots, np.zeros(slots.shape[:-2] + (padding, slots.shape[-1]))], axis=-2)
+	blocks.append(slots.reshape(slots.shape[:-2] + (-1,)))
+
+	dx, dy = pickups['X'] - x, pickups['Y'] - y
+	for kind in sorted(PICKUP_KINDS.values()):
+		dist = np.where(pickupSeen & (pickups['kind'] == kind), np.hypot(dx, dy), np.inf)
+		if dist.shape[-1] == 0:
+			blocks.append(np.zeros(dist.shape[:-1] + (3,)))
+			continue
+		nearest = np.argmin(dist, axis=-1)[..., None]
+		present = np.isfinite(np.take_along_axis(dist, nearest, axis=-1))[..., 0]
+		blocks.append(np.stack([present,
+			np.take_along_axis(np.broadcast_to(dx, dist.shape), nearest, axis=-1)[..., 0] / physics.VIEW_RANGE * present,
+			np.take_along_axis(np.broadcast_to(dy, dist.shape), nearest, axis=-1)[..., 0] / physics.VIEW_RANGE * present], axis=-1))
+	return np.concatenate(blocks, axis=-1).astype(np.float32)
+
+
+def reward(weights, banked, points, hits, deaths):
+	return (weights['banked'] * banked + weights['points'] * points
+		+ weights['hits'] * hits + weights['deaths'] * deaths)
+
+
+class VecTankEnv(object):
+	'''
+	`arenas` simulated arenas of `tanks` agents each, stepped together.
+	Each step applies one action per tank, then advances the world
+	`frameSkip` physics steps of `dt` seconds.
+	'''
+
+	def __init__(self, arenas=8, tanks=4, pickups=4, neighbours=3, dt=0.1, frameSkip=2,
+			matchSeconds=180.0, seed=None, rewardWeights=None):
+		self.seed = seed
+		self.episode = 0
+		self.world = physics.World(arenas, tanks, pickups, seed=self.episodeSeed())
+		self.arenas = arenas
+		self.tanks = tanks
+		self.neighbours = neighbours
+		self.dt = dt
+		self.frameSkip = frameSkip
+		self.matchSeconds = matchSeconds
+		self.rewardWeights = dict(REWARD_WEIGHTS, **(rewardWeights or {}))
+		self.observationSize = observationSize(neighbours)
+		self.actionCount = len(ACTIONS)
+		self.elapsed = 0.0
+
+	def episodeSeed(self):
+		return None if self.seed is None else [self.seed, self.episode]
+
+	def reset(self, seed=None):
+		'''
+		Start the next episode, or episode 0 of `seed` if one is given
+		'''
+		if seed is not None:
+			self.seed, self.episode = seed, 0
+		else:
+			self.episode += 1
+		self.world.reset(self.episodeSeed())
+		self.elapsed = 0.0
+		return self.observe()
+
+	def observe(self):
+		w = self.world
+		t, p = w.tanks, w.pickups
+		own = {'X': t['x'], 'Y': t['y'], 'Heading': t['heading'], 'TurretHeading': t['turret'],
+			'Health': t['health'], 'Ammo': t['ammo']}
+		# every tank's fields, as seen from every other tank
+		others = dict((field, values[:, None, :]) for field, values in own.items())
+		pickups = {'X': p['x'][:, None, :], 'Y': p['y'][:, None, :], 'kind': p['kind'][:, None, :]}
+		obs = observe(own, others, w.visibleTanks(), pickups, w.visiblePickups(), self.neighbours)
+		# dead tanks get no OBJECTUPDATEs
+		obs[~t['alive']] = 0.0
+		return obs
+
+	def step(self, actions):
+		'''
+		actions: (arenas, tanks) indices into ACTIONS
+		'''
+		w = self.world
+		actions = np.asarray(actions)
+		w.commandBatch(ACTION_TYPES[actions], ACTION_AMOUNTS[actions])
+		banked, points = w.tanks['banked'].astype(float), w.tanks['points'].astype(float)
+		hits = np.zeros((self.arenas, self.tanks))
+		deaths = np.zeros((self.arenas, self.tanks))
+		for _ in range(self.frameSkip):
+			w.step(self.dt)
+			hits += w.flags[ServerMessageTypes.SUCCESSFULLHIT]
+			deaths += w.flags[ServerMessageTypes.DESTROYED]
+		self.elapsed += self.dt * self.frameSkip
+		rewards = reward(self.rewardWeights, w.tanks['banked'] - banked, w.tanks['points'] - points, hits, deaths)
+
+		infos = {'banked': w.tanks['banked'].copy(), 'kills': w.tanks['kills'].copy(), 'elapsed': self.elapsed}
+		done = self.elapsed >= self.matchSeconds - 1e-9
+		if done:
+			infos['terminal_observation'] = self.observe()
+			obs = self.reset()
+		else:
+			obs = self.observe()
+		return obs, rewards.astype(np.float32), np.full(self.arenas, done), infos
+
+	def close(self):
+		pass
+
+
+def envWorker(conn, kwargs):
+	env = VecTankEnv(**kwargs)
+	while True:
+		command, data = conn.recv()
+		if command == 'reset':
+			conn.send(env.reset(data))
+		elif command == 'step':
+			conn.send(env.step(data))
+		elif command == 'close':
+			conn.close()
+			return
+
+
+class ParallelTankEnv(object):
+	'''
+	VecTankEnv sharded over `workers` processes of `arenas` arenas each;
+	observations and rewards are concatenated along the arena axis
+	'''
+
+	def __init__(self, workers=2, arenas=8, seed=None, **kwargs):
+		self.workers = workers
+		self.arenas = arenas
+		self.conns = []
+		self.processes = []
+		for i in range(workers):
+			parentEnd, childEnd = multiprocessing.Pipe()
+			shard = dict(kwargs, arenas=arenas, seed=None if seed is None else seed + i)
+			process = multiprocessing.Process(target=envWorker, args=(childEnd, shard))
+			process.daemon = True
+			process.start()
+			childEnd.close()
+			self.conns.append(parentEnd)
+			self.processes.append(process)
+		self.observationSize = observationSize(kwargs.get('neighbours', 3))
+		self.actionCount = len(ACTIONS)
+
+	def reset(self, seed=None):
+		for i, conn in enumerate(self.conns):
+			conn.send(('reset', None if seed is None else seed + i))
+		return np.concatenate([conn.recv() for conn in self.conns])
+
+	def step(self, actions):
+		actions = np.asarray(actions)
+		for i, conn in enumerate(self.conns):
+			conn.send(('step', actions[i * self.arenas:(i + 1) * self.arenas]))
+		results = [conn.recv() for conn in self.conns]
+		infos = {}
+		for key in results[0][3]:
+			values = [r[3][key] for r in results]
+			infos[key] = np.concatenate(values) if isinstance(values[0], np.ndarray) else values[0]
+		return (np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]),
+			np.concatenate([r[2] for r in results]), infos)
+
+	def close(self):
+		for conn in self.conns:
+			try:
+				conn.send(('close', None))
+			except OSError:
+				pass
+			conn.close()
+		for process in self.processes:
+			process.join()
+
+
+class CommsTankEnv(object):
+	'''
+	One tank on a live server, through a ServerComms (or
+	ReconnectingComms), with the VecTankEnv interface: observations are
+	(1, 1, features).
+
+	A step sends the action and reads until the tank's next OBJECTUPDATE
+	of itself. Tanks and pickups seen since the previous step make up the
+	rest of the observation. Points are counted locally from KILL,
+	ENTEREDGOAL and DESTROYED, since the server never reports them.
+	'''
+
+	def __init__(self, comms, name, neighbours=3, rewardWeights=None):
+		self.comms = comms
+		self.name = name
+		self.neighbours = neighbours
+		self.rewardWeights = dict(REWARD_WEIGHTS, **(rewardWeights or {}))
+		self.observationSize = observationSize(neighbours)
+		self.actionCount = len(ACTIONS)
+		self.created = False
+		self.me = None
+		self.tanksSeen = {}
+		self.pickupsSeen = {}
+		self.points = 0
+		self.banked = 0
+		self.done = False
+
+	def reset(self, seed=None):
+		if not self.created:
+			self.comms.sendMessage(ServerMessageTypes.CREATETANK, {'Name': self.name})
+			self.created = True
+		self.done = False
+		self.read()
+		return self.observe()
+
+	def read(self):
+		'''
+		Read up to our tank's next update of itself; returns event counts
+		'''
+		events = collections.Counter()
+		while True:
+			try:
+				message = self.comms.readMessage()
+			except ConnectionClosed:
+				self.done = True
+				return events
+			messageType = message['messageType']
+			if messageType == ServerMessageTypes.OBJECTUPDATE:
+				if message.get('Name') == self.name:
+					self.me = message
+					return events
+				if message.get('Type') == 'Tank':
+					self.tanksSeen[message['Id']] = message
+				elif message.get('Type') in PICKUP_KINDS:
+					self.pickupsSeen[message['Id']] = message
+			elif messageType == ServerMessageTypes.GAMETIMEUPDATE:
+				if message.get('Time', 1) <= 0:
+					self.done = True
+					return events
+			else:
+				events[messageType] += 1
+
+	def observe(self):
+		fields = ('X', 'Y', 'Heading', 'TurretHeading', 'Health', 'Ammo')
+		me = self.me or dict((field, 0.0) for field in fields)
+		own = dict((field, np.array([[float(me[field])]])) for field in fields)
+		tanks = list(self.tanksSeen.values())
+		others = dict((field, np.array([[[float(t[field]) for t in tanks]]]).reshape(1, 1, len(tanks))) for field in fields)
+		pickups = list(self.pickupsSeen.values())
+		pickupFields = {
+			'X': np.array([float(p['X']) for p in pickups]).reshape(1, 1, -1),
+			'Y': np.array([float(p['Y']) for p in pickups]).reshape(1, 1, -1),
+			'kind': np.array([PICKUP_KINDS[p['Type']] for p in pickups], dtype=int).reshape(1, 1, -1),
+		}
+		obs = observe(own, others, np.ones((1, 1, len(tanks)), dtype=bool),
+			pickupFields, np.ones((1, 1, len(pickups)), dtype=bool), self.neighbours)
+		self.tanksSeen = {}
+		self.pickupsSeen = {}
+		return obs
+
+	def step(self, actions):
+		messageType, amount = ACTIONS[int(np.asarray(actions).reshape(-1)[0])]
+		if messageType != ServerMessageTypes.TEST:
+			self.comms.sendMessage(messageType, None if amount is None else {'Amount': amount})
+		events = self.read()
+
+		banked, points = self.banked, self.points
+		self.points += events[ServerMessageTypes.KILL]
+		if events[ServerMessageTypes.ENTEREDGOAL]:
+			self.banked += self.points
+			self.points = 0
+		if events[ServerMessageTypes.DESTROYED]:
+			self.points = 0
+		rewards = reward(self.rewardWeights, self.banked - banked, self.points - points,
+			events[ServerMessageTypes.SUCCESSFULLHIT], events[ServerMessageTypes.DESTROYED])
+		infos = {'banked': np.array([[self.banked]]), 'events': dict(events)}
+		return self.observe(), np.array([[rewards]], dtype=np.float32), np.array([self.done]), infos
+
+	def close(self):
+		self.comms.close()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-a', '--arenas', default=64, type=int, help='Arenas per worker')
+	parser.add_argument('-t', '--tanks', default=4, type=int, help='Tanks per arena')
+	parser.add_argument('-w', '--workers', default=1, type=int, help='Worker processes (1 steps in this process)')
+	parser.add_argument('-n', '--steps', default=500, type=int, help='Steps to run')
+	args = parser.parse_args()
+
+	if args.workers > 1:
+		env = ParallelTankEnv(args.workers, args.arenas, seed=0, tanks=args.tanks)
+	else:
+		env = VecTankEnv(args.arenas, args.tanks, seed=0)
+	rng = np.random.default_rng(0)
+	obs = env.reset()
+	start = time.perf_counter()
+	total = 0.0
+	for _ in range(args.steps):
+		obs, rewards, dones, infos = env.step(rng.integers(0, env.actionCount, obs.shape[:2]))
+		total += rewards.sum()
+	elapsed = time.perf_counter() - start
+	env.close()
+	agents = obs.shape[0] * obs.shape[1]
+	print('observations {}, {} steps/s ({} agent-steps/s), total reward {:.1f}'.format(
+		obs.shape, int(args.steps / elapsed), int(args.steps * agents / elapsed), total))
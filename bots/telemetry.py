@@ -0,0 +1,219 @@
+#!/usr/bin/python
+
+'''
+Compact binary capture of OBJECTUPDATE telemetry.
+
+A capture file is a 16 byte header followed by fixed-width 32 byte records:
+
+	time           float64  seconds (time.time() when recorded)
+	Id             int32
+	X, Y           float32
+	Heading        float32
+	TurretHeading  float32
+	Health         uint8
+	Ammo           uint8
+	Type           uint8    see TYPE_CODES
+	(pad)          1 byte
+
+An update is only written when one of its fields differs from the last
+record written for the same Id, so a missing record means "unchanged".
+Names are not fixed width; each Id's Name and Type are appended once to a
+JSON-lines sidecar file next to the capture (<path>.names).
+
+The writer only needs the standard library so it is cheap to use inside a
+bot. loadCapture memory-maps a file into a numpy structured array.
+
+	python bots/telemetry.py convert bots/logs.txt match.cap
+	python bots/telemetry.py info match.cap
+'''
+
+import ast
+import argparse
+import json
+import os
+import struct
+import time
+
+MAGIC = b'DYHTGCAP'
+VERSION = 1
+HEADER = struct.Struct('<8sHH4x')
+RECORD = struct.Struct('<diffffBBBx')
+
+TYPE_CODES = {
+	'Tank': 1,
+	'HealthPickup': 2,
+	'AmmoPickup': 3,
+	'Snitch': 4,
+}
+TYPE_NAMES = dict((code, name) for name, code in TYPE_CODES.items())
+
+# numpy dtype matching RECORD, for loadCapture
+RECORD_FIELDS = [
+	('time', '<f8'),
+	('Id', '<i4'),
+	('X', '<f4'),
+	('Y', '<f4'),
+	('Heading', '<f4'),
+	('TurretHeading', '<f4'),
+	('Health', 'u1'),
+	('Ammo', 'u1'),
+	('Type', 'u1'),
+	('pad', 'u1'),
+]
+
+
+def namesPath(path):
+	return path + '.names'
+
+
+class TelemetryWriter(object):
+	'''
+	Append OBJECTUPDATE messages to a capture file, skipping repeats
+	'''
+
+	def __init__(self, path, flushEvery=256):
+		self.path = path
+		self.flushEvery = flushEvery
+		self.pending = bytearray()
+		self.pendingCount = 0
+		self.last = {}
+		self.written = 0
+		self.skipped = 0
+
+		exists = os.path.exists(path) and os.path.getsize(path) > 0
+		self.file = open(path, 'ab')
+		self.namesFile = open(namesPath(path), 'a')
+		if exists:
+			checkHeader(path)
+			# keep one sidecar entry per Id across appends
+			for entry in readNames(path).values():
+				self.last[entry['Id']] = None
+		else:
+			self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+			# on disk straight away, so even a capture cut short is readable
+			self.file.flush()
+
+	def record(self, message, timestamp=None):
+		'''
+		Store one OBJECTUPDATE payload. Returns True if it was written,
+		False if it repeated the previous state of the same object.
+		'''
+		objectId = message['Id']
+		state = RECORD.pack(0.0, objectId, message['X'], message['Y'],
+			message.get('Heading', 0.0), message.get('TurretHeading', 0.0),
+			message.get('Health', 0), message.get('Ammo', 0),
+			TYPE_CODES.get(message.get('Type'), 0))[8:]
+
+		if objectId not in self.last:
+			json.dump({'Id': objectId, 'Name': message.get('Name', ''), 'Type': message.get('Type', '')}, self.namesFile)
+			self.namesFile.write('\n')
+		elif self.last[objectId] == state:
+			self.skipped += 1
+			return False
+		self.last[objectId] = state
+
+		if timestamp is None:
+			timestamp = message.get('time', time.time())
+		self.pending += struct.pack('<d', timestamp)
+		self.pending += state
+		self.pendingCount += 1
+		self.written += 1
+		if self.pendingCount >= self.flushEvery:
+			self.flush()
+		return True
+
+	def flush(self):
+		self.file.write(self.pending)
+		self.file.flush()
+		self.namesFile.flush()
+		del self.pending[:]
+		self.pendingCount = 0
+
+	def close(self):
+		self.flush()
+		self.file.close()
+		self.namesFile.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def checkHeader(path):
+	with open(path, 'rb') as f:
+		magic, version, recordSize = HEADER.unpack(f.read(HEADER.size))
+	if magic != MAGIC or recordSize != RECORD.size:
+		raise ValueError('{} is not a version {} telemetry capture'.format(path, VERSION))
+	return version
+
+
+def loadCapture(path):
+	'''
+	Memory-map a capture as a numpy structured array of RECORD_FIELDS
+	'''
+	import numpy as np
+	checkHeader(path)
+	count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+	if count == 0:
+		return np.zeros(0, dtype=RECORD_FIELDS)
+	return np.memmap(path, dtype=RECORD_FIELDS, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def readNames(path):
+	'''
+	{Id: {'Id', 'Name', 'Type'}} from a capture's sidecar
+	'''
+	names = {}
+	if os.path.exists(namesPath(path)):
+		with open(namesPath(path)) as f:
+			for line in f:
+				if line.strip():
+					entry = json.loads(line)
+					names[entry['Id']] = entry
+	return names
+
+
+def convertLog(logPath, capturePath, interval=1.0):
+	'''
+	Convert a logs.txt style file of message dict reprs. The logs carry no
+	timestamps, so line n is stamped n * interval.
+	'''
+	with TelemetryWriter(capturePath) as writer:
+		with open(logPath) as f:
+			for n, line in enumerate(f):
+				line = line.strip()
+				if not line.startswith('{'):
+					continue
+				message = ast.literal_eval(line)
+				if message.get('messageType') == 18:
+					writer.record(message, n * interval)
+	return writer
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	sub = parser.add_subparsers(dest='command')
+	convert = sub.add_parser('convert', help='Convert a logs.txt message dump')
+	convert.add_argument('log')
+	convert.add_argument('capture')
+	convert.add_argument('-i', '--interval', default=1.0, type=float, help='Seconds between log lines')
+	info = sub.add_parser('info', help='Summarise a capture')
+	info.add_argument('capture')
+	args = parser.parse_args()
+
+	if args.command == 'convert':
+		writer = convertLog(args.log, args.capture, args.interval)
+		print('{} records written, {} repeats skipped, {} bytes'.format(
+			writer.written, writer.skipped, os.path.getsize(args.capture)))
+	elif args.command == 'info':
+		records = loadCapture(args.capture)
+		names = readNames(args.capture)
+		print('{} records, {} objects'.format(len(records), len(names)))
+		if len(records):
+			print('time {:.3f} to {:.3f}'.format(records['time'][0], records['time'][-1]))
+		for objectId, entry in sorted(names.items()):
+			print('{:>6} {:<14} {}'.format(objectId, entry['Type'], entry['Name']))
+	else:
+		parser.print_help()
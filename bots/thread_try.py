@@ -8,8 +8,14 @@ import struct
 import argparse
 import random
 import threading
-import numpy as np
 import math
+import time
+import os
+
+from aiming import AimController
+
+# with a hit table, hold fire on shots less likely than this to hit
+MIN_HIT_PROBABILITY = 0.25
 
 class ServerMessageTypes(object):
 	TEST = 0
@@ -52,7 +58,7 @@ class ServerMessageTypes(object):
 		TOGGLELEFT: "TOGGLELEFT",
 		TOGGLERIGHT: "TOGGLERIGHT",
 		TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-		TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+		TOGGLETURRETRIGHT: "TOGGLETURRETRIGHT",
 		TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
 		TURNTOHEADING: "TURNTOHEADING",
 		MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
@@ -100,19 +106,21 @@ class ServerComms(object):
 		self.ServerSocket.connect((hostname, port))
 
 	def readTolength(self, length):
-		messageData = self.ServerSocket.recv(length)
+		messageData = b''
 		while len(messageData) < length:
 			buffData = self.ServerSocket.recv(length - len(messageData))
-			if buffData:
-				messageData += buffData
+			if not buffData:
+				# recv only returns nothing once the server has gone away
+				raise socket.error('server closed the connection')
+			messageData += buffData
 		return messageData
 
 	def readMessage(self):
 		'''
 		Read a message from the server
 		'''
-		messageTypeRaw = self.ServerSocket.recv(1)
-		messageLenRaw = self.ServerSocket.recv(1)
+		messageTypeRaw = self.readTolength(1)
+		messageLenRaw = self.readTolength(1)
 		messageType = struct.unpack('>B', messageTypeRaw)[0]
 		messageLen = struct.unpack('>B', messageLenRaw)[0]
 
@@ -157,25 +165,11 @@ class ServerComms(object):
 		return self.ServerSocket.send(message)
 
 
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
-args = parser.parse_args()
-
-# Set up console logging
-if args.debug:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
-
 def getheading(pos1, pos2):
-	heading = np.arctan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
-	heading = np.degrees(heading)
+	heading = math.atan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
+	heading = math.degrees(heading)
 	heading = (-heading)%360
-	return np.abs(heading)
+	return abs(heading)
 
 
 def logic(name,port):
@@ -189,59 +183,114 @@ def logic(name,port):
     logging.info("Creating tank with name '{}'".format(name))
 
     my_pos = (0,0)
-    my_heading = 0
     targ_pos = (0,0)
     targ_heading = 0
+    target = None
+    targ_seen = None
+    targ_speed = 0.0
     aiming = False
-    point = False
+    turning = False
+    aim = AimController()
 
     while True:
         message = GameServer.readMessage()
-
-        if message['messageType'] == 18:
-            if message['Type'] == 'Tank':
-                if message['Name'] == args.name:
-                    my_pos = (message['X'],message['Y'])
-                    my_heading = message['Heading']
-                else:
-                    #could change to check team
-                    GameServer.sendMessage(ServerMessageTypes.STOPTURN)
-                    targ_pos = (message['X'],message['Y'])
-                    targ_heading = getheading(my_pos,targ_pos)
-                    aiming = True
+        now = time.time()
+
+        if message['messageType'] == 18 and message['Type'] == 'Tank':
+            # share what we see with the rest of the team
+            coordinator.report(message, now)
+            if message['Name'] == name:
+                my_pos = (message['X'],message['Y'])
+                aim.observe(message['TurretHeading'], now)
+
+        # the coordinator decides which enemy, if any, this tank goes after
+        orders = coordinator.ordersFor(name, now)
+        if orders['role'] == 'attack':
+            if turning:
+                GameServer.sendMessage(ServerMessageTypes.STOPTURN)
+                turning = False
+            # how fast the target is moving, for the hit table, from the
+            # coordinator's timestamps of the last two sightings of it
+            if target is None or target['Name'] != orders['target']['Name']:
+                targ_speed = 0.0
+            elif orders['seen'] > targ_seen:
+                targ_speed = math.hypot(orders['target']['X'] - target['X'], orders['target']['Y'] - target['Y']) / (orders['seen'] - targ_seen)
+            target, targ_seen = orders['target'], orders['seen']
+            targ_pos = (orders['target']['X'],orders['target']['Y'])
+            targ_heading = getheading(my_pos,targ_pos)
+            aiming = True
+            # only turn the turret again if the target has moved noticeably
+            if aim.aim(targ_heading, now):
+                GameServer.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {"Amount": targ_heading})
+                print("turning turret to {}".format(targ_heading))
+        elif aiming:
+            # orders changed: drop the old target rather than fire at it later
+            aim.reset()
+            aiming = False
 
         if aiming:
-            print("My bearing is {}. Target at {}".format(my_heading,targ_heading))
-            if math.fabs(my_heading - targ_heading) < .1:
-                print("Firing {}".format(targ_heading))
+            # the table allows for target motion and shell travel time
+            if aim.fireDue(now) and (hittable is None or
+                    hittable.forTarget(my_pos[0], my_pos[1], aim.heading, target, targ_speed) >= MIN_HIT_PROBABILITY):
+                print("Firing {} (turret at {})".format(targ_heading, aim.heading))
                 GameServer.sendMessage(ServerMessageTypes.FIRE)
+                aim.reset()
                 aiming = False
-            else:
-                GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {"Amount": targ_heading})
-                print("turning to {}".format(targ_heading))
-        else:
+        elif not turning:
             #probably looking for something
             GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
+            turning = True
 
 class Tank(threading.Thread):
     def __init__(self, threadID, name,port):
         threading.Thread.__init__(self)
         self.threadID = threadID
         self.name = name
-        self.port = 25565# + port
-
-        def run(self):
-            print ("creating {} on port {}".format(self.name,self.port))
-            logic(self.name,self.port)
-
-# Create 4 Tanks, each on a separate thread, and give them the AI corresponding to the logic function
-threads = []
-
-for i in range(1,5):
-	threads.append(Tank(i, "lo-pressure:tank"+str(i),i))
-	print(threads[i-1].name)
-	threads[i-1].start()
-	print(threads[i-1].name + " started\n")
-
-for t in threads:
-	t.join() # threads should never terminate - get killed when game ends and manually closed
+        self.port = port
+
+    def run(self):
+        print ("creating {} on port {}".format(self.name,self.port))
+        logic(self.name,self.port)
+
+
+def main():
+	global args, coordinator, hittable
+	# Parse command line args
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
+	parser.add_argument('--hit-table', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hitprob.npy'), help='Hit probability table from hitprob.py')
+	args = parser.parse_args()
+
+	# Set up console logging
+	if args.debug:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
+	else:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+
+	# One coordinator shared by all four tanks assigns them targets; it pulls
+	# in numpy, so load it only once we are actually running
+	from coordinator import TeamCoordinator
+	coordinator = TeamCoordinator(["lo-pressure:tank"+str(i) for i in range(1,5)])
+	hittable = None
+	if args.hit_table and os.path.exists(args.hit_table):
+		from hitprob import loadTable
+		hittable = loadTable(args.hit_table)
+
+	# Create 4 Tanks, each on a separate thread, and give them the AI corresponding to the logic function
+	threads = []
+
+	for i in range(1,5):
+		threads.append(Tank(i, "lo-pressure:tank"+str(i),args.port))
+		print(threads[i-1].name)
+		threads[i-1].start()
+		print(threads[i-1].name + " started\n")
+
+	for t in threads:
+		t.join() # threads should never terminate - get killed when game ends and manually closed
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,317 @@
+#!/usr/bin/python
+
+'''
+Parameter tuner for the bots' hand-picked constants.
+
+Each candidate configuration is scored by playing simulated matches
+(lockstep.py) with the tuned bot against a fixed line-up of opponents.
+Matches are spread over a process pool. Every candidate plays the same
+seeds, so two candidates are always compared on the same starting
+positions. Per-seed scores are cached by parameter set, in memory and
+optionally in a JSON file, so a candidate that comes up again (a grid
+point, a surviving elite, a re-run) is never played twice on one seed.
+
+Search strategies:
+
+* grid   - every combination of `--steps` values per parameter
+* random - `--count` uniform samples
+* evolve - a (mu + lambda) evolutionary search: the best `--elite` of
+           each generation survive, and the rest of the population is
+           bred from them by crossover and gaussian mutation
+
+The defaults are always evaluated too. At the end the top `--finalists`
+play `--final-seeds` more matches on seeds the search never saw, and
+they are ranked, with a 95% confidence interval, on those matches alone.
+Counting the search seeds again would flatter whichever candidates
+happened to do well on them.
+
+	python bots/tuner.py big_bad_boy evolve --population 16 --generations 5 -w 8
+	python bots/tuner.py james1 grid --steps 6 -o big_bad_boy -o StarterBot
+'''
+
+import concurrent.futures
+import contextlib
+import statistics
+import argparse
+import logging
+import random
+import json
+import math
+import io
+import os
+
+log = logging.getLogger('tuner')
+
+
+class Parameter(object):
+	'''
+	A tunable constant: its range, its hand-picked value, and whether it
+	only takes whole numbers
+	'''
+
+	def __init__(self, low, high, default, integer=False):
+		self.low = low
+		self.high = high
+		self.default = default
+		self.integer = integer
+
+	def clip(self, value):
+		value = min(self.high, max(self.low, value))
+		return int(round(value)) if self.integer else round(value, 3)
+
+	def grid(self, steps):
+		if steps < 2:
+			return [self.default]
+		return sorted(set(self.clip(self.low + (self.high - self.low) * i / (steps - 1.0)) for i in range(steps)))
+
+	def sample(self, rng):
+		return self.clip(rng.uniform(self.low, self.high))
+
+	def mutate(self, value, rng, sigma):
+		return self.clip(value + rng.gauss(0.0, sigma * (self.high - self.low)))
+
+
+# bot: {module constant: Parameter}
+SPACES = {
+	'big_bad_boy': {
+		'ENGAGE_DISTANCE': Parameter(20, 90, 50, integer=True),
+		'STANDOFF_DISTANCE': Parameter(10, 80, 45, integer=True),
+		'GOAL_Y': Parameter(90, 110, 100, integer=True),
+		'UPDATE_GAP': Parameter(0.05, 0.3, 0.1),
+	},
+	'james1': {
+		'JITTER': Parameter(0.1, 2.0, 0.5),
+	},
+}
+
+# candidates that make no sense for a bot, e.g. stopping further away
+# than the range it starts closing in from
+CONSTRAINTS = {
+	'big_bad_boy': lambda p: p['STANDOFF_DISTANCE'] < p['ENGAGE_DISTANCE'],
+}
+
+# a tank's match score: banked points are what wins, kills not yet
+# banked are worth something, dying costs a little
+SCORE_WEIGHTS = {'banked': 1.0, 'points': 0.5, 'deaths': -0.25}
+
+# two-sided 95% Student t critical values for 1..30 degrees of freedom
+T95 = (12.71, 4.30, 3.18, 2.78, 2.57, 2.45, 2.36, 2.31, 2.26, 2.23,
+	2.20, 2.18, 2.16, 2.14, 2.13, 2.12, 2.11, 2.10, 2.09, 2.09,
+	2.08, 2.07, 2.07, 2.06, 2.06, 2.06, 2.05, 2.05, 2.05, 2.04)
+
+
+def defaults(bot):
+	return dict((name, p.default) for name, p in SPACES[bot].items())
+
+
+def valid(bot, params):
+	return CONSTRAINTS.get(bot, lambda p: True)(params)
+
+
+def score(row):
+	return sum(weight * row[key] for key, weight in SCORE_WEIGHTS.items())
+
+
+def interval(scores):
+	'''
+	(mean, low, high) of a 95% confidence interval on the mean
+	'''
+	mean = statistics.fmean(scores)
+	if len(scores) < 2:
+		return mean, float('-inf'), float('inf')
+	df = len(scores) - 1
+	t = T95[df - 1] if df <= len(T95) else 1.96
+	half = t * statistics.stdev(scores) / math.sqrt(len(scores))
+	return mean, mean - half, mean + half
+
+
+def playMatch(task):
+	'''
+	Score of the tuned tank in one simulated match; runs in a pool worker
+	'''
+	import lockstep
+
+	bot, params, opponents, seed, duration = task
+	line_up = [('Tuned:' + bot, lockstep.BOTS[bot](dict(params)))]
+	for i, opponent in enumerate(opponents):
+		line_up.append(('Opponent:{}{}'.format(opponent, i + 1), lockstep.BOTS[opponent]()))
+	# some bots print to stdout; keep it out of the tuner's report
+	with contextlib.redirect_stdout(io.StringIO()):
+		board = lockstep.runMatch(line_up, duration, seed=seed)
+	return score(board[0])
+
+
+class ResultCache(object):
+	'''
+	Per-seed scores keyed by (bot, parameters, opponents, match length)
+	'''
+
+	def __init__(self, path=None):
+		self.path = path
+		self.results = {}
+		if path is not None and os.path.exists(path):
+			with open(path) as f:
+				self.results = json.load(f)
+
+	def key(self, bot, params, opponents, duration):
+		return json.dumps([bot, sorted(params.items()), list(opponents), duration])
+
+	def scores(self, key):
+		return self.results.setdefault(key, {})
+
+	def add(self, key, seed, value):
+		self.results.setdefault(key, {})[str(seed)] = value
+
+	def save(self):
+		if self.path is None:
+			return
+		temp = self.path + '.tmp'
+		with open(temp, 'w') as f:
+			json.dump(self.results, f)
+		os.replace(temp, self.path)
+
+
+class Tuner(object):
+
+	def __init__(self, bot, opponents, seeds, duration=180.0, workers=None, cache=None, rng=None):
+		self.bot = bot
+		self.space = SPACES[bot]
+		self.opponents = list(opponents)
+		self.seeds = list(seeds)
+		self.duration = duration
+		self.workers = workers
+		self.cache = cache if cache is not None else ResultCache()
+		self.rng = rng if rng is not None else random.Random()
+		self.matches = 0
+
+	def evaluate(self, candidates, seeds=None):
+		'''
+		[(params, scores)] for each candidate, playing only the matches
+		the cache does not already have
+		'''
+		seeds = self.seeds if seeds is None else seeds
+		keys = [self.cache.key(self.bot, c, self.opponents, self.duration) for c in candidates]
+		tasks, owners, queued = [], [], set()
+		for candidate, key in zip(candidates, keys):
+			known = self.cache.scores(key)
+			for seed in seeds:
+				if str(seed) not in known and (key, seed) not in queued:
+					queued.add((key, seed))
+					tasks.append((self.bot, sorted(candidate.items()), self.opponents, seed, self.duration))
+					owners.append((key, seed))
+		if tasks:
+			with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+				for (key, seed), value in zip(owners, pool.map(playMatch, tasks)):
+					self.cache.add(key, seed, value)
+			self.matches += len(tasks)
+			self.cache.save()
+		return [(candidate, [self.cache.scores(key)[str(seed)] for seed in seeds])
+			for candidate, key in zip(candidates, keys)]
+
+	def draw(self, make, tries=100):
+		'''
+		A valid candidate from make(), or the defaults if none turns up
+		'''
+		for _ in range(tries):
+			candidate = make()
+			if valid(self.bot, candidate):
+				return candidate
+		return defaults(self.bot)
+
+	def grid(self, steps):
+		names = sorted(self.space)
+		candidates = [{}]
+		for name in names:
+			candidates = [dict(c, **{name: value}) for c in candidates for value in self.space[name].grid(steps)]
+		candidates = [c for c in candidates if valid(self.bot, c)]
+		return self.evaluate([defaults(self.bot)] + candidates)
+
+	def random(self, count):
+		sample = lambda: dict((name, p.sample(self.rng)) for name, p in self.space.items())
+		return self.evaluate([defaults(self.bot)] + [self.draw(sample) for _ in range(count)])
+
+	def evolve(self, population, generations, elite=4, sigma=0.15):
+		sample = lambda: dict((name, p.sample(self.rng)) for name, p in self.space.items())
+		candidates = [defaults(self.bot)] + [self.draw(sample) for _ in range(population - 1)]
+		seen = {}
+		for generation in range(generations):
+			results = self.evaluate(candidates)
+			for candidate, scores in results:
+				seen[json.dumps(sorted(candidate.items()))] = (candidate, scores)
+			ranked = sorted(seen.values(), key=lambda r: statistics.fmean(r[1]), reverse=True)
+			parents = [candidate for candidate, _ in ranked[:elite]]
+			log.info("Generation {}: best mean {:.2f} {}".format(
+				generation + 1, statistics.fmean(ranked[0][1]), parents[0]))
+
+			def breed():
+				a, b = self.rng.choice(parents), self.rng.choice(parents)
+				return dict((name, p.mutate(self.rng.choice((a[name], b[name])), self.rng, sigma))
+					for name, p in self.space.items())
+			candidates = parents + [self.draw(breed) for _ in range(population - len(parents))]
+		return list(seen.values())
+
+	def finish(self, results, finalists=3, finalSeeds=10):
+		'''
+		Replay the top candidates on held-out seeds and rank them by mean
+		score there; returns [(params, (mean, low, high), matches)]
+		'''
+		ranked = sorted(results, key=lambda r: statistics.fmean(r[1]), reverse=True)
+		top = [candidate for candidate, _ in ranked[:finalists]]
+		if defaults(self.bot) not in top:
+			top.append(defaults(self.bot))
+		start = max(self.seeds) + 1 if self.seeds else 0
+		final = self.evaluate(top, list(range(start, start + finalSeeds)))
+		report = [(candidate, interval(scores), len(scores)) for candidate, scores in final]
+		return sorted(report, key=lambda r: r[1][0], reverse=True)
+
+
+def printReport(bot, report):
+	names = sorted(SPACES[bot])
+	print(''.join('{:>18}'.format(name) for name in names) + '{:>9}{:>18}{:>9}'.format('mean', '95% CI', 'matches'))
+	for candidate, (mean, low, high), matches in report:
+		label = ' (defaults)' if candidate == defaults(bot) else ''
+		print(''.join('{:>18}'.format(candidate[name]) for name in names)
+			+ '{:9.2f}{:>18}{:9d}{}'.format(mean, '[{:.2f}, {:.2f}]'.format(low, high), matches, label))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('bot', choices=sorted(SPACES), help='Bot whose constants to tune')
+	parser.add_argument('search', choices=('grid', 'random', 'evolve'), help='Search strategy')
+	parser.add_argument('-o', '--opponent', action='append', help='Opponent bot (repeat for several; default two StarterBots)')
+	parser.add_argument('-s', '--seeds', default=8, type=int, help='Matches per candidate during the search')
+	parser.add_argument('-w', '--workers', type=int, help='Worker processes (default: one per CPU)')
+	parser.add_argument('--duration', default=180.0, type=float, help='Simulated match length in seconds')
+	parser.add_argument('--steps', default=3, type=int, help='Grid values per parameter')
+	parser.add_argument('--count', default=32, type=int, help='Random candidates')
+	parser.add_argument('--population', default=16, type=int, help='Evolutionary population size')
+	parser.add_argument('--generations', default=5, type=int, help='Evolutionary generations')
+	parser.add_argument('--elite', default=4, type=int, help='Survivors per generation')
+	parser.add_argument('--finalists', default=3, type=int, help='Top candidates replayed on extra seeds')
+	parser.add_argument('--final-seeds', default=16, type=int, help='Extra matches per finalist')
+	parser.add_argument('--cache', help='JSON file of per-seed scores to reuse and extend')
+	parser.add_argument('--output', help='Write the best configuration and its interval to this JSON file')
+	parser.add_argument('--rng-seed', type=int, help='Seed for the search itself')
+	parser.add_argument('-d', '--debug', action='store_true', help='Show the bots\' own logging')
+	args = parser.parse_args()
+
+	# the bots log every message they read; only show that when asked
+	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG if args.debug else logging.WARNING)
+	log.setLevel(logging.INFO)
+
+	tuner = Tuner(args.bot, args.opponent or ['StarterBot', 'StarterBot'], range(args.seeds), args.duration,
+		args.workers, ResultCache(args.cache), random.Random(args.rng_seed))
+	if args.search == 'grid':
+		results = tuner.grid(args.steps)
+	elif args.search == 'random':
+		results = tuner.random(args.count)
+	else:
+		results = tuner.evolve(args.population, args.generations, args.elite)
+	report = tuner.finish(results, args.finalists, args.final_seeds)
+
+	printReport(args.bot, report)
+	print('{} matches played, {} candidates searched'.format(tuner.matches, len(results)))
+	if args.output:
+		best, (mean, low, high), matches = report[0]
+		with open(args.output, 'w') as f:
+			json.dump({'bot': args.bot, 'params': best, 'mean': mean, 'ci95': [low, high], 'matches': matches}, f, indent=2)
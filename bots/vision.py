@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+'''
+Field-of-view model for searching.
+
+VisionGrid divides the arena into square cells and remembers when each was
+last inside our turret's view cone. Every OBJECTUPDATE of our own tank
+stamps the cells currently in view, so the grid is maintained incrementally
+and staleness simply grows with time. bestSweep picks the heading whose cone
+would uncover the stalest part of the arena.
+
+Cone cell sets depend only on (tank cell, heading bucket), so they are
+computed once and kept in a bounded LRU cache.
+'''
+
+import collections
+
+import numpy as np
+
+from aiming import bearing, wrapAngle
+
+
+class VisionGrid(object):
+	'''
+	Decaying "last seen" grid over the arena.
+
+	Arena and view cone sizes are approximations of the MSTanks defaults
+	and can be overridden.
+	'''
+
+	def __init__(self, width=140.0, height=200.0, cellSize=5.0, fovDegrees=60.0,
+			viewRange=120.0, headingStep=10.0, cacheSize=4096):
+		self.width = width
+		self.height = height
+		self.cellSize = cellSize
+		self.fovDegrees = fovDegrees
+		self.viewRange = viewRange
+		self.headingStep = headingStep
+		self.cacheSize = cacheSize
+
+		self.cols = int(np.ceil(width / cellSize))
+		self.rows = int(np.ceil(height / cellSize))
+		# cell centres in arena coordinates, origin at the middle of the arena
+		xs = (np.arange(self.cols) + 0.5) * cellSize - width / 2.0
+		ys = (np.arange(self.rows) + 0.5) * cellSize - height / 2.0
+		self.cellX, self.cellY = [a.ravel() for a in np.meshgrid(xs, ys)]
+		self.lastSeen = np.full(self.rows * self.cols, -np.inf)
+		self.cones = collections.OrderedDict()
+
+	def cellOf(self, x, y):
+		col = min(self.cols - 1, max(0, int((x + self.width / 2.0) // self.cellSize)))
+		row = min(self.rows - 1, max(0, int((y + self.height / 2.0) // self.cellSize)))
+		return col, row
+
+	def bucketOf(self, heading):
+		return int(round((heading % 360.0) / self.headingStep)) % int(round(360.0 / self.headingStep))
+
+	def coneCells(self, x, y, heading):
+		'''
+		Flat indices of the cells inside the view cone
+		'''
+		col, row = self.cellOf(x, y)
+		bucket = self.bucketOf(heading)
+		key = (col, row, bucket)
+		cells = self.cones.get(key)
+		if cells is not None:
+			self.cones.move_to_end(key)
+			return cells
+
+		originX = (col + 0.5) * self.cellSize - self.width / 2.0
+		originY = (row + 0.5) * self.cellSize - self.height / 2.0
+		dx = self.cellX - originX
+		dy = self.cellY - originY
+		offset = wrapAngle(bearing(originX, originY, self.cellX, self.cellY) - bucket * self.headingStep)
+		inView = (np.hypot(dx, dy) <= self.viewRange) & (np.abs(offset) <= self.fovDegrees / 2.0)
+		inView[row * self.cols + col] = True
+		cells = np.flatnonzero(inView)
+
+		self.cones[key] = cells
+		if len(self.cones) > self.cacheSize:
+			self.cones.popitem(last=False)
+		return cells
+
+	def observe(self, x, y, turretHeading, now):
+		'''
+		Mark everything in the current view cone as seen at `now`
+		'''
+		self.lastSeen[self.coneCells(x, y, turretHeading)] = now
+
+	def staleness(self, now, cap=None):
+		'''
+		Seconds since each cell was last seen, as a (rows, cols) array
+		'''
+		age = now - self.lastSeen
+		if cap is not None:
+			age = np.minimum(age, cap)
+		return age.reshape(self.rows, self.cols)
+
+	def bestSweep(self, x, y, now, cap=30.0):
+		'''
+		Heading whose view cone from (x, y) covers the most staleness.
+		Never-seen cells count as `cap` seconds old.
+		'''
+		age = np.minimum(now - self.lastSeen, cap)
+		best, bestScore = 0.0, -1.0
+		for bucket in range(int(round(360.0 / self.headingStep))):
+			heading = bucket * self.headingStep
+			score = age[self.coneCells(x, y, heading)].sum()
+			if score > bestScore:
+				best, bestScore = heading, score
+		return best
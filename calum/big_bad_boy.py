@@ -1,310 +1,167 @@
 #!/usr/bin/python
 
-import json
-import socket
+import importlib
 import logging
-import binascii
-import struct
 import argparse
-import random
-import numpy as np
 import time
+import sys
+import os
+
+# shared modules live alongside the other bots
+BOTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+if BOTS_DIR not in sys.path:
+	sys.path.insert(0, BOTS_DIR)
+from servercomms import ServerMessageTypes, ServerComms
+from records import RecordPool, configureGC, restoreGC, GC_MODES
+from kinematics import KinematicsProfiler
+from pickups import PickupModel
+from gameclock import GameClock
+from profiling import makeProfiler
+from hotreload import Reloader
+
+# strategy code lives in its own module so it can be reloaded mid-match
+import big_bad_boy_strategy as strategy
 
 ##logging.basicConfig(filename='example.log',level=logging.DEBUG)
 
-class ServerMessageTypes(object):
-	TEST = 0
-	CREATETANK = 1
-	DESPAWNTANK = 2
-	FIRE = 3
-	TOGGLEFORWARD = 4
-	TOGGLEREVERSE = 5
-	TOGGLELEFT = 6
-	TOGGLERIGHT = 7
-	TOGGLETURRETLEFT = 8
-	TOGGLETURRETRIGHT = 9
-	TURNTURRETTOHEADING = 10
-	TURNTOHEADING = 11
-	MOVEFORWARDDISTANCE = 12
-	MOVEBACKWARSDISTANCE = 13
-	STOPALL = 14
-	STOPTURN = 15
-	STOPMOVE = 16
-	STOPTURRET = 17
-	OBJECTUPDATE = 18
-	HEALTHPICKUP = 19
-	AMMOPICKUP = 20
-	SNITCHPICKUP = 21
-	DESTROYED = 22
-	ENTEREDGOAL = 23
-	KILL = 24
-	SNITCHAPPEARED = 25
-	GAMETIMEUPDATE = 26
-	HITDETECTED = 27
-	SUCCESSFULLHIT = 28
-    
-	strings = {
-		TEST: "TEST",
-		CREATETANK: "CREATETANK",
-		DESPAWNTANK: "DESPAWNTANK",
-		FIRE: "FIRE",
-		TOGGLEFORWARD: "TOGGLEFORWARD",
-		TOGGLEREVERSE: "TOGGLEREVERSE",
-		TOGGLELEFT: "TOGGLELEFT",
-		TOGGLERIGHT: "TOGGLERIGHT",
-		TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-		TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
-		TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
-		TURNTOHEADING: "TURNTOHEADING",
-		MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
-		MOVEBACKWARSDISTANCE: "MOVEBACKWARDSDISTANCE",
-		STOPALL: "STOPALL",
-		STOPTURN: "STOPTURN",
-		STOPMOVE: "STOPMOVE",
-		STOPTURRET: "STOPTURRET",
-		OBJECTUPDATE: "OBJECTUPDATE",
-		HEALTHPICKUP: "HEALTHPICKUP",
-		AMMOPICKUP: "AMMOPICKUP",
-		SNITCHPICKUP: "SNITCHPICKUP",
-		DESTROYED: "DESTROYED",
-		ENTEREDGOAL: "ENTEREDGOAL",
-		KILL: "KILL",
-		SNITCHAPPEARED: "SNITCHAPPEARED",
-		GAMETIMEUPDATE: "GAMETIMEUPDATE",
-		HITDETECTED: "HITDETECTED",
-		SUCCESSFULLHIT: "SUCCESSFULLHIT"
-	}
-    
-	def toString(self, id):
-		if id in self.strings.keys():
-			return self.strings[id]
-		else:
-			return "??UNKNOWN??"
+# how often to hand learned state to a supervisor, in seconds
+SNAPSHOT_INTERVAL = 5.0
+# learned models that outlive the process when run under a supervisor
+LEARNED_MODELS = ('kinematics', 'occupancy', 'pickups', 'shots')
+# what the strategy module gets to see of the runtime
+RUNTIME_NAMES = ('GameServer', 'args', 'capture', 'clock', 'hittable', 'kinematics', 'occupancy',
+	'pickups', 'planner', 'records', 'shots', 'vision')
 
 
-class ServerComms(object):
+def preload():
 	'''
-	TCP comms handler
-	
-	Server protocol is simple:
-	
-	* 1st byte is the message type - see ServerMessageTypes
-	* 2nd byte is the length in bytes of the payload (so max 255 byte payload)
-	* 3rd byte onwards is the payload encoded in JSON
+	Import the numpy-backed models up front, for a supervisor that forks
+	workers after import
 	'''
-	ServerSocket = None
-	MessageTypes = ServerMessageTypes()
-	
-	
-	def __init__(self, hostname, port):
-		self.ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		self.ServerSocket.connect((hostname, port))
+	for module in ('vision', 'occupancy', 'shots'):
+		importlib.import_module(module)
 
-	def readTolength(self, length):
-		messageData = self.ServerSocket.recv(length)
-		while len(messageData) < length:
-			buffData = self.ServerSocket.recv(length - len(messageData))
-			if buffData:
-				messageData += buffData
-		return messageData
 
-	def readMessage(self):
-		'''
-		Read a message from the server
-		'''
-		messageTypeRaw = self.ServerSocket.recv(1)
-		messageLenRaw = self.ServerSocket.recv(1)
-		messageType = struct.unpack('>B', messageTypeRaw)[0]
-		messageLen = struct.unpack('>B', messageLenRaw)[0]
-		
-		if messageLen == 0:
-			messageData = bytearray()
-			messagePayload = {'messageType': messageType}
-		else:
-			messageData = self.readTolength(messageLen)
-			logging.debug("*** {}".format(messageData))
-			messagePayload = json.loads(messageData.decode('utf-8'))
-			messagePayload['messageType'] = messageType
-			
-		logging.debug('Turned message {} into type {} payload {}'.format(
-			binascii.hexlify(messageData),
-			self.MessageTypes.toString(messageType),
-			messagePayload))
+def snapshot():
+	return dict((model, globals()[model]) for model in LEARNED_MODELS)
 
-		return messagePayload
-		
-	def sendMessage(self, messageType=None, messagePayload=None):
-		'''
-		Send a message to the server
-		'''
-		message = bytearray()
-		
-		if messageType is not None:
-			message.append(messageType)
-		else:
-			message.append(0)
-		
-		if messagePayload is not None:
-			messageString = json.dumps(messagePayload)
-			message.append(len(messageString))
-			message.extend(str.encode(messageString))
-			    
-		else:
-			message.append(0)
-		
-		logging.debug('Turned message type {} payload {} into {}'.format(
-			self.MessageTypes.toString(messageType),
-			messagePayload,
-			binascii.hexlify(message)))
-		return self.ServerSocket.send(message)
 
-def getheading(pos1, pos2):
-	heading = np.arctan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
-	heading = np.degrees(heading)
-	heading = (-heading)%360
-	return np.abs(heading)
+def restore(state):
+	for model in LEARNED_MODELS:
+		if model in state:
+			globals()[model] = state[model]
 
-def distance(pos1, pos2):
- 	return np.sqrt((pos2[1] - pos1[1])**2 + (pos2[0] - pos1[0])**2)
 
-def moveTo(newpos,tank_dict):
-	# get current position from tank_dict
-	curpos = (tank_dict['X'],tank_dict['Y'])
+def bindStrategy():
+	for name in RUNTIME_NAMES:
+		setattr(strategy, name, globals()[name])
 
-	# get direction, turn to face,
-	h = getheading(curpos, newpos)
-	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': h})
 
-	# then move forward
-	d = distance(curpos, newpos)
-	GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': d})
-	return
-
-
-def update(tank_dict):
-	while True:
-		start_time = time.time()
-		message = GameServer.readMessage()
-		end_time = time.time()
-	
-		if message['messageType'] == 18:
-			if message['Type'] == 'Tank':
-				if message['Name'] == args.name:
-					message['time'] = time.time()
-					message['pos'] = (message['X'], message['Y'])
-					tank_dict['my_tank']= message
-
-					tank_dict['ammo'] = message['Ammo']
-					if tank_dict['ammo'] == 0:
-						tank_dict['state'] = 'pickingupammo'
-						
-					tank_dict['health'] = message['Health']
-					if tank_dict['health'] == 1:
-						tank_dict['state'] = 'pickinguphealth'
-
-				else:
-					if tank_dict['state'] == 'searching':
-						tank_dict['state'] = 'targeting'
-					message['time'] = time.time()
-					message['pos'] = (message['X'], message['Y'])
-					tank_dict['target_tank']= message
-					GameServer.sendMessage(ServerMessageTypes.STOPTURN)
-
-			elif message['Type'] == 'HealthPickup':
-				tank_dict
-			elif message['Type'] == 'AmmoPickup':
-				tank_dict['ammo'] = message['']
-
-		elif message['messageType'] == 24:
-			tank_dict['state'] = 'banking'
-                        
-
-		logging.info(end_time - start_time)
-		if (end_time - start_time) > 0.1:
-			break
-
-	return tank_dict
-              
-        
-
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
-args = parser.parse_args()
-
-# Set up console logging
-if args.debug:
-        logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
-
-
-# Connect to game server
-GameServer = ServerComms(args.hostname, args.port)
-
-# Spawn our tank
-
-logging.info("Creating tank with name '{}'".format(args.name))
-GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
-
-
-
-
-tank_dict = {}
-tank_dict['state'] = 'searching' 
-
-while True:
-	tank_dict = update(tank_dict)
-	if tank_dict['state'] == 'searching':
-		GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)				
-
-	
-	elif tank_dict['state'] == 'targeting':
-		heading = getheading(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
-		distance_to_target = distance(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
-		GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
-		time.sleep(2)
-		if distance_to_target >= 50:
-			logging.info("{} meters from target".format(distance_to_target))
-			GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': distance_to_target - 45})
-			time.sleep(1)
-		else:
-			GameServer.sendMessage(ServerMessageTypes.FIRE)
-		tank_dict['state'] = 'searching'
-
-		
-
-	elif tank_dict['state'] == 'banking':
-		heading = getheading(tank_dict['my_tank']['pos'], (0, -100))
-		GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
-		GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+def main(argv=None, serverSocket=None, state=None, publish=None, comms=None):
+	'''
+	Run the bot. A supervisor passes an already connected serverSocket,
+	the learned state of the tank's previous process, and a publish
+	callback that receives fresh snapshots. A simulator passes its own
+	comms (see bots/lockstep.py) in place of a server connection.
+	'''
+	global GameServer, args, capture, clock, hittable, kinematics, occupancy, pickups, planner, records, shots, vision
+	# Parse command line args
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
+	parser.add_argument('-c', '--capture', help='Record OBJECTUPDATEs to this telemetry capture')
+	parser.add_argument('-g', '--gc', default='default', choices=GC_MODES, help='Cyclic GC mode during the match')
+	parser.add_argument('--profile', metavar='PATH', help='Profile the main loop, writing PATH.folded and PATH.prof at exit')
+	parser.add_argument('--profile-every', default=100, type=int, metavar='N', help='Run every Nth tick under cProfile when profiling')
+	parser.add_argument('-w', '--watch', action='store_true', help='Reload the strategy when its file changes (SIGHUP always reloads)')
+	parser.add_argument('-P', '--plan', action='store_true', help='Choose actions with the rollout planner instead of the state rules')
+	parser.add_argument('--plan-budget', default=0.15, type=float, metavar='SECONDS', help='Planning time allowed per tick')
+	parser.add_argument('--hit-table', default=os.path.join(BOTS_DIR, 'hitprob.npy'), metavar='PATH', help='Hit probability table from bots/hitprob.py (empty to fall back on shot history)')
+	args = parser.parse_args(argv)
+
+	# Set up console logging
+	if args.debug:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
+	else:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+
+
+	capture = None
+	if args.capture:
+		from telemetry import TelemetryWriter
+		capture = TelemetryWriter(args.capture)
+
+	# Connect to game server
+	clock = GameClock()
+	if comms is None:
+		GameServer = ServerComms(args.hostname, args.port, serverSocket=serverSocket, clock=clock)
+	else:
+		GameServer = comms
+		GameServer.clock = clock
+
+	# Spawn our tank
+
+	logging.info("Creating tank with name '{}'".format(args.name))
+	GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+
+	# the grid models need numpy, so load them while the server spawns our tank
+	from vision import VisionGrid
+	from occupancy import OccupancyMap
+	from shots import ShotTracker
+
+	records = RecordPool()
+	vision = VisionGrid()
+	kinematics = KinematicsProfiler()
+	occupancy = OccupancyMap([args.name])
+	pickups = PickupModel()
+	shots = ShotTracker()
+	# fire decisions use the precomputed table when one has been built
+	hittable = None
+	if args.hit_table and os.path.exists(args.hit_table):
+		from hitprob import loadTable
+		hittable = loadTable(args.hit_table)
+	planner = None
+	if args.plan:
+		from planner import RolloutPlanner
+		planner = RolloutPlanner(budget=args.plan_budget)
+	if state is not None:
+		restore(state)
+	bindStrategy()
+
+	tank_dict = {}
+	tank_dict['state'] = 'searching' 
+
+	# with profiling off these are the plain functions and methods
+	profiler = makeProfiler(args.profile, args.profile_every)
+	profiler.instrument(GameServer, 'readRecord', 'decode')
+	profiler.instrument(GameServer, 'readMessage', 'decode')
+	profiler.instrument(GameServer, 'sendMessage', 'encode')
+	reloader = Reloader(strategy, watch=args.watch, onReload=bindStrategy)
+
+	next_snapshot = time.time() + SNAPSHOT_INTERVAL
+	step = None
+	previousGC = configureGC(args.gc)
+	try:
 		while True:
-			heading = getheading(tank_dict['my_tank']['pos'], (0, -100))
-			GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': tank_dict['my_tank']['heading']})
-			message = GameServer.readMessage()
-			if message['messageType'] == 23:
-				tank_dict['state'] = 'searching'
-				GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
-				break
-			elif message['messageType'] == 18 and message['Type'] == 'Tank' and message['Name'] == args.name:
-				tank_dict['my_tank']['pos'] = (message['X'],message['Y'])
-				tank_dict['my_tank']['heading'] = message['Heading']
-
-	elif state == 'pickinguphealth':
-		message = GameServer.readMessage()
-		if message['messageType'] == 18 and message['Type'] == 'HealthPickup': # TODO add health location to tank_dict whenever we see it
-			healthpos = (message['X'], message['Y'])
-			moveTo(healthpos, tank_dict)
-	
-	elif state == 'pickingupammo':
-		message = GameServer.readMessage()
-		if message['messageType'] == 18 and message['Type'] == 'AmmoPickup':
-			ammopos = (message['X'], message['Y'])
-			moveTo(ammopos, tank_dict)
-		
-
-
-
+			profiler.tick()
+			# only swap strategy code between ticks, never inside a handler
+			if reloader.check() or step is None:
+				step = profiler.timed('update', strategy.update)
+				handlers = dict((s, profiler.timed(s, handler if planner is None else strategy.plan))
+					for s, handler in strategy.STATE_HANDLERS.items())
+			tank_dict = step(tank_dict)
+			handlers[tank_dict['state']](tank_dict)
+			if publish is not None and time.time() >= next_snapshot:
+				publish(snapshot())
+				next_snapshot = time.time() + SNAPSHOT_INTERVAL
+	finally:
+		# the match usually ends with SIGINT or a dropped connection
+		if capture is not None:
+			capture.close()
+		restoreGC(previousGC)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+
+'''
+big_bad_boy's strategy: the per-message update and one handler per state.
+
+This module holds no state of its own. big_bad_boy.py owns the server
+connection, the clock and the learned models, and binds them into this
+module's namespace (GameServer, args, clock, records, capture, vision,
+kinematics, occupancy, pickups, shots, planner, hittable) before the
+first tick and after every reload. The module can therefore be reloaded
+mid-match (on SIGHUP or, with --watch, when this file changes) without
+dropping the connection or anything the tank has learned.
+'''
+
+import logging
+import math
+import time
+
+from servercomms import ServerMessageTypes
+from aiming import wrapAngle
+
+# the runtime, bound by big_bad_boy.bindStrategy(); None until then
+GameServer = args = capture = clock = hittable = kinematics = None
+occupancy = pickups = planner = records = shots = vision = None
+
+ENDGAME_SECONDS = 30
+# skip shots less likely than this to hit, by the hit table if there is one,
+# otherwise by past hit rate at this range and angle error
+MIN_HIT_PROBABILITY = 0.25
+# close in on targets further away than this, stopping this far short
+ENGAGE_DISTANCE = 50
+STANDOFF_DISTANCE = 45
+# update() returns once the server has gone quiet for this long
+UPDATE_GAP = 0.1
+# bank at the goal centred on (0, -GOAL_Y)
+GOAL_Y = 100
+# enemies last seen longer ago than this are left out of planning
+PLAN_MEMORY = 2.0
+
+def getheading(pos1, pos2):
+	heading = math.atan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
+	heading = math.degrees(heading)
+	heading = (-heading)%360
+	return abs(heading)
+
+def distance(pos1, pos2):
+ 	return math.hypot(pos2[0] - pos1[0], pos2[1] - pos1[1])
+
+def moveTo(newpos,tank_dict):
+	# get current position from tank_dict
+	curpos = (tank_dict['X'],tank_dict['Y'])
+
+	# get direction, turn to face,
+	h = getheading(curpos, newpos)
+	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': h})
+
+	# then move forward
+	d = distance(curpos, newpos)
+	GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': d})
+	return
+
+
+def update(tank_dict):
+	while True:
+		start_time = time.time()
+		# OBJECTUPDATEs come back as pooled records; keep the latest one
+		# per role and hand everything else straight back to the pool
+		message = GameServer.readRecord(records)
+		end_time = time.time()
+		kept = None
+		# models run on match time: records carry their own stamp
+		match_time = message['time'] if message['messageType'] == 18 else clock.now()
+
+		if message['messageType'] == 18 and capture is not None:
+			capture.record(message, end_time)
+		if message['messageType'] == 18:
+			occupancy.observe(message, match_time)
+	
+		if message['messageType'] == 18:
+			if message['Type'] == 'Tank':
+				if message['Name'] == args.name:
+					kept = 'my_tank'
+					vision.observe(message['X'], message['Y'], message['TurretHeading'], message['time'])
+					kinematics.observe(message, message['time'])
+
+					# not worth fetching pickups in the last few seconds of a match
+					remaining = clock.remaining()
+					endgame = remaining is not None and remaining < ENDGAME_SECONDS
+
+					tank_dict['ammo'] = message['Ammo']
+					if tank_dict['ammo'] == 0 and not endgame:
+						tank_dict['state'] = 'pickingupammo'
+						
+					tank_dict['health'] = message['Health']
+					if tank_dict['health'] == 1 and not endgame:
+						tank_dict['state'] = 'pickinguphealth'
+
+				else:
+					if tank_dict['state'] == 'searching':
+						tank_dict['state'] = 'targeting'
+					kept = 'target_tank'
+					GameServer.sendMessage(ServerMessageTypes.STOPTURN)
+
+			elif message['Type'] in ('HealthPickup', 'AmmoPickup'):
+				pickups.observe(message, match_time)
+
+		if message['messageType'] in (22, 24, 27, 28):
+			shots.event(message['messageType'], match_time)
+
+		# kills not yet banked, for the planner
+		if message['messageType'] == 24:
+			tank_dict['points'] = tank_dict.get('points', 0) + 1
+		elif message['messageType'] in (22, 23):
+			tank_dict['points'] = 0
+
+		if message['messageType'] == 24:
+			tank_dict['state'] = 'banking'
+			if 'target_tank' in tank_dict:
+				occupancy.recordDeath(tank_dict['target_tank']['X'], tank_dict['target_tank']['Y'], match_time)
+
+		elif message['messageType'] == 22 and 'my_tank' in tank_dict:
+			occupancy.recordDeath(tank_dict['my_tank']['X'], tank_dict['my_tank']['Y'], match_time)
+
+		elif message['messageType'] in (19, 20) and 'my_tank' in tank_dict:
+			# we just collected a pickup, so its spawn point is now empty
+			kind = 'HealthPickup' if message['messageType'] == 19 else 'AmmoPickup'
+			pickups.collected(kind, tank_dict['my_tank']['X'], tank_dict['my_tank']['Y'], match_time)
+			if tank_dict['state'] in ('pickinguphealth', 'pickingupammo'):
+				tank_dict['state'] = 'searching'
+				tank_dict.pop('pickup_goal', None)
+
+		if message['messageType'] == 18:
+			if kept is None:
+				records.release(message)
+			else:
+				if kept in tank_dict:
+					previous = tank_dict[kept]
+					# how fast the target is moving, for the hit table
+					if kept == 'target_tank' and previous['Name'] == message['Name'] and message['time'] > previous['time']:
+						tank_dict['target_speed'] = distance(previous['pos'], message['pos']) / (message['time'] - previous['time'])
+					records.release(previous)
+				tank_dict[kept] = message
+                        
+
+		logging.info(end_time - start_time)
+		if (end_time - start_time) > UPDATE_GAP:
+			break
+
+	return tank_dict
+              
+        
+
+def search(tank_dict):
+	if 'my_tank' in tank_dict:
+		# look towards whatever part of the arena we have seen least recently
+		sweep = vision.bestSweep(tank_dict['my_tank']['X'], tank_dict['my_tank']['Y'], clock.now())
+		if sweep != tank_dict.get('sweep_heading'):
+			tank_dict['sweep_heading'] = sweep
+			# the sweep is for the turret, which is what sees; we turn the
+			# hull, so allow for the turret being off the hull's heading
+			offset = wrapAngle(tank_dict['my_tank']['TurretHeading'] - tank_dict['my_tank']['Heading'])
+			GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': (sweep - offset) % 360})
+	else:
+		GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
+
+
+def target(tank_dict):
+	heading = getheading(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
+	distance_to_target = distance(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
+	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
+	# wait as long as the turn should take at our measured turn rate
+	turn = abs(wrapAngle(heading - tank_dict['my_tank']['Heading']))
+	turn_time = kinematics.turnTime(tank_dict['my_tank']['Heading'], heading, default=2, maximum=2)
+	time.sleep(turn_time)
+	if distance_to_target >= ENGAGE_DISTANCE:
+		logging.info("{} meters from target".format(distance_to_target))
+		GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': distance_to_target - STANDOFF_DISTANCE})
+		time.sleep(kinematics.moveTime(distance_to_target - STANDOFF_DISTANCE, default=1, maximum=1))
+	else:
+		# how far the turn is still short of the target after the wait
+		angle_error = max(0.0, turn - kinematics.hullTurnRate.mean * turn_time)
+		if hittable is not None:
+			# the hull is still short of the target on the side it is turning towards
+			aim_error = math.copysign(angle_error, wrapAngle(heading - tank_dict['my_tank']['Heading']))
+			fire = hittable.lookup(distance_to_target, aim_error, tank_dict.get('target_speed', 0.0),
+				tank_dict['target_tank']['Heading'] - heading) >= MIN_HIT_PROBABILITY
+		else:
+			fire = shots.shouldFire(distance_to_target, angle_error, clock.now(), minProbability=MIN_HIT_PROBABILITY)
+		if fire:
+			GameServer.sendMessage(ServerMessageTypes.FIRE)
+			shots.fired(clock.now(), distance_to_target, angle_error)
+		else:
+			logging.info("Holding fire: shots like this hit {:.0%}".format(
+				shots.hitProbability(distance_to_target, angle_error)[0]))
+	tank_dict['state'] = 'searching'
+
+
+def bank(tank_dict):
+	heading = getheading(tank_dict['my_tank']['pos'], (0, -GOAL_Y))
+	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
+	GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+	while True:
+		heading = getheading(tank_dict['my_tank']['pos'], (0, -GOAL_Y))
+		GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': tank_dict['my_tank']['Heading']})
+		message = GameServer.readMessage()
+		if message['messageType'] == 23:
+			tank_dict['state'] = 'searching'
+			GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+			break
+		elif message['messageType'] == 18 and message['Type'] == 'Tank' and message['Name'] == args.name:
+			tank_dict['my_tank']['pos'] = (message['X'],message['Y'])
+			tank_dict['my_tank']['Heading'] = message['Heading']
+
+
+def pickUp(tank_dict):
+	kind = 'HealthPickup' if tank_dict['state'] == 'pickinguphealth' else 'AmmoPickup'
+	me = tank_dict['my_tank']
+	# head for the spawn point we can stand on soonest, allowing for respawn time
+	goal = pickups.nextSpawn(kind, me['X'], me['Y'], clock.now(), kinematics.speed.mean or 5.0)
+	if goal is None:
+		GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
+	elif goal[:2] != tank_dict.get('pickup_goal'):
+		tank_dict['pickup_goal'] = goal[:2]
+		moveTo(goal[:2], me)
+
+
+def plan(tank_dict):
+	'''
+	Let the rollout planner pick this tick's commands, in place of the
+	state rules
+	'''
+	if 'my_tank' not in tank_dict:
+		search(tank_dict)
+		return
+	me = tank_dict['my_tank']
+	now = clock.now()
+	enemies = []
+	if 'target_tank' in tank_dict and now - tank_dict['target_tank']['time'] <= PLAN_MEMORY:
+		enemies.append(tank_dict['target_tank'])
+	known = [(point.x, point.y, kind, pickups.availableAt(point, now) - now)
+		for kind, points in pickups.points.items() for point in points]
+	label, commands, _ = planner.plan(me, enemies, known, tank_dict.get('points', 0))
+	logging.debug("Planned {}".format(label))
+	for messageType, amount in commands:
+		GameServer.sendMessage(messageType, None if amount is None else {'Amount': amount})
+		if messageType == ServerMessageTypes.FIRE and enemies:
+			bearing = getheading(me['pos'], enemies[0]['pos'])
+			turret = commands[0][1] if commands[0][0] == ServerMessageTypes.TURNTURRETTOHEADING else me['TurretHeading']
+			shots.fired(now, distance(me['pos'], enemies[0]['pos']), abs(wrapAngle(bearing - turret)))
+
+
+STATE_HANDLERS = {
+	'searching': search,
+	'targeting': target,
+	'banking': bank,
+	'pickinguphealth': pickUp,
+	'pickingupammo': pickUp,
+}
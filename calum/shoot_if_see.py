@@ -7,7 +7,7 @@ import binascii
 import struct
 import argparse
 import random
-import numpy as np
+import math
 import time
 
 ##logging.basicConfig(filename='example.log',level=logging.DEBUG)
@@ -53,7 +53,7 @@ class ServerMessageTypes(object):
 		TOGGLELEFT: "TOGGLELEFT",
 		TOGGLERIGHT: "TOGGLERIGHT",
 		TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-		TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+		TOGGLETURRETRIGHT: "TOGGLETURRETRIGHT",
 		TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
 		TURNTOHEADING: "TURNTOHEADING",
 		MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
@@ -101,19 +101,21 @@ class ServerComms(object):
 		self.ServerSocket.connect((hostname, port))
 
 	def readTolength(self, length):
-		messageData = self.ServerSocket.recv(length)
+		messageData = b''
 		while len(messageData) < length:
 			buffData = self.ServerSocket.recv(length - len(messageData))
-			if buffData:
-				messageData += buffData
+			if not buffData:
+				# recv only returns nothing once the server has gone away
+				raise socket.error('server closed the connection')
+			messageData += buffData
 		return messageData
 
 	def readMessage(self):
 		'''
 		Read a message from the server
 		'''
-		messageTypeRaw = self.ServerSocket.recv(1)
-		messageLenRaw = self.ServerSocket.recv(1)
+		messageTypeRaw = self.readTolength(1)
+		messageLenRaw = self.readTolength(1)
 		messageType = struct.unpack('>B', messageTypeRaw)[0]
 		messageLen = struct.unpack('>B', messageLenRaw)[0]
 		
@@ -161,13 +163,13 @@ class ServerComms(object):
 ## HELPER FUNCTIONS
 
 def getheading(pos1, pos2):
-	heading = np.arctan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
-	heading = np.degrees(heading)
+	heading = math.atan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
+	heading = math.degrees(heading)
 	heading = (-heading)%360
-	return np.abs(heading)
+	return abs(heading)
 
 def distance(pos1, pos2):
- 	return np.sqrt((pos2[1] - pos1[1])**2 + (pos2[0] - pos1[0])**2)
+ 	return math.hypot(pos2[0] - pos1[0], pos2[1] - pos1[1])
 
 
 
@@ -210,70 +212,74 @@ def update(tank_dict):
               
         
 
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='Lo-pressure:Shoot_if_see', help='Name of bot')
-args = parser.parse_args()
 
-# Set up console logging
-if args.debug:
-        logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
 
+def main():
+	global GameServer, args
+	# Parse command line args
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', default='Lo-pressure:Shoot_if_see', help='Name of bot')
+	args = parser.parse_args()
 
-# Connect to game server
-GameServer = ServerComms(args.hostname, args.port)
+	# Set up console logging
+	if args.debug:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
+	else:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
 
-# Spawn our tank
 
-logging.info("Creating tank with name '{}'".format(args.name))
-GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+	# Connect to game server
+	GameServer = ServerComms(args.hostname, args.port)
 
+	# Spawn our tank
 
+	logging.info("Creating tank with name '{}'".format(args.name))
+	GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
 
 
-tank_dict = {}
-tank_dict['state'] = 'searching' 
 
-while True:
-	tank_dict = update(tank_dict)
-	if tank_dict['state'] == 'searching':
-		GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)				
 
-	elif tank_dict['state'] == 'targeting':
-		heading = getheading(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
-		distance_to_target = distance(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
-		GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
-		time.sleep(2)
-		if distance_to_target >= 50:
-			logging.info("{} meters from target".format(distance_to_target))
-			GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': distance_to_target - 45})
-			time.sleep(1)
+	tank_dict = {}
+	tank_dict['state'] = 'searching' 
 
-		else:
-			GameServer.sendMessage(ServerMessageTypes.FIRE)
-		tank_dict['state'] = 'searching'
-
-	elif tank_dict['state'] == 'banking':
-		heading = getheading(tank_dict['my_tank']['pos'], (0, -100))
-		GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
-		GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
-		while True:
+	while True:
+		tank_dict = update(tank_dict)
+		if tank_dict['state'] == 'searching':
+			GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)				
+
+		elif tank_dict['state'] == 'targeting':
+			heading = getheading(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
+			distance_to_target = distance(tank_dict['my_tank']['pos'], tank_dict['target_tank']['pos'])
+			GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
+			time.sleep(2)
+			if distance_to_target >= 50:
+				logging.info("{} meters from target".format(distance_to_target))
+				GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': distance_to_target - 45})
+				time.sleep(1)
+
+			else:
+				GameServer.sendMessage(ServerMessageTypes.FIRE)
+			tank_dict['state'] = 'searching'
+
+		elif tank_dict['state'] == 'banking':
 			heading = getheading(tank_dict['my_tank']['pos'], (0, -100))
-			GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': tank_dict['my_tank']['heading']})
-			message = GameServer.readMessage()
-			if message['messageType'] == 23:
-				tank_dict['state'] = 'searching'
-				GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
-				break
-			elif message['messageType'] == 18 and message['Type'] == 'Tank' and message['Name'] == args.name:
-				tank_dict['my_tank']['pos'] = (message['X'],message['Y'])
-				tank_dict['my_tank']['heading'] = message['Heading']
-		
-
-
-
+			GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading})
+			GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+			while True:
+				heading = getheading(tank_dict['my_tank']['pos'], (0, -100))
+				GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': tank_dict['my_tank']['heading']})
+				message = GameServer.readMessage()
+				if message['messageType'] == 23:
+					tank_dict['state'] = 'searching'
+					GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+					break
+				elif message['messageType'] == 18 and message['Type'] == 'Tank' and message['Name'] == args.name:
+					tank_dict['my_tank']['pos'] = (message['X'],message['Y'])
+					tank_dict['my_tank']['heading'] = message['Heading']
+
+
+if __name__ == '__main__':
+	main()
@@ -9,9 +9,6 @@ import argparse
 import random
 import time
 
-logging.basicConfig(filename='example.log',level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s')
-
-
 class ServerMessageTypes(object):
 	TEST = 0
 	CREATETANK = 1
@@ -54,7 +51,7 @@ class ServerMessageTypes(object):
 		TOGGLELEFT: "TOGGLELEFT",
 		TOGGLERIGHT: "TOGGLERIGHT",
 		TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-		TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+		TOGGLETURRETRIGHT: "TOGGLETURRETRIGHT",
 		TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
 		TURNTOHEADING: "TURNTOHEADING",
 		MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
@@ -102,19 +99,21 @@ class ServerComms(object):
 		self.ServerSocket.connect((hostname, port))
 
 	def readTolength(self, length):
-		messageData = self.ServerSocket.recv(length)
+		messageData = b''
 		while len(messageData) < length:
 			buffData = self.ServerSocket.recv(length - len(messageData))
-			if buffData:
-				messageData += buffData
+			if not buffData:
+				# recv only returns nothing once the server has gone away
+				raise socket.error('server closed the connection')
+			messageData += buffData
 		return messageData
 
 	def readMessage(self):
 		'''
 		Read a message from the server
 		'''
-		messageTypeRaw = self.ServerSocket.recv(1)
-		messageLenRaw = self.ServerSocket.recv(1)
+		messageTypeRaw = self.readTolength(1)
+		messageLenRaw = self.readTolength(1)
 		messageType = struct.unpack('>B', messageTypeRaw)[0]
 		messageLen = struct.unpack('>B', messageLenRaw)[0]
 		
@@ -161,43 +160,49 @@ class ServerComms(object):
 		return self.ServerSocket.send(message)
 
 
-# Parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
-parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
-parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
-parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
-args = parser.parse_args()
+def main():
+	logging.basicConfig(filename='example.log',level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s')
 
-# Set up console logging
-if args.debug:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
-else:
-	logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
 
+	# Parse command line args
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+	parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
+	parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
+	parser.add_argument('-n', '--name', default='TeamA:RandomBot', help='Name of bot')
+	args = parser.parse_args()
 
-# Connect to game server
-GameServer = ServerComms(args.hostname, args.port)
+	# Set up console logging
+	if args.debug:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.DEBUG)
+	else:
+		logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
 
-# Spawn our tank
 
-logging.info("Creating tank with name '{}'".format(args.name))
-GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+	# Connect to game server
+	GameServer = ServerComms(args.hostname, args.port)
 
-# Main loop - read game messages, ignore them and randomly perform actions
-i=0
-while True:
-        
-	message = GameServer.readMessage()
-    
-	if i == 0:
-		GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
-	elif i == 20:
-		GameServer.sendMessage(ServerMessageTypes.STOPTURN)
-		GameServer.sendMessage(ServerMessageTypes.TOGGLETURRETRIGHT)
-	elif i == 40:
-		GameServer.sendMessage(ServerMessageTypes.STOPTURRET)
-		GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
-	i = i+1
+	# Spawn our tank
+
+	logging.info("Creating tank with name '{}'".format(args.name))
+	GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+
+	# Main loop - read game messages, ignore them and randomly perform actions
+	i=0
+	while True:
+
+		message = GameServer.readMessage()
+
+		if i == 0:
+			GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
+		elif i == 20:
+			GameServer.sendMessage(ServerMessageTypes.STOPTURN)
+			GameServer.sendMessage(ServerMessageTypes.TOGGLETURRETRIGHT)
+		elif i == 40:
+			GameServer.sendMessage(ServerMessageTypes.STOPTURRET)
+			GameServer.sendMessage(ServerMessageTypes.TOGGLEFORWARD)
+		i = i+1
 
 
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+
+from gameclock import GameClock
+from servercomms import ServerMessageTypes
+from shots import ShotTracker, HIT, MISS
+
+
+def syncedAfterShot():
+	'''
+	A countdown clock that first syncs after a shot was fired at local 100
+	'''
+	clock = GameClock()
+	shots = ShotTracker(resolveAfter=3.0)
+	slot = shots.fired(clock.now(100.0), 40.0, 2.0)
+	clock.update(180, 100.4)
+	clock.update(179, 101.4)
+	return clock, shots, slot
+
+
+def test_no_jump_at_first_sync():
+	clock = GameClock()
+	before = clock.stamp(100.0)
+	clock.update(180, 100.4)
+	clock.update(179, 101.4)
+	assert 0.0 < clock.stamp(101.5) - before < 2.0
+	assert abs(clock.remaining(101.5) - 178.9) < 1e-9
+
+
+def test_shot_fired_before_sync_hits_after_it():
+	clock, shots, slot = syncedAfterShot()
+	shots.event(ServerMessageTypes.SUCCESSFULLHIT, clock.now(101.5))
+	assert shots.outcome[slot] == HIT
+
+
+def test_shot_fired_before_sync_expires_after_it():
+	clock, shots, slot = syncedAfterShot()
+	shots.event(ServerMessageTypes.SUCCESSFULLHIT, clock.now(104.0))
+	assert shots.outcome[slot] == MISS